@@ -0,0 +1,94 @@
+'''
+Micro-benchmarks for ``larpix.bitarrayhelper`` and the code that depends on it
+(per-packet decode and configuration packet generation).
+
+Usage::
+
+    python benchmarks/bench_bitarrayhelper.py [--number N] [--check]
+
+Each benchmark prints the time per call in microseconds. Where a reference
+(string-based) implementation exists, its time is printed alongside. With
+``--check``, the script exits with a non-zero status if any helper is slower
+than its reference implementation by more than ``--tolerance``.
+
+'''
+import argparse
+import sys
+import timeit
+
+from bitarray import bitarray
+
+import larpix
+from larpix import bitarrayhelper as bah
+
+def _time(stmt, number, namespace):
+    return min(timeit.repeat(stmt, number=number, repeat=5, globals=namespace)) / number * 1e6
+
+def helper_benchmarks():
+    '''
+    Returns a ``list`` of ``(name, stmt, reference stmt)`` for the bitarray helpers
+
+    '''
+    benchmarks = []
+    for nbits in (1, 8, 31, 64):
+        for endian in ('big', 'little'):
+            val = (1 << nbits) - 2 if nbits > 1 else 1
+            benchmarks.append((
+                'fromuint({}, {}bits, {})'.format(val, nbits, endian),
+                'bah.fromuint({}, {}, endian={!r})'.format(val, nbits, endian),
+                'bah._fromuint_reference({}, {}, endian={!r})'.format(val, nbits, endian)
+                ))
+            for bits_endian in ('big', 'little'):
+                benchmarks.append((
+                    'touint({}bits, {} from {} bitarray)'.format(nbits, endian, bits_endian),
+                    'bah.touint(bits_{}_{}, endian={!r})'.format(nbits, bits_endian, endian),
+                    'bah._touint_reference(bits_{}_{}, endian={!r})'.format(nbits, bits_endian, endian)
+                    ))
+    return benchmarks
+
+def packet_benchmarks():
+    '''
+    Returns a ``list`` of ``(name, stmt, None)`` for packet and configuration code
+    that depends on the bitarray helpers
+
+    '''
+    return [
+        ('Packet_v2 construct', 'larpix.Packet_v2(packet_bytes)', None),
+        ('Packet_v2 decode', 'packet.chip_id; packet.channel_id; packet.timestamp; packet.dataword', None),
+        ('Packet_v2.bits', 'packet.bits = packet.bits', None),
+        ('Configuration_v2.all_data', 'chip.config.all_data()', None),
+        ('Chip.get_configuration_write_packets', 'chip.get_configuration_write_packets()', None),
+        ]
+
+def main(number=10000, check=False, tolerance=1.5):
+    namespace = dict(larpix=larpix, bah=bah,
+        packet_bytes=b'\x01\x02\x03\x04\x05\x06\x07\x08',
+        packet=larpix.Packet_v2(b'\x01\x02\x03\x04\x05\x06\x07\x08'),
+        chip=larpix.Chip('1-1-2', version=2))
+    for nbits in (1, 8, 31, 64):
+        for bits_endian in ('big', 'little'):
+            namespace['bits_{}_{}'.format(nbits, bits_endian)] = bitarray('10' * (nbits // 2) + '1' * (nbits % 2),
+                endian=bits_endian)
+
+    failed = []
+    print('{:<48s} {:>12s} {:>12s}'.format('benchmark', 'time [us]', 'ref [us]'))
+    for name, stmt, ref_stmt in helper_benchmarks() + packet_benchmarks():
+        n = number if ref_stmt is not None else max(number // 100, 1)
+        t = _time(stmt, n, namespace)
+        ref_t = _time(ref_stmt, n, namespace) if ref_stmt is not None else None
+        print('{:<48s} {:>12.3f} {:>12s}'.format(name, t,
+            '{:.3f}'.format(ref_t) if ref_t is not None else '-'))
+        if ref_t is not None and t > tolerance * ref_t:
+            failed.append(name)
+    if check and failed:
+        print('slower than reference: {}'.format(', '.join(failed)))
+        return 1
+    return 0
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--number', '-n', default=10000, type=int, help='''Number of calls per helper benchmark, packet benchmarks use 1/100 of this (default=%(default)s)''')
+    parser.add_argument('--check', action='store_true', help='''Exit with an error if any helper is slower than the reference implementation''')
+    parser.add_argument('--tolerance', default=1.5, type=float, help='''Allowed ratio of helper time to reference time for --check (default=%(default)s)''')
+    args = parser.parse_args()
+    sys.exit(main(**vars(args)))
@@ -0,0 +1,121 @@
+'''
+Benchmarks for the packets dataset layout options of
+``larpix.format.hdf5format.to_file``.
+
+Usage::
+
+    python benchmarks/bench_hdf5format.py [--n_packets N] [--batch_size N] [--directory DIR]
+
+Synthetic v2.4 data packets are appended to a new file in batches of
+``--batch_size`` packets (as the ``HDF5Logger`` does on each flush) for each
+layout setting. The write rate (in MB/s of encoded packet data) and the
+resulting file size are printed for each setting.
+
+The same data is then recorded with an ``HDF5Logger`` using each writer
+mode, both as ``PacketBatch`` objects and as lists of ``Packet_v2``
+objects, and the wall time and the CPU time used by this (the acquisition)
+process are printed.
+
+'''
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from larpix import PacketBatch
+from larpix.format.hdf5format import to_file, dtypes
+from larpix.logger.h5_logger import HDF5Logger
+
+#: ``(name, to_file kwargs)`` of each benchmarked layout
+settings = [
+    ('default', dict()),
+    ('chunk_size=65536', dict(chunk_size=65536)),
+    ('gzip', dict(chunk_size=65536, compression='gzip')),
+    ('lzf', dict(chunk_size=65536, compression='lzf')),
+    ('shuffle+gzip', dict(chunk_size=65536, compression='gzip', shuffle=True)),
+    ('shuffle+lzf', dict(chunk_size=65536, compression='lzf', shuffle=True)),
+    ('preallocate', dict(chunk_size=65536, preallocate=True)),
+    ('preallocate+lzf', dict(chunk_size=65536, compression='lzf', shuffle=True, preallocate=True)),
+    ]
+
+def synthetic_batch(n_packets, seed=0):
+    '''
+    Create a ``PacketBatch`` of data packets with realistic field
+    distributions (few chips, slowly increasing timestamps)
+
+    '''
+    rng = np.random.RandomState(seed)
+    batch = PacketBatch(np.zeros(n_packets, dtype='u8'),
+        io_group=rng.randint(1, 3, n_packets),
+        io_channel=rng.randint(1, 33, n_packets),
+        receipt_timestamp=np.cumsum(rng.randint(0, 10, n_packets)),
+        direction=1)
+    batch.chip_id = rng.randint(11, 111, n_packets)
+    batch.channel_id = rng.randint(0, 64, n_packets)
+    batch.timestamp = np.cumsum(rng.randint(0, 100, n_packets)) % 2**31
+    batch.dataword = rng.randint(0, 256, n_packets)
+    batch.first_packet = 1
+    batch.assign_parity()
+    return batch
+
+def bench_logger(batch, batch_size, directory):
+    '''
+    Record ``batch`` with an ``HDF5Logger`` for each writer mode, as a
+    ``PacketBatch`` and as a list of ``Packet_v2`` objects (as returned by
+    ``Controller.read``)
+
+    '''
+    print('{:<20s} {:>12s} {:>14s}'.format('logger writer', 'wall [s]', 'this CPU [s]'))
+    inputs = [
+        ('PacketBatch', [batch[i:i+batch_size] for i in range(0, len(batch), batch_size)]),
+        ('Packet_v2', [batch[i:i+batch_size].to_packets() for i in range(0, len(batch), batch_size)]),
+        ]
+    for input_name, records in inputs:
+        for writer in HDF5Logger.writers:
+            logger = HDF5Logger(filename='logger_{}_{}.h5'.format(input_name, writer),
+                directory=directory, buffer_length=batch_size, writer=writer)
+            logger.enable()
+            logger.flush()
+            start, start_cpu = time.time(), time.process_time()
+            for record in records:
+                logger.record(record if isinstance(record, list) else [record],
+                    direction=HDF5Logger.READ)
+            logger.disable()
+            print('{:<20s} {:>12.2f} {:>14.2f}'.format(input_name + ' ' + writer,
+                time.time() - start, time.process_time() - start_cpu))
+
+def main(n_packets=1000000, batch_size=10000, directory=None):
+    batch = synthetic_batch(n_packets)
+    nbytes = n_packets * np.dtype(dtypes['2.4']['packets']).itemsize
+    tmpdir = tempfile.mkdtemp(dir=directory)
+    try:
+        print('{:<20s} {:>12s} {:>14s} {:>8s}'.format('setting', 'write [MB/s]', 'file size [MB]', 'ratio'))
+        for name, kwargs in settings:
+            filename = os.path.join(tmpdir, name + '.h5')
+            start = time.time()
+            for i in range(0, n_packets, batch_size):
+                to_file(filename, batch[i:i+batch_size], version='2.4', **kwargs)
+            if kwargs.get('preallocate'):
+                # trim to the valid rows
+                to_file(filename, version='2.4')
+            elapsed = time.time() - start
+            size = os.path.getsize(filename)
+            print('{:<20s} {:>12.1f} {:>14.1f} {:>8.2f}'.format(name,
+                nbytes / elapsed / 1e6, size / 1e6, size / nbytes))
+        print()
+        bench_logger(batch, batch_size, tmpdir)
+    finally:
+        shutil.rmtree(tmpdir)
+    return 0
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--n_packets', '-n', default=1000000, type=int, help='''Number of packets to write per setting (default=%(default)s)''')
+    parser.add_argument('--batch_size', default=10000, type=int, help='''Number of packets per call to to_file (default=%(default)s)''')
+    parser.add_argument('--directory', default=None, help='''Directory for temporary files (default: system temporary directory)''')
+    args = parser.parse_args()
+    sys.exit(main(**vars(args)))
@@ -22,7 +22,7 @@ from . import bitarrayhelper as bah
 from .key import *
 from .chip import *
 from .configuration import *
-from .configuration import _Smart_List
+from .configuration import _Smart_List, _Smart_Array
 from .controller import *
 from .packet import *
 
@@ -1,23 +1,128 @@
 '''
 A module with convenience functions for bitarray.
 
+Conversions between unsigned integers and bitarrays are implemented with
+``int.to_bytes``/``bitarray.frombytes`` (and the reverse), with precomputed
+lookup tables for widths of 8 bits or fewer. The ``endian`` argument
+specifies the bit order of the *value* within the bitarray: ``'big'`` means
+that index 0 is the most significant bit, ``'little'`` means that index 0 is
+the least significant bit.
+
 '''
+from operator import index as _index
+
 from bitarray import bitarray
 
-def fromuint(val, nbits, endian='big'):
-    try:
-        if isinstance(nbits, slice):
-            nbits = abs(nbits.stop - nbits.start)
-        if endian[0] == 'b':
-            string = bin(val)[2:].zfill(nbits)
-            return bitarray(string)
-        string = bin(val)[-1:1:-1].ljust(nbits,'0')
+_TABLE_MAX_BITS = 8
+
+_endian_is_method = callable(bitarray().endian)
+_empty_big = bitarray(endian='big')
+
+def _bitarray_endian(bits):
+    '''
+    Return the endianness of a bitarray (works with both the method and
+    property forms of ``bitarray.endian``)
+
+    '''
+    return bits.endian() if _endian_is_method else bits.endian
+
+def _reverse_uint(val, nbits):
+    return int(bin(val)[2:].zfill(nbits)[::-1], 2)
+
+def _fromuint_reference(val, nbits, endian='big'):
+    if endian[0] == 'b':
+        string = bin(val)[2:].zfill(nbits)
         return bitarray(string)
-    except TypeError:
-        return val
+    string = bin(val)[-1:1:-1].ljust(nbits,'0')
+    return bitarray(string)
 
-def touint(bits, endian='big'):
+def _touint_reference(bits, endian='big'):
     bin_string = bits.to01()
     if endian[0] == 'b':
         return int(bin_string, 2)
     return int(bin_string[::-1], 2)
+
+# ``_fromuint_table[endian][nbits][val]`` is the bitarray for ``val``
+_fromuint_table = dict([
+    (endian, [None] + [
+        tuple([_fromuint_reference(val, nbits, endian) for val in range(1 << nbits)])
+        for nbits in range(1, _TABLE_MAX_BITS+1)])
+    for endian in ('b', 'l')
+    ])
+# ``_touint_table[bitarray endian + value endian][nbits][byte]`` is the value
+# of a bitarray of length ``nbits`` whose ``tobytes()`` is ``bytes([byte])``
+_touint_table = dict()
+for _bits_endian in ('b', 'l'):
+    for _endian in ('b', 'l'):
+        _touint_table[_bits_endian + _endian] = [None] + [
+            dict([(bitarray(_fromuint_reference(val, nbits, _endian).to01(),
+                endian={'b':'big','l':'little'}[_bits_endian]).tobytes()[0], val)
+                for val in range(1 << nbits)])
+            for nbits in range(1, _TABLE_MAX_BITS+1)]
+        _touint_table[_bits_endian + _endian] = [None] + [
+            tuple([table.get(byte, 0) for byte in range(256)])
+            for table in _touint_table[_bits_endian + _endian][1:]]
+# reverses the bit order within each byte, for use with ``bytes.translate``
+_reverse_bytes = bytes([_reverse_uint(byte, 8) for byte in range(256)])
+
+def fromuint(val, nbits, endian='big'):
+    '''
+    Convert an unsigned integer into a bitarray
+
+    :param val: the value to convert, if not an integer it is returned unchanged
+
+    :param nbits: the number of bits (or a ``slice`` of the appropriate length)
+
+    :param endian: bit order of the value, ``'big'`` (MSB at index 0) or ``'little'`` (LSB at index 0)
+
+    :returns: ``bitarray`` of length ``nbits`` (or longer, if ``val`` does not fit)
+
+    '''
+    if nbits.__class__ is slice:
+        nbits = abs(nbits.stop - nbits.start)
+    if val.__class__ is not int:
+        try:
+            val = _index(val)
+        except TypeError:
+            return val
+    if val < 0 or nbits < 1 or val >> nbits:
+        # value does not fit, fall back to string formatting
+        return _fromuint_reference(val, nbits, endian)
+    if nbits <= _TABLE_MAX_BITS:
+        return _fromuint_table[endian[0]][nbits][val].copy()
+    nbytes = (nbits + 7) >> 3
+    bits = _empty_big.copy()
+    if endian[0] == 'b':
+        bits.frombytes(val.to_bytes(nbytes, 'big'))
+        del bits[:(nbytes << 3) - nbits]
+    else:
+        bits.frombytes(val.to_bytes(nbytes, 'little').translate(_reverse_bytes))
+        del bits[nbits:]
+    return bits
+
+def touint(bits, endian='big'):
+    '''
+    Convert a bitarray into an unsigned integer
+
+    :param bits: the ``bitarray`` to convert
+
+    :param endian: bit order of the value, ``'big'`` (MSB at index 0) or ``'little'`` (LSB at index 0)
+
+    :returns: ``int``
+
+    '''
+    nbits = len(bits)
+    bits_endian = bits.endian()[0] if _endian_is_method else bits.endian[0]
+    if nbits <= _TABLE_MAX_BITS:
+        if not nbits:
+            return _touint_reference(bits, endian)
+        return _touint_table[bits_endian + endian[0]][nbits][bits.tobytes()[0]]
+    if bits_endian == endian[0]:
+        if bits_endian == 'b':
+            return int.from_bytes(bits.tobytes(), 'big') >> (-nbits & 7)
+        return int.from_bytes(bits.tobytes(), 'little')
+    if bits_endian == 'b':
+        # big-endian bitarray, little-endian value
+        return int.from_bytes(bits.tobytes().translate(_reverse_bytes), 'little')
+    # little-endian bitarray, big-endian value
+    return int.from_bytes(bits.tobytes().translate(_reverse_bytes), 'big') >> (-nbits & 7)
@@ -1,6 +1,9 @@
+import numpy as np
+
 from .key import Key
 from .configuration import Configuration_v1, Configuration_v2, Configuration_Lightpix_v1
-from .packet import Packet_v1, Packet_v2
+from .packet import Packet_v1, Packet_v2, PacketBatch
+from .packet.packet_v2 import _popcount
 
 class Chip(object):
     '''
@@ -68,19 +71,29 @@ class Chip(object):
         ``packet_type``) the specified configuration registers (or all
         registers by default).
 
+        For v2 asics, the packet words are generated directly from the
+        register image of the configuration, see
+        ``get_configuration_batch``.
+
         '''
         conf = self.config
         if registers is None:
             registers = range(conf.num_registers)
+        if self.asic_version != 1:
+            packets = []
+            for word in self._configuration_words(packet_type, self._register_addresses(registers)):
+                packet = Packet_v2(word.to_bytes(Packet_v2.num_bytes, Packet_v2.endian))
+                packet.io_group = self.io_group
+                packet.io_channel = self.io_channel
+                packets.append(packet)
+            return packets
+        registers = set(registers)
         packets = []
         packet_register_data = conf.all_data()
         for i, data in enumerate(packet_register_data):
             if i not in registers:
                 continue
-            if self.asic_version == 1:
-                packet = Packet_v1()
-            else:
-                packet = Packet_v2()
+            packet = Packet_v1()
             packet.packet_type = packet_type
             packet.chip_id = self.chip_id
             packet.chip_key = self.chip_key
@@ -95,6 +108,75 @@ class Chip(object):
             packets.append(packet)
         return packets
 
+    def get_configuration_batch(self, packet_type, registers=None):
+        '''
+        Return a ``PacketBatch`` of the packets to read or write (depending
+        on ``packet_type``) the specified configuration registers (or all
+        registers by default). Only valid for v2 asics.
+
+        The header bits (packet type and chip id) are computed once, and the
+        address, data, and parity of each packet are then filled in as
+        arrays. The packets are the same as (but much faster to generate
+        than) those from ``get_configuration_packets``, use
+        ``batch.words`` for the raw packet words.
+
+        '''
+        if self.asic_version == 1:
+            raise RuntimeError('configuration batches are only valid for v2 asics')
+        if packet_type not in (Packet_v2.CONFIG_WRITE_PACKET, Packet_v2.CONFIG_READ_PACKET):
+            raise ValueError('incorrect packet_type for configuration packets')
+        if registers is None:
+            addresses = np.arange(self.config.num_registers, dtype='<u8')
+        else:
+            addresses = np.array(self._register_addresses(registers), dtype='<u8')
+        words = np.full(len(addresses), self._configuration_header(packet_type), dtype='<u8') \
+            | (addresses << np.uint64(Packet_v2.register_address_bits.start))
+        if packet_type == Packet_v2.CONFIG_WRITE_PACKET:
+            image = np.frombuffer(self.config.register_image(), dtype='u1').astype('<u8')
+            words |= image[addresses.astype(int)] << np.uint64(Packet_v2.register_data_bits.start)
+        batch = PacketBatch(words, io_group=self.io_group, io_channel=self.io_channel)
+        batch.assign_parity()
+        return batch
+
+    def _register_addresses(self, registers):
+        '''
+        :returns: ``list`` of the valid register addresses in ``registers``, in increasing order and without duplicates
+
+        '''
+        num_registers = self.config.num_registers
+        return sorted(set([register for register in registers if 0 <= register < num_registers]))
+
+    def _configuration_header(self, packet_type):
+        '''
+        :returns: the common bits of the configuration packets of ``packet_type`` for this chip, as an ``int``
+
+        '''
+        return (packet_type << Packet_v2.packet_type_bits.start) \
+            | (self.chip_id << Packet_v2.chip_id_bits.start)
+
+    def _configuration_words(self, packet_type, addresses):
+        '''
+        :returns: ``list`` of the configuration packet words (``int``) for each register address in ``addresses``
+
+        '''
+        if packet_type == Packet_v2.CONFIG_WRITE_PACKET:
+            image = self.config.register_image()
+        elif packet_type == Packet_v2.CONFIG_READ_PACKET:
+            image = None
+        else:
+            raise ValueError('incorrect packet_type for configuration packets')
+        header = self._configuration_header(packet_type)
+        address_start = Packet_v2.register_address_bits.start
+        data_start = Packet_v2.register_data_bits.start
+        parity_start = Packet_v2.parity_bits.start
+        words = []
+        for address in addresses:
+            word = header | (address << address_start)
+            if image is not None:
+                word |= image[address] << data_start
+            words.append(word | ((1 - (_popcount(word) & 1)) << parity_start))
+        return words
+
     def get_configuration_write_packets(self, registers=None):
         '''
         Return a list of Packet objects to write corresponding to the specified
@@ -1,15 +1,22 @@
 import json
 import os
+import threading
+import time
+from collections import OrderedDict
 
-def _load_and_verify(file, config_type=None):
-    '''
-    Loads full inheritance and checks that configuration type matches type requested
+#: Maximum number of resolved configuration files kept in memory by ``load``
+cache_size = 128
+#: Files modified less than this many seconds before they were read are not
+#: cached, since a later modification may not change their mtime
+racy_interval = 2
 
-    '''
-    config_data = json.load(file)
-    if config_type:
-        assert config_data['_config_type'] == config_type, "Invalid config type {}".format(config_data['_config_type'])
-    return _load_inheritance(config_data)
+# ``{absolute path: (config type, [(path, stat signature), ...], frozen data, read time)}``
+# in least- to most-recently used order
+_cache = OrderedDict()
+# guards ``_cache``, re-entrant since loading a file loads the files it inherits from
+_cache_lock = threading.RLock()
+_missing = object()
+_scalar_types = (str, int, float, bool, type(None))
 
 def _inherit_dict(d, other, config_type=None):
     '''
@@ -25,7 +32,7 @@ def _inherit_dict(d, other, config_type=None):
             combined_d[key] = val
     return combined_d
 
-def _load_inheritance(config):
+def _load_inheritance(config, stamps=None):
     '''
     Loads parent config files specified in the "_include" field of a
     configuration.
@@ -36,6 +43,9 @@ def _load_inheritance(config):
     All fields of dict-like objects within the included fields will be inherited
     recursively
 
+    The files that the configuration depends on are appended to ``stamps``
+    (see ``_stat_signature``), if given.
+
     '''
 
     if not '_include' in config:
@@ -48,7 +58,7 @@ def _load_inheritance(config):
     if '_config_type' in config:
         config_type = config['_config_type']
     for included_file in config['_include']:
-        inherited_config = load(included_file, config_type=config_type)
+        inherited_config = _load(included_file, config_type=config_type, stamps=stamps)
         for key,val in inherited_config.items():
             if isinstance(val, dict) and key in base_config:
                 base_config[key] = _inherit_dict(val, base_config[key], config_type)
@@ -61,6 +71,94 @@ def _load_inheritance(config):
             base_config[key] = val
     return base_config
 
+def _find(filename):
+    '''
+    Return the absolute path of a configuration file, see ``load``
+
+    '''
+    if os.path.isfile(filename):
+        return os.path.abspath(filename)
+    elif os.path.isfile(os.path.join(os.path.dirname(__file__), filename)):
+        return os.path.abspath(os.path.join(os.path.dirname(__file__), filename))
+    else:
+        raise IOError('File not found: %s' % filename)
+
+def _stat_signature(path):
+    st = os.stat(path)
+    return (st.st_mtime, st.st_size, st.st_ino)
+
+def _freeze(data):
+    '''
+    Convert the lists of scalars within a loaded configuration into tuples,
+    so that ``_thaw`` can copy them without inspecting their elements
+
+    '''
+    if isinstance(data, dict):
+        return dict([(key, _freeze(val)) for key, val in data.items()])
+    if isinstance(data, list):
+        if all([isinstance(val, _scalar_types) for val in data]):
+            return tuple(data)
+        return [_freeze(val) for val in data]
+    return data
+
+def _thaw(data):
+    '''
+    Return a (mutable) copy of frozen configuration data
+
+    '''
+    if data.__class__ is dict:
+        return dict([(key, _thaw(val)) for key, val in data.items()])
+    if data.__class__ is tuple:
+        return list(data)
+    if data.__class__ is list:
+        return [_thaw(val) for val in data]
+    return data
+
+def _cache_valid(stamps, read_time):
+    for path, signature in stamps:
+        try:
+            if _stat_signature(path) != signature:
+                return False
+        except OSError:
+            return False
+        if signature[0] > read_time - racy_interval:
+            return False
+    return True
+
+def _entry(filename):
+    '''
+    Return the cache entry of a configuration file, (re)loading it if
+    necessary
+
+    '''
+    path = _find(filename)
+    with _cache_lock:
+        entry = _cache.get(path)
+        if entry is not None and _cache_valid(entry[1], entry[3]):
+            _cache.move_to_end(path)
+            return entry
+        read_time = time.time()
+        file_stamps = [(path, _stat_signature(path))]
+        with open(path, 'r') as f:
+            config_data = json.load(f)
+        entry = (config_data.get('_config_type', _missing),
+            file_stamps, _freeze(_load_inheritance(config_data, file_stamps)), read_time)
+        _cache[path] = entry
+        _cache.move_to_end(path)
+        while len(_cache) > cache_size:
+            _cache.popitem(last=False)
+        return entry
+
+def _load(filename, config_type=None, stamps=None):
+    entry = _entry(filename)
+    if config_type:
+        if entry[0] is _missing:
+            raise KeyError('_config_type')
+        assert entry[0] == config_type, "Invalid config type {}".format(entry[0])
+    if stamps is not None:
+        stamps.extend(entry[1])
+    return _thaw(entry[2])
+
 def load(filename, config_type=None):
     '''
     Load the specified configuration file.
@@ -69,13 +167,30 @@ def load(filename, config_type=None):
     If no match is found, the path is searched relative to the "config"
     package directory (aka ``__file__`` directly in code).
 
+    Resolved configurations (including inherited files) are cached by
+    absolute path, and are reloaded if the file or any of the files it
+    inherits from is modified. A new copy of the configuration is returned
+    on each call, so it can be modified freely. The cache can be used from
+    multiple threads.
+
     '''
-    if os.path.isfile(filename):
-        with open(filename, 'r') as f:
-            data = _load_and_verify(f, config_type)
-            return data
-    elif os.path.isfile(os.path.join(os.path.dirname(__file__), filename)):
-        with open(os.path.join(os.path.dirname(__file__), filename), 'r') as f:
-            return _load_and_verify(f, config_type)
-    else:
-        raise IOError('File not found: %s' % filename)
+    return _load(filename, config_type)
+
+def signature(filename):
+    '''
+    Return a value that changes whenever ``load`` would re-read the
+    specified configuration file (i.e. if it or any of the files it
+    inherits from is modified), e.g. to check whether data derived from the
+    configuration is out of date.
+
+    '''
+    entry = _entry(filename)
+    return (tuple(entry[1]), entry[3])
+
+def clear_cache():
+    '''
+    Remove all configurations cached by ``load``
+
+    '''
+    with _cache_lock:
+        _cache.clear()
@@ -4,3 +4,4 @@ from .configuration_v2 import *
 from .configuration_lightpix_v1 import *
 
 Configuration = Configuration_v2
+from .configuration_matrix import *
@@ -1,4 +1,5 @@
 from bitarray import bitarray
+import numpy as np
 import os
 import errno
 import functools
@@ -10,6 +11,7 @@ from .. import configs
 __all__ = [
     'BaseConfiguration',
     '_Smart_List',
+    '_Smart_Array',
 ]
 
 class _Smart_List(list):
@@ -18,9 +20,12 @@ class _Smart_List(list):
     Used for Configuration attributes where there's a distinct value for
     each LArPix channel.
 
+    If an ``owner`` configuration is given, ``owner._register_changed(name)``
+    is called whenever an element is modified.
+
     '''
 
-    def __init__(self, values, low, high):
+    def __init__(self, values, low, high, owner=None, name=None):
         if not (type(values) == list or type(values) == _Smart_List):
             raise ValueError("_Smart_List is not list")
         if any([value > high or value < low for value in values]):
@@ -28,6 +33,8 @@ class _Smart_List(list):
         list.__init__(self, values)
         self.low = low
         self.high = high
+        self.owner = owner
+        self.name = name
 
     def __setitem__(self, key, value):
         if isinstance(key, int):
@@ -39,6 +46,8 @@ class _Smart_List(list):
                 if num > self.high or num < self.low:
                     raise ValueError("value out of bounds")
             list.__setitem__(self, key, value)
+        if self.owner is not None:
+            self.owner._register_changed(self.name)
 
     def __setslice__(self, i, j, value):
         '''
@@ -48,6 +57,179 @@ class _Smart_List(list):
         '''
         self.__setitem__(slice(i, j, None), value)
 
+class _Smart_Array(list):
+    '''
+    A ``list`` of integers which checks its elements to be within given
+    bounds. Used for Configuration_v2 attributes where there's a distinct
+    value for each LArPix channel.
+
+    It behaves as a ``_Smart_List`` (and is kept a ``list`` subclass so that
+    existing code that type checks or serializes these attributes keeps
+    working), and assignment additionally accepts any numpy index (int,
+    slice, index array, or mask) and a scalar or sequence of values, which is
+    range-checked over the whole assignment at once. E.g.::
+
+        >>> conf.pixel_trim_dac[:] = 16
+        >>> conf.pixel_trim_dac[[0, 2, 4]] = [1, 2, 3]
+        >>> conf.channel_mask[np.array(conf.pixel_trim_dac) > 20] = 1
+
+    The list holds the only copy of the data; a numpy view of it
+    (``values``) is built on demand and cached until the next modification.
+
+    If an ``owner`` configuration is given, ``owner._register_changed(name)``
+    is called whenever an element is modified. The owner is not pickled with
+    the array, it is re-attached when the owner itself is unpickled.
+
+    '''
+
+    def __init__(self, values, low, high, owner=None, name=None):
+        self.low = low
+        self.high = high
+        self.owner = owner
+        self.name = name
+        values = self._validate(values)
+        if values.ndim != 1:
+            raise ValueError('values must be one dimensional')
+        list.__init__(self, values.tolist())
+        self._values = None
+
+    def __reduce__(self):
+        return (self.__class__, (list(self), self.low, self.high, None, self.name))
+
+    @property
+    def values(self):
+        '''
+        The values as a (read-only) numpy array
+
+        '''
+        if self._values is None:
+            self._values = np.array(list(self), dtype=int)
+            self._values.flags.writeable = False
+        return self._values
+
+    def _validate(self, values):
+        values = np.array(values, ndmin=1)
+        if values.dtype.kind not in 'biu':
+            raise TypeError('values must be integers')
+        if len(values) and (values.min() < self.low or values.max() > self.high):
+            raise ValueError('value out of bounds')
+        return values.astype(int)
+
+    def _changed(self):
+        '''
+        Drop the cached numpy values and notify the owner after the list
+        was modified
+
+        '''
+        self._values = None
+        if self.owner is not None:
+            self.owner._register_changed(self.name)
+
+    def __getitem__(self, key):
+        if isinstance(key, (int, np.integer, slice)):
+            return list.__getitem__(self, key)
+        return self.values[key].tolist()
+
+    def __setitem__(self, key, value):
+        if isinstance(key, int) and isinstance(value, int):
+            # fast path for setting a single element
+            if value > self.high or value < self.low:
+                raise ValueError('value out of bounds')
+            list.__setitem__(self, key, value)
+        else:
+            # resolve the key to the affected indices, then only write those
+            indices = np.arange(len(self))[key]
+            values = self._validate(value)
+            if not np.ndim(value):
+                values = values[0]
+            values = np.broadcast_to(values, np.shape(indices))
+            if isinstance(key, slice):
+                list.__setitem__(self, key, values.tolist())
+            else:
+                for index, element in zip(np.ravel(indices).tolist(),
+                        np.ravel(values).tolist()):
+                    list.__setitem__(self, index, element)
+        self._changed()
+
+    def __setslice__(self, i, j, value):
+        '''
+        Only used in Python 2, where __setslice__ is deprecated but
+        contaminates the namespace of this subclass.
+
+        '''
+        self.__setitem__(slice(i, j, None), value)
+
+    def __delitem__(self, key):
+        list.__delitem__(self, key)
+        self._changed()
+
+    def __iadd__(self, other):
+        self.extend(other)
+        return self
+
+    def __imul__(self, n):
+        list.__imul__(self, n)
+        self._changed()
+        return self
+
+    def append(self, value):
+        self._validate(value)
+        list.append(self, value)
+        self._changed()
+
+    def extend(self, values):
+        values = list(values)
+        self._validate(values)
+        list.extend(self, values)
+        self._changed()
+
+    def insert(self, index, value):
+        self._validate(value)
+        list.insert(self, index, value)
+        self._changed()
+
+    def pop(self, index=-1):
+        value = list.pop(self, index)
+        self._changed()
+        return value
+
+    def remove(self, value):
+        list.remove(self, value)
+        self._changed()
+
+    def clear(self):
+        list.__delitem__(self, slice(None))
+        self._changed()
+
+    def reverse(self):
+        list.reverse(self)
+        self._changed()
+
+    def sort(self, *args, **kwargs):
+        list.sort(self, *args, **kwargs)
+        self._changed()
+
+    def _copy(self, owner=None, name=None):
+        '''
+        Return a copy of this array (without re-validating the values)
+
+        '''
+        array = _Smart_Array.__new__(_Smart_Array)
+        list.extend(array, self)
+        array.__dict__.update(low=self.low, high=self.high, owner=owner, name=name,
+            _values=self._values)
+        return array
+
+    def __array__(self, dtype=None, copy=None):
+        return np.array(self.values, dtype=dtype)
+
+    def tolist(self):
+        '''
+        Return the values as a plain ``list`` of ``int``
+
+        '''
+        return list(self)
+
 def _nice_json(d, depth=1):
     '''
     Helper method for printing dicts in a dense but readable format for json
@@ -75,9 +257,19 @@ class BaseConfiguration(object):
     '''
     Base class for larpix configuration objects
 
+    The configuration keeps track of which physical registers have been
+    changed since they were last marked as clean (i.e. since they were last
+    written to or verified on the chip), see ``dirty_registers``,
+    ``mark_clean``, and ``mark_dirty``. All registers are dirty on
+    creation.
+
     '''
+    # ``{(class, default_configuration_file): (configs.signature, configuration)}``,
+    # see ``_default_configuration``
+    _default_configurations = dict()
 
     def __init__(self):
+        self._clean_data = [None] * self.num_registers
         self.load(self.default_configuration_file)
 
     def __setattr__(self, name, value):
@@ -88,7 +280,7 @@ class BaseConfiguration(object):
 
         '''
         # print('SET', name, value)
-        if not (name in self.register_names or name[0] == '_' or hasattr(self, name)):
+        if not (name[0] == '_' or name in self._register_name_set or hasattr(self, name)):
             raise AttributeError('%s is not a known register' % name)
         return super(BaseConfiguration, self).__setattr__(name, value)
 
@@ -113,10 +305,15 @@ class BaseConfiguration(object):
         Pair order is (self, other)
         '''
         d = {}
-        for register_name in self.register_names:
-            if getattr(self, register_name) != getattr(other, register_name):
-                d[register_name] = (getattr(self, register_name), getattr(other,
-                    register_name))
+        for register_name in self._changed_register_names(other):
+            self_value, other_value = getattr(self, register_name), getattr(other, register_name)
+            if self_value != other_value:
+                # copy array values, rather than referring to the configurations
+                if isinstance(self_value, _Smart_Array):
+                    self_value = self_value.tolist()
+                if isinstance(other_value, _Smart_Array):
+                    other_value = other_value.tolist()
+                d[register_name] = (self_value, other_value)
         # Attempt to simplify some of the long values (array values)
         for (name, (self_value, config_value)) in d.items():
             if isinstance(self_value,(list,_Smart_List)):
@@ -131,6 +328,97 @@ class BaseConfiguration(object):
                     pass
         return d
 
+    def _changed_register_names(self, other):
+        '''
+        Return the register names that may differ from ``other`` (all
+        register names, subclasses can narrow this down)
+
+        '''
+        return self.register_names
+
+    @classmethod
+    def _default_configuration(cls):
+        '''
+        Return a shared default configuration of this class, loaded once
+        per class (and ``default_configuration_file``) and reloaded if the
+        default configuration file is modified. It must not be modified.
+
+        '''
+        signature = configs.signature(cls.default_configuration_file)
+        default = cls._stored_default_configuration(signature)
+        if default is None:
+            default = cls()
+            BaseConfiguration._default_configurations[
+                (cls, cls.default_configuration_file)] = (signature, default)
+        return default
+
+    @classmethod
+    def _stored_default_configuration(cls, signature):
+        '''
+        Return the stored default configuration of this class, or ``None``
+        if there is none or it was loaded from a different version
+        (``configs.signature``) of the default configuration file
+
+        '''
+        entry = BaseConfiguration._default_configurations.get(
+            (cls, cls.default_configuration_file))
+        if entry is None or entry[0] != signature:
+            return None
+        return entry[1]
+
+    def dirty_registers(self):
+        '''
+        Return a list of the register addresses whose value differs from the
+        value when they were last marked clean (or that have never been
+        marked clean).
+
+        Changes made in place (e.g. ``conf.pixel_trim_dac[2] = 5``) are
+        included, since the current register data is compared against the
+        clean data.
+
+        '''
+        data = self._register_data()
+        clean_data = self._clean_data
+        return [register for register in range(self.num_registers)
+            if clean_data[register] is None or clean_data[register] != data[register]]
+
+    def mark_clean(self, registers=None):
+        '''
+        Record the current value of the specified register addresses (all by
+        default) as being the value on the chip, e.g. after they have been
+        written or verified
+
+        '''
+        data = self._register_data()
+        if registers is None:
+            registers = range(self.num_registers)
+        elif isinstance(registers, int):
+            registers = [registers]
+        for register in registers:
+            self._clean_data[register] = data[register]
+
+    def _register_data(self):
+        '''
+        Return the current value of each register address, as immutable
+        values that are compared by ``dirty_registers`` (subclasses can
+        override this with a cheaper encoding)
+
+        '''
+        return [bits.to01() for bits in self.all_data()]
+
+    def mark_dirty(self, registers=None):
+        '''
+        Flag the specified register addresses (all by default) as dirty,
+        e.g. if they could not be verified
+
+        '''
+        if registers is None:
+            registers = range(self.num_registers)
+        elif isinstance(registers, int):
+            registers = [registers]
+        for register in registers:
+            self._clean_data[register] = None
+
     def get_nondefault_registers(self):
         '''
         Return a dict of all registers that are not set to the default
@@ -138,8 +426,10 @@ class BaseConfiguration(object):
         register name where there's a difference, and the values are
         tuples of (current, default) configuration values.
 
+        The default configuration is only loaded once per class.
+
         '''
-        return self.compare(self.__class__())
+        return self.compare(self._default_configuration())
 
     def to_dict(self):
         '''
@@ -148,7 +438,10 @@ class BaseConfiguration(object):
         '''
         d = {}
         for register_name in self.register_names:
-            d[register_name] = getattr(self, register_name)
+            value = getattr(self, register_name)
+            if isinstance(value, _Smart_Array):
+                value = value.tolist()
+            d[register_name] = value
         return d
 
     def from_dict(self, d):
@@ -0,0 +1,327 @@
+import os
+import errno
+from collections import OrderedDict
+
+import numpy as np
+
+from .. import configs
+from ..key import Key
+from .configuration import BaseConfiguration, _nice_json
+
+__all__ = [
+    'ConfigurationMatrix',
+]
+
+def _unpackbits(values):
+    '''
+    Unpack an array of register values along the last axis, bit ``k`` of
+    value ``i`` is at index ``8*i + k`` (equivalent to
+    ``bitorder='little'``, which requires numpy 1.17)
+
+    '''
+    return np.unpackbits(values[..., np.newaxis], axis=-1)[..., ::-1].reshape(
+        values.shape[:-1] + (-1,))
+
+class ConfigurationMatrix(object):
+    '''
+    A detector-wide store of the configuration registers of many LArPix v2
+    (or LightPix v1) chips.
+
+    The register values of each chip are kept in a row of a single
+    ``(n_chips, num_registers)`` ``uint8`` array (``registers``), and the
+    configuration of each chip uses its row as its register image (see
+    ``Configuration_v2.register_image``). Changes made through a chip's
+    configuration are included in the matrix, and changes made through the
+    matrix are applied to the chip configurations, so operations over all
+    chips can be done as array operations. E.g.::
+
+        matrix = controller.build_config_matrix()
+        matrix.set('threshold_global', 40) # on all chips
+        matrix.get('pixel_trim_dac') # (n_chips, 64) array
+        matrix.compare() # registers that differ from the defaults, by chip key
+        controller['1-1-12'].config.threshold_global = 50
+        matrix.get('threshold_global', ['1-1-12']) # array([50])
+
+    The matrix keeps a reference to each chip (rather than to its
+    configuration), so a chip configuration that is replaced will be
+    attached to the matrix on the next access.
+
+    The matrix can be saved and loaded as a JSON file (see ``write`` and
+    ``load``), or as rows of the LArPix+HDF5 ``configs`` dataset (see
+    ``to_array``, ``from_array``, and ``larpix.format.hdf5format.to_file``).
+
+    :param chips: ``dict`` of chip key to ``Chip`` objects (e.g.
+        ``controller.chips``), all chips must use the same configuration class
+
+    '''
+    def __init__(self, chips):
+        self.chip_keys = list(chips.keys())
+        self.chips = list(chips.values())
+        configuration_classes = set([chip.config.__class__ for chip in self.chips])
+        if len(configuration_classes) != 1:
+            raise ValueError('chips must use a single configuration class, found {}'.format(
+                [cls.__name__ for cls in configuration_classes]))
+        self.configuration_class = configuration_classes.pop()
+        if not hasattr(self.configuration_class, '_set_register_image'):
+            raise ValueError('{} is not supported'.format(self.configuration_class.__name__))
+        self.index = dict([(chip_key, row) for row, chip_key in enumerate(self.chip_keys)])
+        self.registers = np.zeros((len(self.chips), self.configuration_class.num_registers),
+            dtype=np.uint8)
+        self._configs = [None] * len(self.chips)
+        self.sync()
+
+    def __len__(self):
+        return len(self.chip_keys)
+
+    @property
+    def asic_version(self):
+        return self.configuration_class.asic_version
+
+    @property
+    def num_registers(self):
+        return self.configuration_class.num_registers
+
+    def _rows(self, chip_keys=None):
+        if chip_keys is None:
+            return np.arange(len(self))
+        return np.array([self.index[chip_key if isinstance(chip_key, Key) else Key(chip_key)]
+            for chip_key in chip_keys], dtype=int)
+
+    def sync(self, chip_keys=None):
+        '''
+        Update the register matrix with any changes made through the chip
+        configurations (this is done automatically by the methods of this
+        class)
+
+        :param chip_keys: chip keys to update (default: all chips)
+
+        '''
+        for row in self._rows(chip_keys):
+            config = self.chips[row].config
+            if config is not self._configs[row]:
+                if config.__class__ is not self.configuration_class:
+                    raise ValueError('chip {} does not use a {}'.format(
+                        self.chip_keys[row], self.configuration_class.__name__))
+                if self._configs[row] is not None:
+                    # detach the replaced configuration
+                    self._configs[row]._set_register_image(bytearray(self.num_registers))
+                config._set_register_image(self.registers[row])
+                self._configs[row] = config
+            else:
+                config._update_register_image()
+
+    def _register_masks(self, register_name):
+        '''
+        Return the register addresses of ``register_name`` and the bits of
+        each register that it uses
+
+        '''
+        start_bit, end_bit = self.configuration_class.bit_map[register_name]
+        addresses = np.array(self.configuration_class.register_map[register_name])
+        masks = np.zeros(len(addresses), dtype=np.uint8)
+        for i, address in enumerate(addresses):
+            low, high = max(start_bit, 8*address), min(end_bit, 8*address+8)
+            masks[i] = ((1 << (high - low)) - 1) << (low - 8*address)
+        return addresses, masks
+
+    def _update(self, rows, registers):
+        '''
+        Set the register values of ``rows`` and apply the changes to the
+        chip configurations
+
+        '''
+        changed = (self.registers[rows] != registers)
+        self.registers[rows] = registers
+        for row, row_changed in zip(rows, changed):
+            if not row_changed.any():
+                continue
+            register_names = OrderedDict()
+            for address in np.flatnonzero(row_changed):
+                for register_name in self.configuration_class.register_map_inv[address]:
+                    register_names[register_name] = None
+            self._configs[row]._decode_register_image(register_names)
+
+    def default_registers(self):
+        '''
+        Return the register values of the default configuration
+
+        '''
+        return np.frombuffer(self.configuration_class.default_register_image(),
+            dtype=np.uint8)
+
+    def get(self, register_name, chip_keys=None):
+        '''
+        Return the values of a register name
+
+        :param register_name: name of the register, e.g. ``'threshold_global'``
+
+        :param chip_keys: chip keys to get (default: all chips)
+
+        :returns: array of shape ``(n_chips,)``, or ``(n_chips, length)``
+            for list-like registers (e.g. ``pixel_trim_dac``)
+
+        '''
+        rows = self._rows(chip_keys)
+        self.sync(chip_keys)
+        start_bit, end_bit = self.configuration_class.bit_map[register_name]
+        addresses = self.configuration_class.register_map[register_name]
+        bits = _unpackbits(self.registers[rows, addresses[0]:addresses[-1]+1])
+        bits = bits[:, start_bit%8:start_bit%8+end_bit-start_bit].astype(int)
+        value = getattr(self._configs[0] if self._configs else self.configuration_class(),
+            register_name)
+        if hasattr(value, '__len__'):
+            bits = bits.reshape(len(rows), len(value), -1)
+        return bits.dot(1 << np.arange(bits.shape[-1]))
+
+    def set(self, register_name, value, chip_keys=None):
+        '''
+        Set a register name to the same value on many chips
+
+        :param register_name: name of the register, e.g. ``'threshold_global'``
+
+        :param value: value to set (validated as for the chip configuration)
+
+        :param chip_keys: chip keys to set (default: all chips)
+
+        '''
+        rows = self._rows(chip_keys)
+        self.sync(chip_keys)
+        config = self.configuration_class()
+        setattr(config, register_name, value)
+        image = np.frombuffer(config.register_image(), dtype=np.uint8)
+        addresses, masks = self._register_masks(register_name)
+        registers = self.registers[rows]
+        registers[:, addresses] = (registers[:, addresses] & ~masks) | (image[addresses] & masks)
+        self._update(rows, registers)
+
+    def diff(self, reference=None, chip_keys=None):
+        '''
+        Find the registers that differ from a reference configuration
+
+        :param reference: a configuration, ``ConfigurationMatrix`` (with
+            the same chip keys), or array of register values to compare to
+            (default: the default configuration)
+
+        :param chip_keys: chip keys to compare (default: all chips)
+
+        :returns: boolean array of shape ``(n_chips, num_registers)``,
+            ``True`` where the register value differs from the reference
+
+        '''
+        rows = self._rows(chip_keys)
+        self.sync(chip_keys)
+        if reference is None:
+            reference = self.default_registers()
+        elif isinstance(reference, BaseConfiguration):
+            reference = np.frombuffer(reference.register_image(), dtype=np.uint8)
+        elif isinstance(reference, ConfigurationMatrix):
+            keys = [self.chip_keys[row] for row in rows]
+            reference.sync(keys)
+            reference = reference.registers[reference._rows(keys)]
+        return self.registers[rows] != reference
+
+    def compare(self, reference=None, chip_keys=None):
+        '''
+        Find the register addresses that differ from a reference
+        configuration, see ``diff``
+
+        :returns: ``OrderedDict`` of chip key to a list of register addresses,
+            only chips with differences are included
+
+        '''
+        rows = self._rows(chip_keys)
+        d = OrderedDict()
+        for row, row_diff in zip(rows, self.diff(reference, chip_keys)):
+            if row_diff.any():
+                d[self.chip_keys[row]] = np.flatnonzero(row_diff).tolist()
+        return d
+
+    def to_dict(self):
+        '''
+        Export the register values of each chip into a dict of
+        ``{chip key string: list of register values}``
+
+        '''
+        self.sync()
+        return OrderedDict([(str(chip_key), registers.tolist())
+            for chip_key, registers in zip(self.chip_keys, self.registers)])
+
+    def from_dict(self, d):
+        '''
+        Use a dict of ``{chip key: list of register values}`` to update the
+        configurations. Not all chips must be in the dict - only those
+        present will be updated.
+
+        '''
+        chip_keys = [chip_key for chip_key in d if Key(chip_key) in self.index]
+        if not chip_keys:
+            return
+        self.sync(chip_keys)
+        self._update(self._rows(chip_keys),
+            np.array([d[chip_key] for chip_key in chip_keys], dtype=np.uint8))
+
+    def write(self, filename, force=False):
+        '''
+        Save the register values of each chip to a JSON file.
+
+        '''
+        if os.path.isfile(filename):
+            if not force:
+                raise IOError(errno.EEXIST,
+                              'File %s exists. Use force=True to overwrite'
+                              % filename)
+        d = {
+            '_config_type': 'chip_matrix',
+            'class': self.configuration_class.__name__,
+            'registers': self.to_dict()
+        }
+        with open(filename, 'w+') as outfile:
+            outfile.write(_nice_json(d))
+        return 0
+
+    def load(self, filename):
+        '''
+        Load a JSON file (see ``write``) and use the contents to update the
+        configurations.
+
+        '''
+        data = configs.load(filename, 'chip_matrix')
+        if data['class'] != self.configuration_class.__name__:
+            raise RuntimeError('Configuration is not of class {}'.format(data['class']))
+        self.from_dict(data['registers'])
+
+    def to_array(self, dtype, timestamp=0):
+        '''
+        Export the register values of each chip into a structured array,
+        e.g. with the dtype of the LArPix+HDF5 ``configs`` dataset
+
+        :param dtype: structured dtype with ``io_group``, ``io_channel``,
+            ``chip_id``, ``registers``, and (optionally) ``timestamp`` fields
+
+        :param timestamp: value of the ``timestamp`` field
+
+        '''
+        self.sync()
+        rows = np.zeros((len(self),), dtype=dtype)
+        keys = [Key(chip_key) for chip_key in self.chip_keys]
+        rows['io_group'] = [key.io_group for key in keys]
+        rows['io_channel'] = [key.io_channel for key in keys]
+        rows['chip_id'] = [key.chip_id for key in keys]
+        rows['registers'][:, :self.num_registers] = self.registers
+        if 'timestamp' in rows.dtype.names:
+            rows['timestamp'] = timestamp
+        return rows
+
+    def from_array(self, rows):
+        '''
+        Use a structured array (see ``to_array``) to update the
+        configurations. Rows for chips that are not in the matrix are
+        ignored, and if a chip has more than one row the last row is used.
+
+        '''
+        d = OrderedDict()
+        for row in rows:
+            key = Key(int(row['io_group']), int(row['io_channel']), int(row['chip_id']))
+            if key in self.index:
+                d[key] = row['registers'][:self.num_registers]
+        self.from_dict(d)
@@ -70,6 +70,7 @@ class Configuration_v1(BaseConfiguration):
     unchanged.
 
     '''
+    _register_name_set = frozenset(register_names)
 
     TEST_OFF = 0x0
     TEST_UART = 0x1
@@ -1,4 +1,5 @@
 from bitarray import bitarray
+import numpy as np
 import os
 import errno
 import functools
@@ -6,7 +7,7 @@ from collections import OrderedDict
 
 from .. import bitarrayhelper as bah
 from .. import configs
-from . import BaseConfiguration, _Smart_List
+from . import BaseConfiguration, _Smart_List, _Smart_Array
 
 class Configuration_v2(BaseConfiguration):
     '''
@@ -16,12 +17,14 @@ class Configuration_v2(BaseConfiguration):
     setting the value of the corresponding register.
 
     Certain configuration values are set channel-by-channel. These are
-    represented by a list of values. For example:
+    represented by a list which also accepts numpy-style indexing (see
+    ``_Smart_Array``) and can be assigned to element-by-element or in bulk. For example:
 
         >>> conf.pixel_trim_dac[2:5]
         [16, 16, 16]
         >>> conf.channel_mask[20] = 1
         >>> conf.external_trigger_mask = [0] * 64
+        >>> conf.pixel_trim_dac[np.array(conf.channel_mask) == 0] = 31
 
     Additionally, other configuration values take up more than or less
     than one complete register. These are still set by referencing the
@@ -41,6 +44,17 @@ class Configuration_v2(BaseConfiguration):
         >>> conf.register_map['enable_min_delta_adc']  # Shares register 170
         range(170, 171)
 
+    The values of all of the physical registers are kept in a register
+    image (one byte per register address) which is updated only for the
+    register names that have changed, so ``all_data``, ``register_image``,
+    and ``from_dict_registers`` do not need to re-encode the full
+    configuration.
+
+    The default configuration file is only loaded (and validated) by the
+    first configuration of each class that is created, later
+    configurations are copied from it (until the default configuration
+    file, or a file it inherits from, is modified).
+
     '''
 
     asic_version = 2
@@ -54,20 +68,151 @@ class Configuration_v2(BaseConfiguration):
 
     def __init__(self):
         # Note: properties, getters and setters are constructed after this class definition at the bottom of the file.
+        signature = configs.signature(self.default_configuration_file)
+        default = self._stored_default_configuration(signature)
+        if default is not None:
+            self._copy_registers(default)
+            return
+        self._register_image = bytearray(self.num_registers)
+        self._changed_registers = set(self.register_names)
         super(Configuration_v2, self).__init__()
+        default = self.__class__.__new__(self.__class__)
+        default._copy_registers(self)
+        BaseConfiguration._default_configurations[
+            (self.__class__, self.default_configuration_file)] = (signature, default)
         return
 
+    def _copy_registers(self, other):
+        '''
+        Initialize the register values from a configuration of the same
+        class, without re-validating them
+
+        '''
+        register_image = other.register_image()
+        d = dict(other.__dict__)
+        for key, value in d.items():
+            if isinstance(value, _Smart_Array):
+                d[key] = value._copy(owner=self, name=value.name)
+        d['_clean_data'] = [None] * self.num_registers
+        d['_register_image'] = bytearray(register_image)
+        d['_changed_registers'] = set()
+        self.__dict__.update(d)
+
+    def __copy__(self):
+        '''
+        Return a copy with its own register image and list-like register
+        values, so that changes to the copy do not affect this configuration
+
+        '''
+        other = self.__class__.__new__(self.__class__)
+        other._copy_registers(self)
+        other._clean_data = list(self._clean_data)
+        return other
+
+    def __setstate__(self, state):
+        '''
+        Restore the attributes after unpickling and re-attach the list-like
+        register values, which are pickled without their owner
+
+        '''
+        self.__dict__.update(state)
+        for value in state.values():
+            if isinstance(value, _Smart_Array):
+                value.owner = self
+
+    def _register_changed(self, register_name):
+        '''
+        Flag the register image of ``register_name`` as out of date
+
+        '''
+        self._changed_registers.add(register_name)
+
+    def _update_register_image(self):
+        '''
+        Re-encode the changed register names into the register image
+
+        '''
+        while self._changed_registers:
+            register_name = self._changed_registers.pop()
+            register_range = self.register_map[register_name]
+            value = getattr(self, register_name)
+            if isinstance(value, _Smart_Array) \
+                    and self.register_map_inv[register_range[0]] == [register_name]:
+                # pack list-like registers directly
+                start_bit, end_bit = self.bit_map[register_name]
+                # (through a memoryview, the image may be a bytearray or numpy array)
+                memoryview(self._register_image)[register_range[0]:register_range[-1]+1] = \
+                    _register_values(value.values, (end_bit-start_bit)//len(value),
+                        self._endian).tobytes()
+                continue
+            for register_addr, register_bits in getattr(self, register_name+'_data'):
+                self._register_image[register_addr] = bah.touint(register_bits, endian=self._endian)
+
+    def _set_register_image(self, image):
+        '''
+        Use ``image`` (e.g. a row of a ``ConfigurationMatrix``) to store the
+        register image, the current register values are copied into it
+
+        '''
+        self._update_register_image()
+        # (through a memoryview, either image may be a bytearray or numpy array)
+        memoryview(image)[:] = bytes(self._register_image)
+        self._register_image = image
+
+    def _decode_register_image(self, register_names):
+        '''
+        Set the values of ``register_names`` from the register image
+
+        '''
+        for register_name in register_names:
+            register_range = self.register_map[register_name]
+            start_bit, end_bit = self.bit_map[register_name]
+            bits = bitarray(endian=self._endian)
+            bits.frombytes(bytes(self._register_image[register_range[0]:register_range[-1]+1]))
+            setattr(self, register_name+'_data', bits[start_bit%8:end_bit-start_bit+start_bit%8])
+
+    def register_image(self):
+        '''
+        Return the values of all physical registers as ``bytes``, the value
+        of register address ``i`` (as sent in a config write packet) is
+        ``register_image()[i]``
+
+        '''
+        self._update_register_image()
+        return bytes(self._register_image)
+
+    def _register_data(self):
+        return self.register_image()
+
+    @classmethod
+    def default_register_image(cls):
+        '''
+        Return the register image (see ``register_image``) of the default
+        configuration, this is only computed once per class
+
+        '''
+        return cls._default_configuration().register_image()
+
+    def _changed_register_names(self, other):
+        '''
+        Return the register names that share a register address with a
+        register that differs between the register images of this and
+        ``other``
+
+        '''
+        if other.__class__ is not self.__class__:
+            return super(Configuration_v2, self)._changed_register_names(other)
+        changed = np.frombuffer(self.register_image(), dtype=np.uint8) \
+            != np.frombuffer(other.register_image(), dtype=np.uint8)
+        register_names = OrderedDict()
+        for address in np.flatnonzero(changed).tolist():
+            for register_name in self.register_map_inv[address]:
+                register_names[register_name] = None
+        return list(register_names)
+
     def all_data(self, endian='little'):
-        bits = []
-        for register_name in self.register_names:
-            register_data =  getattr(self, register_name+'_data')
-            for register_addr, register_bits in register_data:
-                if len(bits) == register_addr:
-                    if endian[0] == 'l':
-                        bits += [register_bits]
-                    else:
-                        bits += [register_bits[::-1]]
-        return bits
+        self._update_register_image()
+        return [bah.fromuint(value, 8, endian=endian) for value in self._register_image]
 
     def from_dict_registers(self, d, endian='little'):
         '''
@@ -75,10 +220,21 @@ class Configuration_v2(BaseConfiguration):
         value) pairs.
 
         '''
-        for address, value in d.items():
-            register_names = self.register_map_inv[address]
-            for register_name in register_names:
-                setattr(self, register_names[0] + '_data', (address, bah.fromuint(value,8,endian=endian)))
+        self._update_register_image()
+        old_image = bytes(self._register_image)
+        register_names = OrderedDict()
+        try:
+            for address, value in d.items():
+                self._register_image[address] = bah.touint(bah.fromuint(value,8,endian=endian), endian=self._endian)
+                for register_name in self.register_map_inv[address]:
+                    register_names[register_name] = None
+            self._decode_register_image(register_names)
+        except Exception:
+            # keep the register image consistent with the (possibly
+            # partially updated) register values
+            memoryview(self._register_image)[:] = old_image
+            self._changed_registers.update(register_names)
+            raise
         return
 
     def _is_register_value_pair(self, item):
@@ -94,6 +250,55 @@ class Configuration_v2(BaseConfiguration):
 
 ### Stuff for generating the v2 configuration properties
 
+## Register packing helpers
+#
+def _value_bits(values, n_bits, endian):
+    '''
+    Convert a sequence of ``n_bits`` values into a flat array of bits, in
+    the same order as concatenating ``bah.fromuint(value, n_bits, endian)``
+    for each value
+
+    '''
+    bits = (np.asarray(values, dtype=int)[:,np.newaxis] >> np.arange(n_bits)) & 1
+    if endian[0] == 'b':
+        bits = bits[:,::-1]
+    return bits.ravel().astype(np.uint8)
+
+def _bits_values(bits, n_bits, endian):
+    '''
+    Convert a bitarray into an array of ``n_bits`` values, the inverse of
+    ``_value_bits``
+
+    '''
+    bits = np.frombuffer(bits.unpack(), dtype=np.uint8).reshape(-1, n_bits)
+    weights = 1 << np.arange(n_bits)
+    if endian[0] == 'b':
+        weights = weights[::-1]
+    return bits.dot(weights)
+
+def _packbits(bits, endian):
+    '''
+    Pack an array of bits into register values (zero-padded up to a full
+    register), such that ``bah.fromuint(value, 8, endian)`` of each
+    register value gives the corresponding 8 bits
+
+    '''
+    if endian[0] == 'b':
+        return np.packbits(bits)
+    # equivalent to ``bitorder='little'``, which requires numpy 1.17
+    bits = np.append(bits, np.zeros(-len(bits) % 8, dtype=np.uint8))
+    return np.packbits(bits.reshape(-1, 8)[:,::-1])
+
+def _register_values(values, n_bits, endian):
+    '''
+    Pack a sequence of ``n_bits`` values into an array of register values
+
+    '''
+    if n_bits == 8:
+        return np.asarray(values).astype(np.uint8)
+    return _packbits(_value_bits(values, n_bits, endian), endian)
+# /Register packing helpers
+
 ## Getter function formulas
 #
 def _basic_getter(register_name):
@@ -115,6 +320,7 @@ def _basic_setter(register_name):
     '''
     def basic_setter_func(self, value):
         setattr(self, '_'+register_name, value)
+        self._register_changed(register_name)
     return basic_setter_func
 
 def _list_setter(register_name, min_value, max_value):
@@ -123,7 +329,9 @@ def _list_setter(register_name, min_value, max_value):
 
     '''
     def list_setter_func(self, value):
-        setattr(self, '_'+register_name, _Smart_List(value, min_value, max_value))
+        setattr(self, '_'+register_name, _Smart_Array(value, min_value, max_value,
+            owner=self, name=register_name))
+        self._register_changed(register_name)
     return list_setter_func
 
 # /Setter function formulas
@@ -158,13 +366,9 @@ def _list_data_getter(register_name, n_bits):
     '''
     def list_data_getter_func(self):
         register_range = self.register_map[register_name]
-        values = getattr(self, register_name)
-        all_data = bitarray([])
-        for value in values:
-            all_data += bah.fromuint(value, n_bits, endian=self._endian)
-        if len(all_data) < 8:
-            all_data += bitarray([0]*(8-len(all_data)%8)) # pad up to full register
-        return [(register_addr, all_data[idx*8:idx*8+8]) for idx, register_addr in enumerate(register_range)]
+        register_values = _register_values(getattr(self, register_name), n_bits, self._endian)
+        return [(register_addr, bah.fromuint(value, 8, endian=self._endian))
+            for register_addr, value in zip(register_range, register_values.tolist())]
     return list_data_getter_func
 
 def _compound_data_getter(registers):
@@ -200,13 +404,12 @@ def _compound_list_data_getter(registers, n_bits):
 
     '''
     def compound_list_data_getter_func(self):
+        register_values = _packbits(np.concatenate([
+            _value_bits(getattr(self, register_name), n_bits, self._endian)
+            for register_name in registers]), self._endian)
         bits = bitarray([])
-        for register_name in registers:
-            values = getattr(self, register_name)
-            for value in values:
-                bits += bah.fromuint(value, n_bits, endian=self._endian)
-        if len(bits)%8 != 0:
-            bits += bitarray([0]*(8-len(bits)%8)) # pad up to full register
+        for value in register_values.tolist():
+            bits += bah.fromuint(value, 8, endian=self._endian)
         return [(self.register_map[registers[0]][0], bits)]
     return compound_list_data_getter_func
 # /Data getter function formulas
@@ -264,9 +467,7 @@ def _list_data_setter(register_name, n_bits, min_value, max_value):
             setattr(self, register_name+'_data', all_bits[start_bit%8:end_bit-start_bit+start_bit%8])
         else:
             # use all bits to set values
-            bits = values
-            item_values = [bah.touint(bits[idx:idx+n_bits], endian=self._endian) for idx in range(0, len(bits), n_bits)]
-            setattr(self, register_name, _Smart_List(item_values, min_value, max_value))
+            setattr(self, register_name, _bits_values(values, n_bits, self._endian))
     return list_data_setter_func
 
 def _compound_data_setter(registers, register_name):
@@ -310,9 +511,7 @@ def _compound_list_data_setter(registers, register_name, n_bits, min_value, max_
                 start_bit, end_bit = self.bit_map[register]
                 setattr(self, register + '_data', set_bits[start_bit%8:end_bit-start_bit+start_bit%8])
         else:
-            set_bits = value
-            values = [bah.touint(set_bits[idx:idx+n_bits], endian=self._endian) for idx in range(0,len(set_bits),n_bits)]
-            setattr(self, register_name, _Smart_List(values, min_value, max_value))
+            setattr(self, register_name, _bits_values(value, n_bits, self._endian))
     return compound_list_data_setter_func
 # /Data setter function formulas
 
@@ -346,13 +545,23 @@ def _list_validator(value_types, min_value, max_value, n_values):
     def list_validator(func):
         @functools.wraps(func)
         def list_validated_func(self, values):
-            if not isinstance(values, (list, _Smart_List, tuple)):
-                raise TypeError('argument must be a list or tuple')
+            if isinstance(values, _Smart_Array):
+                array = values.values
+            elif isinstance(values, np.ndarray):
+                array = values
+            elif isinstance(values, (list, _Smart_List, tuple)):
+                array = None
+            else:
+                raise TypeError('argument must be a list, tuple, or array')
             if len(values) != n_values:
                 raise ValueError('length of list must be {}'.format(n_values))
-            if any([not isinstance(value, value_types) for value in values]):
+            if array is None:
+                if any([not isinstance(value, value_types) for value in values]):
+                    raise TypeError('values must be of type {}'.format(value_types))
+                array = np.array(values)
+            elif array.ndim != 1 or array.dtype.kind not in 'biu':
                 raise TypeError('values must be of type {}'.format(value_types))
-            if any([value > max_value or value < min_value for value in values]):
+            if array.min() < min_value or array.max() > max_value:
                 raise ValueError('values must be between {} and {}'.format(min_value,max_value))
             return func(self, values)
         return list_validated_func
@@ -663,6 +872,8 @@ def _generate_properties(cls, property_configuration, verbose=False):
         setattr(cls, _name, _prop)
         setattr(cls, _name+'_data', _prop_data)
 
+    cls._register_name_set = frozenset(cls.register_names)
+
     # Create a look up table from register address to names
     cls.register_map_inv = OrderedDict()
     for register_name, register_addr_range in cls.register_map.items():
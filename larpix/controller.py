@@ -1,5 +1,6 @@
 from collections import OrderedDict
 import warnings
+import asyncio
 import time
 import json
 import math
@@ -9,8 +10,8 @@ from copy import copy
 from . import configs
 from .key import Key
 from .chip import Chip
-from .configuration import Configuration_v1, Configuration_v2, Configuration_Lightpix_v1
-from .packet import Packet_v1, Packet_v2, PacketCollection
+from .configuration import Configuration_v1, Configuration_v2, Configuration_Lightpix_v1, ConfigurationMatrix
+from .packet import Packet_v1, Packet_v2, PacketCollection, PacketBatch
 from . import bitarrayhelper as bah
 
 class Controller(object):
@@ -126,9 +127,42 @@ class Controller(object):
             for io_channel in io_channels:
                 controller.init_network(io_group, io_channel) # update configurations and write to chips
 
+    Asyncio:
+
+    ``async_send``, ``async_read``, ``async_write_configuration``,
+    ``async_read_configuration``, ``async_multi_read_configuration``,
+    ``async_verify_registers``, and ``async_verify_configuration`` are
+    coroutine versions of the corresponding methods, for use within an
+    asyncio event loop. Rather than sleeping for the full ``timeout``, the
+    read methods return as soon as all of the requested registers have been
+    read back. If the ``io`` object provides coroutines (e.g.
+    ``larpix.io.AsyncPACMAN_IO``) they are awaited, otherwise the blocking
+    methods of the ``io`` object are used.::
+
+        controller.io = AsyncPACMAN_IO()
+        ok, diff = asyncio.run(controller.async_verify_configuration())
+
+    .. note:: Packets received by one of these coroutines are not seen by
+        another running concurrently on the same controller, so read several
+        chips with a single call, e.g. ``async_verify_configuration(chip_keys)``.
+
+    Detector-wide configuration:
+
+    For operations over many chips, ``build_config_matrix`` stores the
+    configuration registers of all (v2) chips in a single array (see
+    ``larpix.configuration.ConfigurationMatrix``), which the chip
+    configurations share.::
+
+        matrix = controller.build_config_matrix()
+        matrix.set('threshold_global', 40) # set on all chips
+        nondefault = matrix.compare() # differences from the default configuration
+        matrix.write('<configuration file>.json')
+
     Properties and attributes:
 
     - ``chips``: the ``Chip`` objects that the controller controls
+    - ``config_matrix``: the ``ConfigurationMatrix`` created by
+      ``build_config_matrix`` (``None`` until it is called)
     - ``reads``: list of all the PacketCollections that have been sent
       back to this controller. PacketCollections are created by
       ``run``, ``write_configuration``, ``read_configuration``,
@@ -140,6 +174,10 @@ class Controller(object):
 
     '''
     network_names = ('miso_us', 'miso_ds', 'mosi')
+    #: Polling interval in seconds used while waiting for responses (e.g.
+    #: ``read_configuration(early_return=True)``) if the io object does not
+    #: provide ``wait_for_data``
+    read_poll_interval = 0.01
 
     def __init__(self):
         self.chips = OrderedDict()
@@ -148,6 +186,7 @@ class Controller(object):
         self.nreads = 0
         self.io = None
         self.logger = None
+        self.config_matrix = None
 
     def __getitem__(self, key):
         '''
@@ -279,22 +318,29 @@ class Controller(object):
 
         :param root_first_traversal: ``True`` to traverse network starting from root nodes then increasing in network depth, ``False`` to traverse network starting from nodes furthest from root nodes and then decreasing in network depth
 
+        '''
+        ordered_ids = [chip_id for chip_ids in self._network_levels(io_group, io_channel) for chip_id in chip_ids]
+        if root_first_traversal:
+            return ordered_ids
+        return ordered_ids[::-1]
+
+    def _network_levels(self, io_group, io_channel):
+        '''
+        :returns: ``list`` of the chip ids at each depth within the miso_us network, starting from the root nodes
+
         '''
         subnetwork = self.network[io_group][io_channel]['miso_us']
-        ordered_ids = []
+        levels = []
 
         chip_ids = [chip_id for chip_id in subnetwork.nodes() if subnetwork.nodes[chip_id]['root']]
 
         collected_chips = set(chip_ids)
 
         while chip_ids:
-            for chip_id in chip_ids:
-                ordered_ids.append(chip_id)
-                collected_chips.add(chip_id)
+            levels.append(chip_ids)
+            collected_chips.update(chip_ids)
             chip_ids = [link[1] for link in subnetwork.out_edges(chip_ids) if not link[1] in collected_chips]
-        if root_first_traversal:
-            return ordered_ids
-        return ordered_ids[::-1]
+        return levels
 
     def get_network_keys(self, io_group, io_channel, root_first_traversal=True):
         '''
@@ -347,6 +393,28 @@ class Controller(object):
         for network_name in self.network_names:
             self.network[io_group][io_channel][network_name].remove_node(chip_key.chip_id)
 
+    def build_config_matrix(self, chip_keys=None):
+        '''
+        Create a ``ConfigurationMatrix`` from the configurations of the
+        specified chips and store it in ``config_matrix``. The chip
+        configurations then share the register matrix, see
+        ``ConfigurationMatrix``.
+
+        Chips that are added later are not included, call this method again
+        to create a new matrix.
+
+        :param chip_keys: chip keys to include, all chips must use the same configuration class (default: all chips)
+
+        :returns: ``ConfigurationMatrix``
+
+        '''
+        if chip_keys is None:
+            chip_keys = self.chips.keys()
+        chips = OrderedDict([(chip.chip_key, chip)
+            for chip in [self[chip_key] for chip_key in chip_keys]])
+        self.config_matrix = ConfigurationMatrix(chips)
+        return self.config_matrix
+
     def load(self, filename):
         '''
         Loads the specified file that describes the chip ids and IO network
@@ -614,7 +682,7 @@ class Controller(object):
 
     def grow_network(self, io_group, io_channel, chip_id,
         miso_uart_map=[3,0,1,2], mosi_uart_map=[0,1,2,3], usds_link_map=[2,3,0,1],
-        chip_id_generator=_default_chip_id_generator, timeout=0.01,
+        chip_id_generator=_default_chip_id_generator, timeout=1,
         modify_mosi=False, differential=True, version=2
         ):
         '''
@@ -690,12 +758,14 @@ class Controller(object):
 
         return network
 
-    def init_network_and_verify(self, io_group=1, io_channel=1, chip_id=None, timeout=0.2, retries=10, modify_mosi=True, differential=True):
+    def init_network_and_verify(self, io_group=1, io_channel=1, chip_id=None, timeout=1, retries=10, modify_mosi=True, differential=True):
         '''
         Runs init network, verifying that registers are updated properly at each step
         Will exit if any chip network configuration cannot be set correctly after
         ``retries`` attempts
 
+        :param timeout: how long to wait for each verification response in seconds (optional)
+
         '''
         if chip_id is None:
             chip_ids = self.get_network_ids(io_group, io_channel, root_first_traversal=True)
@@ -705,15 +775,7 @@ class Controller(object):
                     return ok,diff
             return ok,dict()
 
-        keys_to_verify = list()
-        if isinstance(chip_id,int):
-            keys_to_verify.append(Key(io_group,io_channel,chip_id))
-        for us_link in self.network[io_group][io_channel]['miso_us'].in_edges(chip_id):
-            if not isinstance(us_link[0], int):
-                continue
-            parent_chip_id = us_link[0]
-            keys_to_verify.append(Key(io_group, io_channel, parent_chip_id))
-
+        keys_to_verify = self._init_network_keys(io_group, io_channel, chip_id)
         if not keys_to_verify:
             return True,dict()
         print('init',io_group,io_channel,chip_id)
@@ -725,11 +787,75 @@ class Controller(object):
                 self.write_configuration(chip_key, diff[chip_key].keys())
             ok,diff = self.verify_registers([
                 (chip_key, list(diff[chip_key].keys())) for chip_key in diff
-            ])
+            ], timeout=timeout)
         if not ok:
             print('Failed to verify network nodes {}'.format(diff.keys()))
         return ok,diff
 
+    def init_networks_and_verify(self, networks=None, timeout=1, retries=10, modify_mosi=True, differential=True, early_return=False):
+        '''
+        Runs init network on multiple Hydra networks in parallel, verifying
+        that registers are updated properly at each step
+
+        Independent networks (i.e. different io channels or io groups) are
+        initialized one level of network depth at a time: all of the chips
+        at the same depth of every network are initialized with a single
+        call to ``send``, then all of the initialized chips and their
+        parents are verified with a single read (see ``init_networks``).
+        Only the registers that do not match are rewritten and re-verified,
+        up to ``retries`` times. The time taken then scales with the depth
+        of the deepest network, rather than the total number of chips.
+
+        Will exit if any chip network configuration cannot be set correctly
+        after ``retries`` attempts.
+
+        :param networks: ``list`` of ``(io_group, io_channel)`` networks to initialize, ``None`` for all networks (optional)
+
+        :param timeout: how long to wait for each verification response in seconds (optional)
+
+        :param retries: maximum number of times to rewrite mismatched registers (optional)
+
+        :param early_return: stop waiting for responses once all registers have responded, see ``read_configuration`` (optional)
+
+        :returns: 2-``tuple`` with same format as ``controller.verify_registers``
+
+        '''
+        return self.init_networks(networks, modify_mosi=modify_mosi, differential=differential,
+            verify=True, timeout=timeout, retries=retries, early_return=early_return)
+
+    def _verify_network_nodes(self, chip_keys, timeout=1, retries=10, early_return=False):
+        '''
+        Verify the network configuration of ``chip_keys``, rewriting and
+        re-verifying only the mismatched registers up to ``retries`` times
+
+        :returns: 2-``tuple`` with same format as ``controller.verify_registers``
+
+        '''
+        ok,diff = self.verify_network(chip_keys, timeout=timeout, early_return=early_return)
+        for _ in range(retries):
+            if ok: break
+            chip_key_register_pairs = [(chip_key, list(diff[chip_key].keys())) for chip_key in diff]
+            self.multi_write_configuration(chip_key_register_pairs)
+            ok,diff = self.verify_registers(chip_key_register_pairs, timeout=timeout, early_return=early_return)
+        if not ok:
+            print('Failed to verify network nodes {}'.format(diff.keys()))
+        return ok,diff
+
+    def _init_network_keys(self, io_group, io_channel, chip_id):
+        '''
+        :returns: ``list`` of the chip keys modified when initializing ``chip_id``, i.e. the chip and its ``miso_us`` parents
+
+        '''
+        keys_to_verify = list()
+        if isinstance(chip_id,int):
+            keys_to_verify.append(Key(io_group,io_channel,chip_id))
+        for us_link in self.network[io_group][io_channel]['miso_us'].in_edges(chip_id):
+            if not isinstance(us_link[0], int):
+                continue
+            parent_chip_id = us_link[0]
+            keys_to_verify.append(Key(io_group, io_channel, parent_chip_id))
+        return keys_to_verify
+
     def init_network(self, io_group=1, io_channel=1, chip_id=None, modify_mosi=True, differential=True):
         '''
         Configure a Hydra io node specified by chip_id, if none are specified,
@@ -743,13 +869,81 @@ class Controller(object):
          - Write enable_mosi to chip chip_id (optional)
 
         '''
-        subnetwork = self.network[io_group][io_channel]
         if chip_id is None:
             chip_ids = self.get_network_ids(io_group, io_channel, root_first_traversal=True)
             for chip_id in chip_ids:
                 self.init_network(io_group, io_channel, chip_id=chip_id, modify_mosi=modify_mosi, differential=differential)
             return
 
+        self.send(self._init_network_packets(io_group, io_channel, chip_id, modify_mosi=modify_mosi, differential=differential))
+
+    def init_networks(self, networks=None, modify_mosi=True, differential=True, verify=False, timeout=1, retries=10, early_return=False):
+        '''
+        Configure multiple Hydra io networks, one level of network depth at
+        a time
+
+        The chips at each depth of the ``miso_us`` network, across all of
+        the specified networks, are initialized with a single call to
+        ``send`` (see ``init_network`` for the steps for each chip). Within
+        each io channel the packets are sent in the same order as by
+        ``init_network``, so sibling chips still receive their chip ids one
+        after another; with ``PACMAN_IO`` the packets for different io
+        channels are interleaved (see
+        ``PACMAN_IO.interleave_packets_by_io_channel``). A network with N
+        chips then takes one send per level rather than one per chip.
+
+        If ``verify`` is ``True``, the network configuration of the chips at
+        each level (and their parents) is verified before continuing to the
+        next level, rewriting mismatched registers up to ``retries`` times,
+        and will exit if the configuration cannot be set correctly.
+
+        :param networks: ``list`` of ``(io_group, io_channel)`` networks to initialize, ``None`` for all networks (optional)
+
+        :param verify: verify each level before initializing the next (optional)
+
+        :param timeout: how long to wait for each verification response in seconds (optional)
+
+        :param retries: maximum number of times to rewrite mismatched registers (optional)
+
+        :param early_return: stop waiting for responses once all registers have responded, see ``read_configuration`` (optional)
+
+        :returns: 2-``tuple`` with same format as ``controller.verify_registers`` (``True`` and an empty ``dict`` if ``verify`` is ``False``)
+
+        '''
+        if networks is None:
+            networks = [(io_group, io_channel)
+                for io_group in self.network
+                for io_channel in self.network[io_group]]
+        levels = []
+        for io_group, io_channel in networks:
+            for depth, chip_ids in enumerate(self._network_levels(io_group, io_channel)):
+                if depth == len(levels):
+                    levels.append([])
+                levels[depth] += [(io_group, io_channel, chip_id) for chip_id in chip_ids]
+        for level in levels:
+            packets = []
+            keys_to_verify = []
+            for io_group, io_channel, chip_id in level:
+                packets += self._init_network_packets(io_group, io_channel, chip_id, modify_mosi=modify_mosi, differential=differential)
+                keys_to_verify += self._init_network_keys(io_group, io_channel, chip_id)
+            if not packets:
+                continue
+            self.send(packets)
+            if verify and keys_to_verify:
+                ok,diff = self._verify_network_nodes(list(OrderedDict.fromkeys(keys_to_verify)), timeout=timeout, retries=retries, early_return=early_return)
+                if not ok:
+                    return ok,diff
+        return True,dict()
+
+    def _init_network_packets(self, io_group, io_channel, chip_id, modify_mosi=True, differential=True):
+        '''
+        Update the configurations of a Hydra io node and its parents, see
+        ``init_network``
+
+        :returns: ``list`` of packets to send to initialize the node
+
+        '''
+        subnetwork = self.network[io_group][io_channel]
         packets = []
         chip_key = None
         if isinstance(chip_id, int):
@@ -796,7 +990,7 @@ class Controller(object):
                     self[chip_key].config.enable_mosi[mosi_uart] = 1
                 packets += self[chip_key].get_configuration_write_packets(registers=self[chip_key].config.register_map['enable_mosi'])
 
-        self.send(packets)
+        return packets
 
     def reset_network(self, io_group=1, io_channel=1, chip_id=None):
         '''
@@ -891,7 +1085,8 @@ class Controller(object):
 
         The returned list will contain packets that arrived since the
         last call to ``read`` or ``start_listening``, whichever was most
-        recent.
+        recent. If the io object returns a ``PacketBatch``, it is passed
+        to the logger and returned without conversion.
 
         '''
         timestamp = time.time()
@@ -906,7 +1101,7 @@ class Controller(object):
         return packets, bytestream
 
     def write_configuration(self, chip_key, registers=None, write_read=0,
-                            message=None, connection_delay=0.2):
+                            message=None, connection_delay=0.2, only_dirty=False):
         '''
         Send the configurations stored in chip.config to the LArPix
         ASIC.
@@ -929,30 +1124,103 @@ class Controller(object):
         lot of data is expected, you should handle the reads manually
         and set write_read to 0 (default).
 
+        If ``only_dirty`` is ``True``, only the registers that have changed
+        since they were last written or verified are sent (see
+        ``Configuration.dirty_registers``), and nothing is sent if no
+        registers have changed. The sent registers are marked as clean
+        (only if there is an io object to send them).
+
+        '''
+        packets, written = self._configuration_packets([(chip_key, registers)],
+            write=True, only_dirty=only_dirty)
+        if only_dirty and not packets:
+            return
+        message = self._configuration_message('configuration write', message)
+        self._write_registers(packets, written, message, write_read, connection_delay)
+
+    @staticmethod
+    def _configuration_message(prefix, message):
+        '''
+        :returns: the message stored with the packets of a configuration read or write
+
+        '''
+        if message is None:
+            return prefix
+        return prefix + ': ' + message
+
+    @staticmethod
+    def _configuration_registers(chip, registers):
+        '''
+        Resolve the ``registers`` argument of the configuration read and write
+        methods (``None`` for all, an ``int``, a register name, or an iterable
+        of ``int``)
+
+        :returns: ``list`` of register addresses
+
         '''
-        chip = self[chip_key]
         if registers is None:
-            registers = list(range(chip.config.num_registers))
+            return list(range(chip.config.num_registers))
         elif isinstance(registers, int):
-            registers = [registers]
+            return [registers]
         elif isinstance(registers, str):
-            registers = list(chip.config.register_map[registers])
-        else:
-            pass
-        if message is None:
-            message = 'configuration write'
-        else:
-            message = 'configuration write: ' + message
-        packets = chip.get_configuration_write_packets(registers)
-        already_listening = False
+            return list(chip.config.register_map[registers])
+        return list(registers)
+
+    def _configuration_packets(self, chip_reg_pairs, write, only_dirty=False):
+        '''
+        Build the configuration write (or read) packets for ``chip_reg_pairs``,
+        see ``multi_write_configuration``
+
+        :returns: 2-``tuple`` of the ``list`` of packets and a ``list`` of ``(chip, registers)``
+
+        '''
+        packets = []
+        chip_registers = []
+        for chip_reg_pair in chip_reg_pairs:
+            if not isinstance(chip_reg_pair, tuple):
+                chip_reg_pair = (chip_reg_pair, None)
+            chip_key, registers = chip_reg_pair
+            chip = self[chip_key]
+            registers = self._configuration_registers(chip, registers)
+            if write:
+                if only_dirty:
+                    registers = self._dirty_subset(chip, registers)
+                packets.extend(chip.get_configuration_write_packets(registers))
+            else:
+                packets.extend(chip.get_configuration_read_packets(registers))
+            chip_registers.append((chip, registers))
+        return packets, chip_registers
+
+    def _is_listening(self):
+        '''
+        :returns: ``True`` if there is an io object and it is listening
+
+        '''
+        return bool(self.io) and self.io.is_listening
+
+    def _mark_written(self, chip_registers):
+        '''
+        Mark the written ``(chip, registers)`` as clean, the registers only
+        reach the chips if there is an io object
+
+        '''
         if self.io:
-            already_listening = self.io.is_listening
-        mess_with_listening = write_read != 0 and not already_listening
+            for chip, registers in chip_registers:
+                chip.config.mark_clean(registers)
+
+    def _write_registers(self, packets, written, message, write_read, connection_delay):
+        '''
+        Send the config write ``packets``, mark the ``written`` registers as
+        clean, and store the response, see ``write_configuration``
+
+        '''
+        mess_with_listening = write_read != 0 and not self._is_listening()
         if mess_with_listening:
             self.start_listening()
             time.sleep(connection_delay)
             stop_time = time.time() + write_read
         self.send(packets)
+        self._mark_written(written)
         if mess_with_listening:
             sleep_time = stop_time - time.time()
             if sleep_time > 0:
@@ -962,7 +1230,7 @@ class Controller(object):
             self.store_packets(packets, bytestream, message)
 
     def read_configuration(self, chip_key, registers=None, timeout=1,
-                           message=None, connection_delay=0.2):
+                           message=None, connection_delay=0.2, early_return=False):
         '''
         Send "configuration read" requests to the LArPix ASIC.
 
@@ -978,39 +1246,18 @@ class Controller(object):
         packet is sent out, and will save any received packets in the
         ``reads`` data member.
 
+        If ``early_return`` is ``True``, the io queue is read until a config
+        read packet has been received for every requested register, or until
+        ``timeout`` seconds have passed (also if the controller is already
+        listening), rather than waiting for the full ``timeout``.
+
         '''
-        chip = self[chip_key]
-        if registers is None:
-            registers = list(range(chip.config.num_registers))
-        elif isinstance(registers, int):
-            registers = [registers]
-        elif isinstance(registers, str):
-            registers = chip.config.register_map[registers]
-        else:
-            pass
-        if message is None:
-            message = 'configuration read'
-        else:
-            message = 'configuration read: ' + message
-        packets = chip.get_configuration_read_packets(registers)
-        already_listening = False
-        if self.io:
-            already_listening = self.io.is_listening
-        if not already_listening:
-            self.start_listening()
-            time.sleep(connection_delay)
-            stop_time = time.time() + timeout
-        self.send(packets)
-        if not already_listening:
-            sleep_time = stop_time - time.time()
-            if sleep_time > 0:
-                time.sleep(sleep_time)
-        packets, bytestream = self.read()
-        self.stop_listening()
-        self.store_packets(packets, bytestream, message)
+        packets, _ = self._configuration_packets([(chip_key, registers)], write=False)
+        message = self._configuration_message('configuration read', message)
+        self._read_registers(packets, message, timeout, connection_delay, early_return)
 
     def multi_write_configuration(self, chip_reg_pairs, write_read=0,
-                                  message=None, connection_delay=0.2):
+                                  message=None, connection_delay=0.2, only_dirty=False):
         '''
         Send multiple write configuration commands at once.
 
@@ -1034,45 +1281,31 @@ class Controller(object):
         >>> controller.multi_write_configuration([(chip_key1, 1), (chip_key2, 2), ...])
         >>> controller.multi_write_configuration([(chip_key1, range(10)), chip_key2, ...])
 
+        This writes only the registers that have changed on each chip, e.g.
+        to update the configuration of the whole detector after modifying a
+        few registers
+
+        >>> controller.multi_write_configuration(controller.chips, only_dirty=True)
+
         '''
-        if message is None:
-            message = 'multi configuration write'
-        else:
-            message = 'multi configuration write: ' + message
-        packets = []
-        for chip_reg_pair in chip_reg_pairs:
-            if not isinstance(chip_reg_pair, tuple):
-                chip_reg_pair = (chip_reg_pair, None)
-            chip_key, registers = chip_reg_pair
-            chip = self[chip_key]
-            if registers is None:
-                registers = list(range(chip.config.num_registers))
-            elif isinstance(registers, int):
-                registers = [registers]
-            else:
-                pass
-            one_chip_packets = chip.get_configuration_write_packets(registers)
-            packets.extend(one_chip_packets)
-        already_listening = False
-        if self.io:
-            already_listening = self.io.is_listening
-        mess_with_listening = write_read != 0 and not already_listening
-        if mess_with_listening:
-            self.start_listening()
-            time.sleep(connection_delay)
-            stop_time = time.time() + write_read
-        self.send(packets)
-        if mess_with_listening:
-            sleep_time = stop_time - time.time()
-            if sleep_time > 0:
-                time.sleep(sleep_time)
-            #time.sleep(stop_time - time.time())
-            packets, bytestream = self.read()
-            self.stop_listening()
-            self.store_packets(packets, bytestream, message)
+        packets, written = self._configuration_packets(chip_reg_pairs,
+            write=True, only_dirty=only_dirty)
+        if only_dirty and not packets:
+            return
+        message = self._configuration_message('multi configuration write', message)
+        self._write_registers(packets, written, message, write_read, connection_delay)
+
+    @staticmethod
+    def _dirty_subset(chip, registers):
+        '''
+        :returns: ``list`` of the ``registers`` of ``chip`` that are dirty, in the same order
+
+        '''
+        dirty_registers = set(chip.config.dirty_registers())
+        return [register for register in registers if register in dirty_registers]
 
     def multi_read_configuration(self, chip_reg_pairs, timeout=1,
-                                 message=None, connection_delay=0.2):
+                                 message=None, connection_delay=0.2, early_return=False):
         '''
         Send multiple read configuration commands at once.
 
@@ -1095,41 +1328,77 @@ class Controller(object):
         >>> controller.multi_read_configuration([(chip_key1, 1), (chip_key2, 2), ...])
         >>> controller.multi_read_configuration([(chip_key1, range(10)), chip_key2, ...])
 
+        If ``early_return`` is ``True``, returns as soon as all of the
+        registers have been read back, see ``read_configuration``.
+
         '''
-        if message is None:
-            message = 'multi configuration read'
-        else:
-            message = 'multi configuration read: ' + message
-        packets = []
-        for chip_reg_pair in chip_reg_pairs:
-            if not isinstance(chip_reg_pair, tuple):
-                chip_reg_pair = (chip_reg_pair, None)
-            chip_key, registers = chip_reg_pair
-            chip = self[chip_key]
-            if registers is None:
-                registers = list(range(chip.config.num_registers))
-            elif isinstance(registers, int):
-                registers = [registers]
-            else:
-                pass
-            one_chip_packets = chip.get_configuration_read_packets(registers)
-            packets += one_chip_packets
-        already_listening = False
-        if self.io:
-            already_listening = self.io.is_listening
+        packets, _ = self._configuration_packets(chip_reg_pairs, write=False)
+        message = self._configuration_message('multi configuration read', message)
+        self._read_registers(packets, message, timeout, connection_delay, early_return)
+
+    def _read_registers(self, packets, message, timeout, connection_delay, early_return=False):
+        '''
+        Send the config read ``packets`` and store the response, see
+        ``read_configuration``
+
+        '''
+        already_listening = self._is_listening()
         if not already_listening:
             self.start_listening()
             time.sleep(connection_delay)
-            stop_time = time.time() + timeout
+        stop_time = time.time() + timeout
+        done = self._config_read_done(packets)
         self.send(packets)
-        if not already_listening:
-            sleep_time = stop_time - time.time()
-            if sleep_time > 0:
-                time.sleep(sleep_time)
-        packets, bytestream = self.read()
+        if early_return:
+            packets, bytestream = self._read_until(done, stop_time - time.time())
+        else:
+            if not already_listening:
+                sleep_time = stop_time - time.time()
+                if sleep_time > 0:
+                    time.sleep(sleep_time)
+            packets, bytestream = self.read()
         self.stop_listening()
         self.store_packets(packets, bytestream, message)
 
+    @staticmethod
+    def _config_read_done(packets):
+        '''
+        :returns: a function that is called with each batch of received packets and returns ``True`` once a config read packet has been received for each of the config read requests in ``packets``
+
+        '''
+        expected = set([(packet.chip_key, packet.register_address) for packet in packets])
+        def done(read_packets):
+            for packet in read_packets:
+                if hasattr(packet, 'CONFIG_READ_PACKET') and packet.packet_type == packet.CONFIG_READ_PACKET:
+                    expected.discard((packet.chip_key, packet.register_address))
+            return not expected
+        return done
+
+    def _read_until(self, done, timeout):
+        '''
+        Read packets until ``done(<new packets>)`` returns ``True`` or for
+        ``timeout`` seconds
+
+        :returns: ``tuple`` of (``list`` of packets, bytestream)
+
+        '''
+        stop_time = time.time() + timeout
+        packets = []
+        bytestreams = []
+        while True:
+            read_packets, read_bytestream = self.read()
+            packets.extend(read_packets)
+            bytestreams.append(read_bytestream)
+            remaining = stop_time - time.time()
+            if done(read_packets) or remaining <= 0:
+                break
+            wait_for_data = getattr(self.io, 'wait_for_data', None)
+            if wait_for_data is not None:
+                wait_for_data(remaining)
+            else:
+                time.sleep(min(remaining, self.read_poll_interval))
+        return packets, b''.join(bytestreams)
+
     def run(self, timelimit, message):
         '''
         Read data from the LArPix ASICs for the given ``timelimit`` and
@@ -1144,13 +1413,17 @@ class Controller(object):
         while time.time() - start_time < timelimit:
             time.sleep(sleeptime)
             read_packets, read_bytestream = self.read()
-            packets.extend(read_packets)
+            packets.append(read_packets)
             bytestreams.append(read_bytestream)
         self.stop_listening()
+        if packets and all([isinstance(read_packets, PacketBatch) for read_packets in packets]):
+            packets = PacketBatch.concatenate(packets)
+        else:
+            packets = [packet for read_packets in packets for packet in read_packets]
         data = b''.join(bytestreams)
         self.store_packets(packets, data, message)
 
-    def verify_registers(self, chip_key_register_pairs, timeout=1, connection_delay=0.02, n=1):
+    def verify_registers(self, chip_key_register_pairs, timeout=1, connection_delay=0.02, n=1, early_return=False):
         '''
         Read chip configuration from specified chip and registers and return ``True`` if the
         read chip configuration matches the current configuration stored in chip instance.
@@ -1161,11 +1434,36 @@ class Controller(object):
 
         :param n: sets maximum recursion depth, will continue to attempt to verify registers until this depth is reached or all registers have responded, a value <1 allows for infinite recursion (optional)
 
+        :param early_return: if ``True``, stop waiting for responses once all registers have responded, see ``read_configuration`` (optional)
+
         :returns: 2-``tuple`` of a ``bool`` representing if all registers match and a ``dict`` representing all differences. Differences are specified as ``{<chip_key>: {<register>: (<expected>, <read>)}}``
 
         '''
-        return_value = True
-        different_fields = {}
+        registers = self._registers_by_chip(chip_key_register_pairs)
+        self.multi_read_configuration(chip_key_register_pairs, timeout=timeout, connection_delay=connection_delay, early_return=early_return)
+        return_value, configuration_data = self._verify_read_registers(registers)
+        if not return_value and n != 1:
+            retry_chip_key_register_pairs = self._registers_to_retry(configuration_data)
+            if len(retry_chip_key_register_pairs):
+                retry_result = self.verify_registers(
+                    retry_chip_key_register_pairs,
+                    timeout=timeout,
+                    connection_delay=connection_delay,
+                    n=n-1,
+                    early_return=early_return
+                    )
+                return_value = self._merge_retry(configuration_data,
+                    retry_chip_key_register_pairs, retry_result)
+        return (return_value, configuration_data)
+
+    @staticmethod
+    def _registers_by_chip(chip_key_register_pairs):
+        '''
+        Collect the registers of each chip in ``chip_key_register_pairs``
+
+        :returns: ``dict`` of ``{<chip_key>: [<register>, ...]}``
+
+        '''
         registers = {}
         for chip_key, chip_registers in chip_key_register_pairs:
             if not isinstance(chip_registers, (list,tuple,range)):
@@ -1178,13 +1476,23 @@ class Controller(object):
                     registers[chip_key] += list(chip_registers)
                 else:
                     registers[chip_key] = list(chip_registers)
-        self.multi_read_configuration(chip_key_register_pairs, timeout=timeout, connection_delay=connection_delay)
+        return registers
+
+    def _compare_registers(self, registers, packets):
+        '''
+        Compare the config read packets in ``packets`` to the stored
+        configuration of the chip registers in ``registers``
+
+        :returns: 2-``tuple`` with same format as ``verify_registers``
+
+        '''
+        return_value = True
         configuration_data = dict([
             (chip_key, dict([
                 (register,(None, None))
                 for register in chip_registers]))
             for chip_key, chip_registers in registers.items()])
-        for packet in self.reads[-1]:
+        for packet in packets:
             packet_key = packet.chip_key
             if (hasattr(packet,'CONFIG_READ_PACKET') and packet.packet_type == packet.CONFIG_READ_PACKET):
                 register_address = packet.register_address
@@ -1192,11 +1500,10 @@ class Controller(object):
                     configuration_data[packet_key][register_address] = (None, packet.register_data)
 
         for chip_key in registers.keys():
-            expected_data = dict()
             if self[chip_key].asic_version == 1:
                 expected_data = dict([(register_address, bah.touint(bits)) for register_address, bits in enumerate(self[chip_key].config.all_data())])
             else:
-                expected_data = dict([(register_address, bah.touint(bits, endian=Packet_v2.endian)) for register_address, bits in enumerate(self[chip_key].config.all_data())])
+                expected_data = self[chip_key].config.register_image()
 
             for register in set(registers[chip_key]):
                 configuration_data[chip_key][register] = (expected_data[register], configuration_data[chip_key][register][1])
@@ -1206,29 +1513,61 @@ class Controller(object):
                     del configuration_data[chip_key][register]
             if not len(configuration_data[chip_key]):
                 del configuration_data[chip_key]
-
-        if not return_value and n != 1:
-            retry_chip_key_register_pairs = [(key,register) for key,value in configuration_data.items() for register in value if value[register][-1] is None]
-            if len(retry_chip_key_register_pairs):
-                retry_return_value, retry_configuration_data = self.verify_registers(
-                    retry_chip_key_register_pairs,
-                    timeout=timeout,
-                    connection_delay=connection_delay,
-                    n=n-1
-                    )
-                for chip_key in retry_configuration_data.keys():
-                    configuration_data[chip_key].update(retry_configuration_data[chip_key])
-                for chip_key,register in retry_chip_key_register_pairs:
-                    if chip_key not in retry_configuration_data or register not in retry_configuration_data[chip_key]:
-                        del configuration_data[chip_key][register]
-                return_value = all([
-                    configuration_data[chip_key][register][0] == configuration_data[chip_key][register][1]
-                    for chip_key in configuration_data
-                    for register in configuration_data[chip_key]
-                    ])
         return (return_value, configuration_data)
 
-    def verify_configuration(self, chip_keys=None, timeout=1, connection_delay=0.02, n=1):
+    def _verify_read_registers(self, registers):
+        '''
+        Compare the last read to the stored configuration of the chip
+        ``registers`` and mark them as verified, see ``verify_registers``
+
+        :returns: 2-``tuple`` with same format as ``verify_registers``
+
+        '''
+        return_value, configuration_data = self._compare_registers(registers, self.reads[-1])
+        self._mark_verified(registers, configuration_data)
+        return return_value, configuration_data
+
+    def _mark_verified(self, registers, configuration_data):
+        '''
+        Mark the verified registers as clean and the registers that did not
+        match (or respond) as dirty
+
+        '''
+        for chip_key, chip_registers in registers.items():
+            different = configuration_data.get(chip_key, dict())
+            self[chip_key].config.mark_clean([register for register in chip_registers if register not in different])
+            self[chip_key].config.mark_dirty(list(different.keys()))
+
+    @staticmethod
+    def _registers_to_retry(configuration_data):
+        '''
+        :returns: ``list`` of ``(chip_key, register)`` of the registers that did not respond
+
+        '''
+        return [(key,register) for key,value in configuration_data.items() for register in value if value[register][-1] is None]
+
+    @staticmethod
+    def _merge_retry(configuration_data, retry_chip_key_register_pairs, retry_result):
+        '''
+        Update ``configuration_data`` with the result of verifying the
+        ``retry_chip_key_register_pairs``
+
+        :returns: ``True`` if all registers now match
+
+        '''
+        retry_return_value, retry_configuration_data = retry_result
+        for chip_key in retry_configuration_data.keys():
+            configuration_data[chip_key].update(retry_configuration_data[chip_key])
+        for chip_key,register in retry_chip_key_register_pairs:
+            if chip_key not in retry_configuration_data or register not in retry_configuration_data[chip_key]:
+                del configuration_data[chip_key][register]
+        return all([
+            configuration_data[chip_key][register][0] == configuration_data[chip_key][register][1]
+            for chip_key in configuration_data
+            for register in configuration_data[chip_key]
+            ])
+
+    def verify_configuration(self, chip_keys=None, timeout=1, connection_delay=0.02, n=1, early_return=False):
         '''
         Read chip configuration from specified chip(s) and return ``True`` if the
         read chip configuration matches the current configuration stored in chip instance.
@@ -1244,17 +1583,28 @@ class Controller(object):
 
         :param n: set recursion limit for rechecking non-responding registers
 
+        :param early_return: if ``True``, stop waiting for responses once all registers have responded (optional)
+
         :returns: 2-``tuple`` with same format as ``controller.verify_registers``
 
+        '''
+        chip_key_register_pairs = self._all_registers(chip_keys)
+        return self.verify_registers(chip_key_register_pairs, timeout=timeout, connection_delay=connection_delay, n=n, early_return=early_return)
+
+    def _all_registers(self, chip_keys=None):
+        '''
+        :param chip_keys: a single chip key, a ``list`` of chip keys, or ``None`` for all chips
+
+        :returns: ``list`` of ``(chip_key, <all registers>)`` pairs
+
         '''
         if chip_keys is None:
             chip_keys = self.chips.keys()
         if isinstance(chip_keys,(str,Key)):
             chip_keys = [chip_keys]
-        chip_key_register_pairs = [(chip_key, range(self[chip_key].config.num_registers)) for chip_key in chip_keys]
-        return self.verify_registers(chip_key_register_pairs, timeout=timeout, connection_delay=connection_delay, n=n)
+        return [(chip_key, range(self[chip_key].config.num_registers)) for chip_key in chip_keys]
 
-    def verify_network(self, chip_keys=None, timeout=1):
+    def verify_network(self, chip_keys=None, timeout=1, early_return=False):
         '''
         Read chip network configuration from specified chip(s) and return ``True``
         if the read chip configurations matches
@@ -1264,6 +1614,8 @@ class Controller(object):
 
         :param timeout: how long to wait for response in seconds
 
+        :param early_return: if ``True``, stop waiting for responses once all registers have responded (optional)
+
         :returns: 2-``tuple`` with same format as ``controller.verify_registers``
 
         '''
@@ -1278,9 +1630,9 @@ class Controller(object):
             list(self[chip_key].config.register_map['enable_miso_downstream']) + \
             list(self[chip_key].config.register_map['enable_miso_differential']))
             for chip_key in chip_keys]
-        return self.verify_registers(chip_key_register_pairs)
+        return self.verify_registers(chip_key_register_pairs, timeout=timeout, early_return=early_return)
 
-    def enforce_registers(self, chip_key_register_pairs, timeout=1, connection_delay=0.02, n=1, n_verify=1):
+    def enforce_registers(self, chip_key_register_pairs, timeout=1, connection_delay=0.02, n=1, n_verify=1, early_return=False):
         '''
         Read chip configuration from specified chip and registers and write registers to
         read chip configurations that do not match the current configuration stored in chip instance.
@@ -1293,10 +1645,12 @@ class Controller(object):
 
         :param n_verify: maximum recursion depth for verify registers (optional)
 
+        :param early_return: if ``True``, stop waiting for responses once all registers have responded (optional)
+
         :returns: 2-``tuple`` with same format as ``controller.verify_registers``
 
         '''
-        ok,diff = self.verify_registers(chip_key_register_pairs, timeout=timeout, connection_delay=connection_delay, n=n_verify)
+        ok,diff = self.verify_registers(chip_key_register_pairs, timeout=timeout, connection_delay=connection_delay, n=n_verify, early_return=early_return)
         if not ok:
             chip_key_register_pairs = [
                 (chip_key, register)
@@ -1305,12 +1659,12 @@ class Controller(object):
                 ]
             self.multi_write_configuration(chip_key_register_pairs, write_read=0, connection_delay=connection_delay)
             if n != 1:
-                ok,diff = self.enforce_registers(chip_key_register_pairs, timeout=timeout, connection_delay=connection_delay, n=n-1, n_verify=n_verify)
+                ok,diff = self.enforce_registers(chip_key_register_pairs, timeout=timeout, connection_delay=connection_delay, n=n-1, n_verify=n_verify, early_return=early_return)
             else:
-                ok,diff = self.verify_registers(chip_key_register_pairs, timeout=timeout, connection_delay=connection_delay, n=n_verify)
+                ok,diff = self.verify_registers(chip_key_register_pairs, timeout=timeout, connection_delay=connection_delay, n=n_verify, early_return=early_return)
         return ok,diff
 
-    def enforce_configuration(self, chip_keys=None, timeout=1, connection_delay=0.02, n=1, n_verify=1):
+    def enforce_configuration(self, chip_keys=None, timeout=1, connection_delay=0.02, n=1, n_verify=1, early_return=False):
         '''
         Read chip configuration from specified chip(s) and write registers to
         read chip configuration that do not match the current configuration stored in chip instance.
@@ -1328,15 +1682,178 @@ class Controller(object):
 
         :param n_verify: set recursion limit for verifying registers (optional)
 
+        :param early_return: if ``True``, stop waiting for responses once all registers have responded (optional)
+
         :returns: 2-``tuple`` with same format as ``controller.verify_registers``
 
         '''
-        if chip_keys is None:
-            chip_keys = self.chips.keys()
-        if isinstance(chip_keys,(str,Key)):
-            chip_keys = [chip_keys]
-        chip_key_register_pairs = [(chip_key, range(self[chip_key].config.num_registers)) for chip_key in chip_keys]
-        return self.enforce_registers(chip_key_register_pairs, timeout=timeout, connection_delay=connection_delay, n=n, n_verify=n_verify)
+        chip_key_register_pairs = self._all_registers(chip_keys)
+        return self.enforce_registers(chip_key_register_pairs, timeout=timeout, connection_delay=connection_delay, n=n, n_verify=n_verify, early_return=early_return)
+
+    async def _async_io_call(self, name, *args):
+        '''
+        Await ``self.io.async_<name>(*args)`` if it exists, otherwise call
+        ``self.io.<name>(*args)``
+
+        '''
+        method = getattr(self.io, 'async_' + name, None)
+        if method is not None:
+            return await method(*args)
+        return getattr(self.io, name)(*args)
+
+    async def _async_wait_for_data(self, timeout):
+        wait_for_data = getattr(self.io, 'async_wait_for_data', None)
+        if wait_for_data is not None:
+            await wait_for_data(timeout)
+        else:
+            await asyncio.sleep(min(timeout, self.read_poll_interval))
+
+    async def _async_read_until(self, done, timeout):
+        '''
+        Read packets until ``done(<new packets>)`` returns ``True`` or for
+        ``timeout`` seconds
+
+        :returns: ``tuple`` of (``list`` of packets, bytestream)
+
+        '''
+        stop_time = time.time() + timeout
+        packets = []
+        bytestreams = []
+        while True:
+            read_packets, read_bytestream = await self.async_read()
+            packets.extend(read_packets)
+            bytestreams.append(read_bytestream)
+            remaining = stop_time - time.time()
+            if done(read_packets) or remaining <= 0:
+                break
+            await self._async_wait_for_data(remaining)
+        return packets, b''.join(bytestreams)
+
+    async def async_send(self, packets):
+        '''
+        Send the specified packets to the LArPix ASICs, see ``send``.
+
+        '''
+        if self.io:
+            await self._async_io_call('send', packets)
+        else:
+            warnings.warn('no IO object exists, no packets sent', RuntimeWarning)
+        if self.logger:
+            self.logger.record(packets, direction=self.logger.WRITE)
+
+    async def async_read(self):
+        '''
+        Read any packets that have arrived, see ``read``.
+
+        '''
+        packets = []
+        bytestream = b''
+        if self.io:
+            packets, bytestream = await self._async_io_call('empty_queue')
+        else:
+            warnings.warn('no IO object exists, no packets will be received', RuntimeWarning)
+        if self.logger:
+            self.logger.record(packets, direction=self.logger.READ)
+        return packets, bytestream
+
+    async def async_write_configuration(self, chip_key, registers=None, write_read=0,
+                                        message=None, connection_delay=0.2, only_dirty=False):
+        '''
+        Send the configurations stored in chip.config to the LArPix
+        ASIC, see ``write_configuration``.
+
+        '''
+        packets, written = self._configuration_packets([(chip_key, registers)],
+            write=True, only_dirty=only_dirty)
+        if only_dirty and not packets:
+            return
+        message = self._configuration_message('configuration write', message)
+        mess_with_listening = write_read != 0 and not self._is_listening()
+        if mess_with_listening:
+            self.start_listening()
+            await asyncio.sleep(connection_delay)
+            stop_time = time.time() + write_read
+        await self.async_send(packets)
+        self._mark_written(written)
+        if mess_with_listening:
+            packets, bytestream = await self._async_read_until(lambda packets: False,
+                stop_time - time.time())
+            self.stop_listening()
+            self.store_packets(packets, bytestream, message)
+
+    async def async_multi_read_configuration(self, chip_reg_pairs, timeout=1,
+                                             message=None, connection_delay=0.2):
+        '''
+        Send multiple read configuration commands at once, see
+        ``multi_read_configuration``.
+
+        Packets are read until a config read packet has been received for
+        every requested register, or until ``timeout`` seconds have passed
+        (as with ``early_return=True``). As in ``multi_read_configuration``,
+        the controller stops listening afterwards.
+
+        '''
+        packets, _ = self._configuration_packets(chip_reg_pairs, write=False)
+        message = self._configuration_message('multi configuration read', message)
+        await self._async_read_registers(packets, message, timeout, connection_delay)
+
+    async def _async_read_registers(self, packets, message, timeout, connection_delay):
+        '''
+        Send the config read ``packets`` and store the response, reading until
+        all registers have responded or ``timeout``
+
+        '''
+        done = self._config_read_done(packets)
+        if not self._is_listening():
+            self.start_listening()
+            await asyncio.sleep(connection_delay)
+        await self.async_send(packets)
+        packets, bytestream = await self._async_read_until(done, timeout)
+        self.stop_listening()
+        self.store_packets(packets, bytestream, message)
+
+    async def async_read_configuration(self, chip_key, registers=None, timeout=1,
+                                       message=None, connection_delay=0.2):
+        '''
+        Send "configuration read" requests to the LArPix ASIC, see
+        ``read_configuration``. Returns once all registers have been read
+        back, see ``async_multi_read_configuration``.
+
+        '''
+        packets, _ = self._configuration_packets([(chip_key, registers)], write=False)
+        message = self._configuration_message('configuration read', message)
+        await self._async_read_registers(packets, message, timeout, connection_delay)
+
+    async def async_verify_registers(self, chip_key_register_pairs, timeout=1, connection_delay=0.02, n=1):
+        '''
+        Read chip configuration from specified chip and registers and
+        compare to the stored configuration, see ``verify_registers``.
+
+        '''
+        registers = self._registers_by_chip(chip_key_register_pairs)
+        await self.async_multi_read_configuration(chip_key_register_pairs, timeout=timeout, connection_delay=connection_delay)
+        return_value, configuration_data = self._verify_read_registers(registers)
+        if not return_value and n != 1:
+            retry_chip_key_register_pairs = self._registers_to_retry(configuration_data)
+            if len(retry_chip_key_register_pairs):
+                retry_result = await self.async_verify_registers(
+                    retry_chip_key_register_pairs,
+                    timeout=timeout,
+                    connection_delay=connection_delay,
+                    n=n-1
+                    )
+                return_value = self._merge_retry(configuration_data,
+                    retry_chip_key_register_pairs, retry_result)
+        return (return_value, configuration_data)
+
+    async def async_verify_configuration(self, chip_keys=None, timeout=1, connection_delay=0.02, n=1):
+        '''
+        Read chip configuration from specified chip(s) and compare to the
+        stored configuration, see ``verify_configuration``.
+
+        '''
+        chip_key_register_pairs = self._all_registers(chip_keys)
+        return await self.async_verify_registers(chip_key_register_pairs, timeout=timeout, connection_delay=connection_delay, n=n)
 
     def enable_analog_monitor(self, chip_key, channel):
         '''
@@ -12,8 +12,12 @@ The ``to_file`` and ``from_file`` methods translate between a list of
 Packet-like objects and an HDF5 data file. ``from_file`` can be used to
 load up the full file all at once or just a subset of rows (supposing
 the full file was too big to fit in memory). To access the data most
-efficiently, do not rely on ``from_file`` and instead perform analysis
-directly on the HDF5 data file.
+efficiently, do not rely on creating packet objects and instead perform
+analysis directly on the HDF5 data, either with ``from_file(...,
+as_array=True)`` or by iterating over the file in chunks with
+``iter_file``. Both methods can select rows by field value (e.g.
+``packet_type=0``) while reading the file. Packet objects can be created
+from the arrays as needed with ``from_array``.
 
 File Header
 -----------
@@ -25,6 +29,18 @@ minimum, the header will contain the following HDF5 attributes:
     - ``created``: a Unix timestamp of the file's creation time
     - ``modified``: a Unix timestamp of the file's last-modified time
 
+Files written by ``to_file`` also record the layout of the packets dataset:
+
+    - ``chunk_size``: the number of rows per HDF5 chunk
+    - ``compression``: the HDF5 compression filter (``'None'`` if uncompressed)
+    - ``compression_opts``: the compression filter options
+    - ``shuffle``: if the HDF5 shuffle filter is applied
+
+If the packets dataset was written with ``preallocate=True``, it may be
+larger than the number of packets written and the number of valid rows is
+stored in the ``n_rows`` attribute of the dataset. ``from_file`` and
+``iter_file`` only read the valid rows.
+
 Versions
 --------
 
@@ -344,12 +360,14 @@ MessagePacket packets to the console
 import time
 import os
 import multiprocessing
+import itertools
+import contextlib
 
 import h5py
 import numpy as np
 import struct
 
-from larpix.larpix import Packet_v1, Packet_v2, TimestampPacket, MessagePacket, SyncPacket, TriggerPacket, Chip, Configuration_Lightpix_v1, Key
+from larpix.larpix import Packet_v1, Packet_v2, TimestampPacket, MessagePacket, SyncPacket, TriggerPacket, PacketBatch, Chip, Configuration_Lightpix_v1, ConfigurationMatrix, Key
 from larpix.logger import Logger
 from .. import bitarrayhelper as bah
 _max_config_registers = Configuration_Lightpix_v1.num_registers
@@ -708,6 +726,54 @@ def _format_packets_packet_v2_3(pkt, version='2.3', dset='packets', *args, **kwa
         encoded_packet[dtype_property_index_lookup[version]['packets']['trigger_type']] = _uint8_struct.unpack(pkt.trigger_type)[0]
     return encoded_packet
 
+def _format_packets_packet_batch_v2_3(batch, version='2.3', dset='packets', *args, **kwargs):
+    encoded_packets = np.zeros((len(batch),), dtype=dtypes[version][dset])
+    for value_name in encoded_packets.dtype.names:
+        if value_name == 'valid_parity':
+            value = batch.has_valid_parity()
+        else:
+            value = getattr(batch, value_name, None)
+        if value is not None:
+            encoded_packets[value_name] = value
+    return encoded_packets
+
+def _format_packets_columnar_v2_3(packets, version='2.3', dset='packets', *args, **kwargs):
+    '''
+    Encode a sequence of packet objects into a structured array. ``Packet_v2``
+    objects are gathered into a ``PacketBatch`` and converted column-wise,
+    other packet types are converted one at a time. Packets that cannot be
+    represented are dropped.
+
+    '''
+    encoded_packets = np.zeros((len(packets),), dtype=dtypes[version][dset])
+    keep = np.ones((len(packets),), dtype=bool)
+    v2_idx = []
+    for i, packet in enumerate(packets):
+        if packet.__class__ is Packet_v2:
+            v2_idx.append(i)
+        else:
+            encoded_packet = _encode_packet(packet, version, dset)
+            if encoded_packet:
+                encoded_packets[i] = encoded_packet
+            else:
+                keep[i] = False
+    if v2_idx:
+        v2_idx = np.array(v2_idx)
+        v2_packets = [packets[i] for i in v2_idx]
+        batch = PacketBatch.from_packets(v2_packets)
+        fifo_diagnostics_enabled = np.fromiter(
+            (packet.fifo_diagnostics_enabled for packet in v2_packets),
+            dtype=bool, count=len(v2_packets))
+        for diagnostics_mode in (False, True):
+            mask = fifo_diagnostics_enabled == diagnostics_mode
+            if not np.any(mask):
+                continue
+            subset = batch[mask]
+            subset.fifo_diagnostics_enabled = diagnostics_mode
+            encoded_packets[v2_idx[mask]] = _format_packets_packet_batch_v2_3(
+                subset, version=version, dset=dset)
+    return encoded_packets[keep]
+
 def _parse_packets_v2_3(row, message_dset, *args, **kwargs):
     p = _parse_packets_v2_2(row, message_dset, *args, **kwargs)
     if isinstance(p, Packet_v2):
@@ -797,7 +863,8 @@ _format_method_lookup = {
             TimestampPacket: _format_packets_packet_v2_3,
             MessagePacket: _format_packets_packet_v2_3,
             SyncPacket: _format_packets_packet_v2_3,
-            TriggerPacket: _format_packets_packet_v2_3
+            TriggerPacket: _format_packets_packet_v2_3,
+            PacketBatch: _format_packets_packet_batch_v2_3
         },
         'messages': {
             MessagePacket: _format_messages_message_packet_v1_0
@@ -809,7 +876,8 @@ _format_method_lookup = {
             TimestampPacket: _format_packets_packet_v2_3,
             MessagePacket: _format_packets_packet_v2_3,
             SyncPacket: _format_packets_packet_v2_3,
-            TriggerPacket: _format_packets_packet_v2_3
+            TriggerPacket: _format_packets_packet_v2_3,
+            PacketBatch: _format_packets_packet_batch_v2_3
         },
         'messages': {
             MessagePacket: _format_messages_message_packet_v1_0
@@ -820,6 +888,20 @@ _format_method_lookup = {
     },
 }
 
+# A map between version and the formatting method used to convert a sequence
+# of packet objects to a structured array in a single call. Versions that are not
+# listed are formatted one packet at a time using ``_format_method_lookup``.
+#
+# Structure: ``{version: {dset_name: format_method}}``
+_columnar_format_method_lookup = {
+    '2.3': {
+        'packets': _format_packets_columnar_v2_3
+    },
+    '2.4': {
+        'packets': _format_packets_columnar_v2_3
+    }
+}
+
 # A map between dset the parsing method used to convert from structured
 # dtypes.
 #
@@ -862,16 +944,56 @@ def _encode_packet(packet, version, packet_dset_name):
         return(tuple(encoded_packet))
     return False
 
-def to_file(filename, packet_list=None, chip_list=None, mode='a', version=None, workers=None):
+#: Factor by which the packets dataset grows when ``to_file`` is called with
+#: ``preallocate=True``
+preallocate_growth_factor = 2
+
+def _dset_length(dset):
+    '''
+    Return the number of valid rows in a dataset, which is smaller than the
+    dataset shape if rows were preallocated by ``to_file``
+
+    '''
+    if 'n_rows' in dset.attrs:
+        return int(dset.attrs['n_rows'])
+    return dset.shape[0]
+
+@contextlib.contextmanager
+def _open_file(filename, mode):
+    '''
+    Open ``filename`` as an ``h5py.File``, or use it as-is (without closing it)
+    if it is already an open ``h5py.File``
+
+    '''
+    if isinstance(filename, h5py.File):
+        yield filename
+        filename.flush()
+    else:
+        with h5py.File(filename, mode) as f:
+            yield f
+
+def to_file(filename, packet_list=None, chip_list=None, mode='a', version=None, workers=None,
+        chunk_size=None, compression=None, compression_opts=None, shuffle=False,
+        preallocate=False):
     '''
     Save the given packets to the given file.
 
     This method can be used to update an existing file.
 
-    :param filename: the name of the file to save to
+    :param filename: the name of the file to save to, or an open (writable)
+        ``h5py.File``. An open file is flushed, but not closed, after writing.
     :param packet_list: any iterable of objects of type ``Packet``,
-        ``TimestampPacket``, ``SyncPacket``, or ``TriggerPacket``.
-    :param chip_list: any iterable of objects of type ``Chip``.
+        ``TimestampPacket``, ``SyncPacket``, ``TriggerPacket``, or
+        ``PacketBatch``, or a single ``PacketBatch``. For format versions
+        >= 2.3, packets are encoded column-wise and ``PacketBatch``
+        objects are encoded without converting to individual packets.
+        A numpy array can also be given: an unstructured array is
+        interpreted as raw ``Packet_v2`` words (see ``PacketBatch``) and a
+        structured array with the packet dataset dtype (e.g. from
+        ``larpix.format.pacman_msg_format.parse_to_array``) is written
+        as-is.
+    :param chip_list: any iterable of objects of type ``Chip``, or a
+        ``ConfigurationMatrix`` (which is encoded as a single array).
     :param mode: optional, the "file mode" to open the data file
         (default: ``'a'``)
     :param version: optional, the LArPix+HDF5 format version to use. If
@@ -881,14 +1003,44 @@ def to_file(filename, packet_list=None, chip_list=None, mode='a', version=None,
         version will be used. If writing an existing file and version
         is specified and does not exactly match the existing file's
         version, a ``RuntimeError`` will be raised. (default: ``None``)
+    :param workers: optional, number of processes to use when encoding
+        packets for format versions < 2.3 (default: ``None``, one worker
+        per 10000 packets up to the number of cpus)
+    :param chunk_size: optional, number of rows per HDF5 chunk of the packets
+        dataset. Only used when creating the dataset. (default: ``None``,
+        chosen by h5py)
+    :param compression: optional, HDF5 compression filter for the packets
+        dataset, e.g. ``'gzip'`` or ``'lzf'``. Only used when creating the
+        dataset. (default: ``None``, no compression)
+    :param compression_opts: optional, compression filter options, e.g. the
+        gzip level (default: ``None``)
+    :param shuffle: optional, apply the HDF5 shuffle filter to the packets
+        dataset, improves compression. Only used when creating the dataset.
+        (default: ``False``)
+    :param preallocate: optional, if ``True`` grow the packets dataset
+        geometrically (by ``preallocate_growth_factor``) instead of resizing
+        to fit on every call. The number of valid rows is stored in the
+        ``n_rows`` attribute of the dataset. Calling ``to_file`` with
+        ``preallocate=False`` trims the dataset to the valid rows.
+        (default: ``False``)
+
+    The chunk size and compression settings of the packets dataset are
+    recorded in the ``_header`` attributes ``chunk_size``, ``compression``,
+    ``compression_opts``, and ``shuffle``.
 
     '''
     if packet_list is None: packet_list = []
     if chip_list is None: chip_list = []
+    if isinstance(packet_list, np.ndarray):
+        if packet_list.dtype.names is None:
+            packet_list = PacketBatch(packet_list)
+        else:
+            packet_list = [packet_list]
+    if isinstance(packet_list, PacketBatch): packet_list = [packet_list]
     if workers is None:
       workers = max(min(os.cpu_count(), int(len(packet_list)//10000)),1)
 
-    with h5py.File(filename, mode) as f:
+    with _open_file(filename, mode) as f:
         # Create header
         if '_header' not in f.keys():
             header = f.create_group('_header')
@@ -904,7 +1056,7 @@ def to_file(filename, packet_list=None, chip_list=None, mode='a', version=None,
             elif header.attrs['version'] != version:
                 raise RuntimeError('Incompatible versions: existing: %s, '
                     'specified: %s' % (file_version, version))
-        header.attrs['modified'] = time.time()
+        header.attrs.modify('modified', time.time())
 
         # Create datasets
         if version == '0.0':
@@ -928,9 +1080,24 @@ def to_file(filename, packet_list=None, chip_list=None, mode='a', version=None,
                         dtype_property_index_lookup[version]['packets']
                         ['dataword'])
         packet_dtype = dtypes[version][packet_dset_name]
+        for packet in packet_list:
+            if isinstance(packet, np.ndarray) and packet.dtype != np.dtype(packet_dtype):
+                raise ValueError('Incompatible packet array dtype for version {}'.format(version))
+        if PacketBatch not in _format_method_lookup[version].get(packet_dset_name, tuple()):
+            packet_list = [packet for obj in packet_list for packet in
+                (obj if isinstance(obj, PacketBatch) else [obj])]
+        n_packets = sum([len(packet) if isinstance(packet, (PacketBatch, np.ndarray)) else 1
+            for packet in packet_list])
         if packet_dset_name not in f.keys():
-            packet_dset = f.create_dataset(packet_dset_name, shape=(len(packet_list),),
-                    maxshape=(None,), dtype=packet_dtype)
+            packet_dset = f.create_dataset(packet_dset_name, shape=(0,),
+                    maxshape=(None,), dtype=packet_dtype,
+                    chunks=(chunk_size,) if chunk_size else True,
+                    compression=compression, compression_opts=compression_opts,
+                    shuffle=shuffle)
+            header.attrs['chunk_size'] = packet_dset.chunks[0]
+            header.attrs['compression'] = str(packet_dset.compression)
+            header.attrs['compression_opts'] = str(packet_dset.compression_opts)
+            header.attrs['shuffle'] = packet_dset.shuffle
             if version[0] == '1' or version[0] == '2':
                 if version[-1] == '2' and version[0] == '2':
                     packet_dset.attrs['packet_types'] = '''
@@ -955,8 +1122,7 @@ def to_file(filename, packet_list=None, chip_list=None, mode='a', version=None,
             start_index = 0
         else:
             packet_dset = f[packet_dset_name]
-            start_index = packet_dset.shape[0]
-            packet_dset.resize(start_index + len(packet_list), axis=0)
+            start_index = _dset_length(packet_dset)
 
         if version != '0.0':
             message_dset_name = 'messages'
@@ -981,7 +1147,10 @@ def to_file(filename, packet_list=None, chip_list=None, mode='a', version=None,
             else:
                 configs_dset = f[configs_dset_name]
                 configs_start_index = configs_dset.shape[0]
-            if chip_list:
+            if isinstance(chip_list, ConfigurationMatrix):
+                if len(chip_list):
+                    configs_dset.attrs['asic_version'] = str(chip_list.asic_version)
+            elif chip_list:
                 configs_dset.attrs['asic_version'] = str(chip_list[-1].asic_version)
 
         # Fill dataset
@@ -989,33 +1158,188 @@ def to_file(filename, packet_list=None, chip_list=None, mode='a', version=None,
         messages = []
         configs = []
 
-        if workers > 1:
-            packet_args = zip(packet_list, [version]*len(packet_list), [packet_dset_name]*len(packet_list))
-            with multiprocessing.Pool(workers) as p:
-                encoded_packets = list(filter(bool, p.starmap(_encode_packet, packet_args)))
-        else:
-            encoded_packets = list(filter(bool, [_encode_packet(packet, version, packet_dset_name) for packet in packet_list]))
+        for is_array, packets in itertools.groupby(packet_list,
+                key=lambda packet: isinstance(packet, (PacketBatch, np.ndarray))):
+            packets = list(packets)
+            if is_array:
+                encoded_packets += [
+                    packet if isinstance(packet, np.ndarray) else
+                    _format_method_lookup[version][packet_dset_name][PacketBatch](
+                        packet, version=version, dset=packet_dset_name)
+                    for packet in packets]
+                continue
+            if packet_dset_name in _columnar_format_method_lookup.get(version, dict()):
+                encoded_group = _columnar_format_method_lookup[version][packet_dset_name](
+                    packets, version=version, dset=packet_dset_name)
+            elif workers > 1:
+                packet_args = zip(packets, [version]*len(packets), [packet_dset_name]*len(packets))
+                with multiprocessing.Pool(workers) as p:
+                    encoded_group = list(filter(bool, p.starmap(_encode_packet, packet_args)))
+            else:
+                encoded_group = list(filter(bool, [_encode_packet(packet, version, packet_dset_name) for packet in packets]))
+            if len(encoded_group):
+                encoded_packets.append(np.asarray(encoded_group, dtype=packet_dtype))
+        encoded_packets = np.concatenate(encoded_packets) if encoded_packets else []
 
         for i, packet in enumerate(packet_list):
+            if isinstance(packet, (PacketBatch, np.ndarray)):
+                continue
             if version != '0.0' and packet.__class__ in _format_method_lookup[version].get(message_dset_name, tuple()):
                 encoded_message = _format_method_lookup[version][message_dset_name][packet.__class__](packet, counter=message_start_index + len(messages))
                 messages.append(encoded_message)
 
+        if isinstance(chip_list, ConfigurationMatrix):
+            if version >= '2.4' and len(chip_list):
+                configs.append(chip_list.to_array(configs_dtype, timestamp=header.attrs['modified']))
+            chip_list = []
         for i,chip in enumerate(chip_list):
             if version >= '2.4':
                 encoded_config = _format_method_lookup[version][configs_dset_name][chip.__class__](chip, counter=configs_start_index + len(configs), timestamp=header.attrs['modified'])
                 configs.append(encoded_config)
 
-        if encoded_packets:
-            packet_dset[start_index:] = encoded_packets
+        end_index = start_index + len(encoded_packets)
+        if not preallocate:
+            if packet_dset.shape[0] != end_index:
+                packet_dset.resize(end_index, axis=0)
+        elif packet_dset.shape[0] < end_index:
+            packet_dset.resize(max(end_index, packet_dset.chunks[0],
+                int(packet_dset.shape[0] * preallocate_growth_factor)), axis=0)
+        if len(encoded_packets):
+            packet_dset[start_index:end_index] = encoded_packets
+        if preallocate or 'n_rows' in packet_dset.attrs:
+            packet_dset.attrs.modify('n_rows', end_index)
         if version != '0.0' and messages:
             message_dset.resize(message_start_index + len(messages), axis=0)
             message_dset[message_start_index:] = messages
         if version >= '2.4' and configs:
+            configs = np.concatenate(configs)
             configs_dset.resize(configs_start_index + len(configs), axis=0)
-            configs_dset[configs_start_index:] = np.concatenate(configs)
+            configs_dset[configs_start_index:] = configs
+
+#: Default number of rows read from the packets dataset at a time by
+#: ``from_file`` and ``iter_file``
+default_chunk_size = 2**16
 
-def from_file(filename, version=None, start=None, end=None, load_configs=None):
+def _get_file_version(f, version=None):
+    '''
+    Check the requested version against the version stored in the open file
+    ``f`` and return the format version to use
+
+    '''
+    file_version = f['_header'].attrs['version']
+    if version is None:
+        version = file_version
+    elif version[0] == '~':
+        file_major, _, file_minor = file_version.split('.')
+        version_major, _, version_minor = version.split('.')
+        version_major = version_major[1:]
+        if (file_major != version_major
+                or file_minor < version_minor):
+            raise RuntimeError('Incompatible versions: existing: %s, '
+                'specified: %s' % (file_version, version))
+        else:
+            version = file_version
+    elif version == file_version:
+        pass
+    else:
+        raise RuntimeError('Incompatible versions: existing: %s, '
+            'specified: %s' % (file_version, version))
+
+    if version not in dtypes:
+        raise RuntimeError('Unknown version: %s' % version)
+    return version
+
+def _iter_packet_chunks(dset, start=None, end=None, chunk_size=None, selection=None):
+    '''
+    Generator of structured arrays containing the rows of ``dset[start:end]``
+    that match the ``selection``, reading ``chunk_size`` rows at a time.
+
+    Only the selection columns are read for each chunk. If no rows in a chunk
+    are selected, the full rows are not read, otherwise only the range of rows
+    spanning the selected rows is read.
+
+    '''
+    if chunk_size is None:
+        chunk_size = default_chunk_size
+    selection = dict(selection) if selection else dict()
+    for name, value in selection.items():
+        if name not in dset.dtype.names:
+            raise ValueError('Cannot select on {}, not a field of {}'.format(name, dset.name))
+        if isinstance(value, (set, frozenset, range)):
+            value = list(value)
+        selection[name] = np.atleast_1d(value)
+    start, end, _ = slice(start, end).indices(_dset_length(dset))
+    for chunk_start in range(start, end, chunk_size):
+        chunk_end = min(chunk_start + chunk_size, end)
+        if not selection:
+            yield dset[chunk_start:chunk_end]
+            continue
+        mask = np.ones((chunk_end - chunk_start,), dtype=bool)
+        for name, value in selection.items():
+            mask &= np.isin(dset.fields(name)[chunk_start:chunk_end], value)
+        idcs = np.flatnonzero(mask)
+        if not len(idcs):
+            continue
+        rows = dset[chunk_start + idcs[0]:chunk_start + idcs[-1] + 1]
+        yield rows[mask[idcs[0]:idcs[-1] + 1]]
+
+def from_array(packet_array, version=latest_version, message_array=None):
+    '''
+    Convert a structured array of packet dataset rows (e.g. as returned by
+    ``from_file(..., as_array=True)`` or ``iter_file``) into LArPix packet
+    objects.
+
+    :param packet_array: the structured array of rows to convert
+    :param version: the format version of the rows (default: ``latest_version``)
+    :param message_array: the ``messages`` dataset rows, required if converting
+        message packets
+    :returns: a ``list`` of packet objects
+
+    '''
+    dset_name = 'raw_packet' if version == '0.0' else 'packets'
+    parse_method = _parse_method_lookup[version][dset_name]
+    packets = []
+    for row in packet_array:
+        pkt = parse_method(row, message_array)
+        if pkt is not None:
+            packets.append(pkt)
+    return packets
+
+def iter_file(filename, version=None, start=None, end=None, as_array=True,
+        chunk_size=None, **selection):
+    '''
+    Iterate over the packets in the given file, one chunk of rows at a time.
+
+    Keyword arguments for ``version``, ``start``, ``end``, and selection are
+    the same as ``from_file``. E.g. to process all of the data packets from
+    io group 1 without loading the full file into memory::
+
+        for packets in iter_file(filename, packet_type=0, io_group=1):
+            process(packets['timestamp'], packets['dataword'])
+
+    :param as_array: if ``True``, yield structured arrays of the packet dataset
+        rows, otherwise yield ``list`` of packet objects (default: ``True``)
+    :param chunk_size: number of rows to read from the file at a time
+        (default: ``default_chunk_size``)
+    :yields: a structured array (or ``list`` of packet objects) for each chunk
+        that contains selected rows
+
+    '''
+    with h5py.File(filename, 'r') as f:
+        version = _get_file_version(f, version)
+        dset_name = 'raw_packet' if version == '0.0' else 'packets'
+        message_array = None
+        for chunk in _iter_packet_chunks(f[dset_name], start=start, end=end,
+                chunk_size=chunk_size, selection=selection):
+            if as_array:
+                yield chunk
+                continue
+            if message_array is None and version != '0.0':
+                message_array = f['messages'][:]
+            yield from_array(chunk, version=version, message_array=message_array)
+
+def from_file(filename, version=None, start=None, end=None, load_configs=None,
+        as_array=False, chunk_size=None, **selection):
     '''
     Read the data from the given file into LArPix Packet objects.
 
@@ -1036,6 +1360,16 @@ def from_file(filename, version=None, start=None, end=None, load_configs=None):
     :param load_configs: a flag to indicate if configs should be fetched from file, a
         value of ``True`` will load all configs and a value of type ``slice``
         will load the specified subset.
+    :param as_array: if ``True``, return the structured arrays of the dataset
+        rows instead of packet and chip objects. Objects can be created later
+        with ``from_array``. (default: ``False``)
+    :param chunk_size: number of rows to read from the file at a time
+        (default: ``default_chunk_size``)
+    :param selection: keyword arguments of ``<field name>=<value or list of values>``
+        to only load rows with matching values of the packets dataset fields,
+        e.g. ``from_file(filename, packet_type=0, io_group=[1,2], chip_id=12)``.
+        Only the selection columns are read for chunks without any matching
+        rows.
     :returns packet_dict: a dict with keys ``'packets'`` containing a
         list of packet objects; ``'configs'`` containing a list of chip objects;
         and ``'created'``, ``'modified'``, and
@@ -1043,63 +1377,38 @@ def from_file(filename, version=None, start=None, end=None, load_configs=None):
 
     '''
     with h5py.File(filename, 'r') as f:
-        file_version = f['_header'].attrs['version']
-        if version is None:
-            version = file_version
-        elif version[0] == '~':
-            file_major, _, file_minor = file_version.split('.')
-            version_major, _, version_minor = version.split('.')
-            version_major = version_major[1:]
-            if (file_major != version_major
-                    or file_minor < version_minor):
-                raise RuntimeError('Incompatible versions: existing: %s, '
-                    'specified: %s' % (file_version, version))
-            else:
-                version = file_version
-        elif version == file_version:
-            pass
+        version = _get_file_version(f, version)
+        dset_name = 'raw_packet' if version == '0.0' else 'packets'
+        chunks = _iter_packet_chunks(f[dset_name], start=start, end=end,
+            chunk_size=chunk_size, selection=selection)
+        if as_array:
+            packets = [chunk for chunk in chunks]
+            packets = (np.concatenate(packets) if packets
+                else np.zeros((0,), dtype=f[dset_name].dtype))
         else:
-            raise RuntimeError('Incompatible versions: existing: %s, '
-                'specified: %s' % (file_version, version))
-
-        if version not in dtypes:
-            raise RuntimeError('Unknown version: %s' % version)
-
-        if version == '0.0':
-            dset_name = 'raw_packet'
-            message_dset = None
-            configs_dset = None
-        else:
-            dset_name = 'packets'
-            message_dset_name = 'messages'
-            message_props = (
-                    dtype_property_index_lookup[version][message_dset_name])
-            message_dset = f[message_dset_name]
-
-        props = dtype_property_index_lookup[version][dset_name]
-        packets = []
-        if start is None and end is None:
-            dset_iter = f[dset_name]
-        else:
-            dset_iter = f[dset_name][start:end]
-        for row in dset_iter:
-            pkt = _parse_method_lookup[version][dset_name](row, message_dset)
-            if pkt is not None:
-                packets.append(pkt)
+            # resolve messages with a single read of the messages dataset
+            message_array = f['messages'][:] if version != '0.0' else None
+            packets = []
+            for chunk in chunks:
+                packets.extend(from_array(chunk, version=version,
+                    message_array=message_array))
 
         configs = []
         if version >= '2.4':
             dset_name ='configs'
             if load_configs:
                 if isinstance(load_configs,bool):
-                    dset_iter = f[dset_name]
+                    config_rows = f[dset_name][:]
+                else:
+                    config_rows = f[dset_name][load_configs]
+                if as_array:
+                    configs = config_rows
                 else:
-                    dset_iter = f[dset_name][load_configs]
-                asic_version = f[dset_name].attrs['asic_version']
-                for row in dset_iter:
-                    chip = _parse_method_lookup[version][dset_name](row, asic_version=asic_version)
-                    if chip is not None:
-                        configs.append(chip)
+                    asic_version = f[dset_name].attrs['asic_version']
+                    for row in config_rows:
+                        chip = _parse_method_lookup[version][dset_name](row, asic_version=asic_version)
+                        if chip is not None:
+                            configs.append(chip)
         return {
                 'packets': packets,
                 'configs': configs,
@@ -46,12 +46,32 @@ that when formatting messages, packets' ``io_group`` field is ignored, and when
 parsing messages, an ``io_group`` value needs to be specified at the time of
 parsing.
 
+When decoding large volumes of data, creating a python object for each packet
+is slow. The ``parse_to_array(msgs, io_group=None)`` method decodes one message
+or a list of messages directly into a numpy structured array with the same
+fields as the ``packets`` dataset of ``larpix.format.hdf5format`` (version
+2.4). Each row is filled with the same values that ``parse`` followed by
+``hdf5format.to_file`` would produce. E.g.::
+
+    arr = pacman_msg_fmt.parse_to_array([msg0, msg1], io_group=[1, 2])
+    arr['packet_type'] # [4, 0, 4, 0]
+    arr['io_group'] # [1, 1, 2, 2]
+
+Similarly, ``parse_to_batch(msgs, io_group=None)`` decodes the data words of
+one or more messages into a ``PacketBatch``, e.g.::
+
+    batch = pacman_msg_fmt.parse_to_batch([msg0, msg1], io_group=[1, 2])
+    batch.io_group # [1, 2]
+
 '''
 import struct
 from bidict import bidict
 import time
 
-from larpix import Packet_v2, TriggerPacket, SyncPacket, TimestampPacket
+import numpy as np
+
+from larpix import Packet_v2, TriggerPacket, SyncPacket, TimestampPacket, PacketBatch
+from larpix.format.hdf5format import dtypes as hdf5_dtypes
 
 #: Most up-to-date message format version.
 latest_version = '0.0'
@@ -161,7 +181,7 @@ def parse_word(msg_type, word):
     first item is always the word type
 
     '''
-    word_type = word_type_table[msg_type].inv[word[0:1]]
+    word_type = word_type_table[msg_type].inv[bytes(word[0:1])]
     return (word_type,) + tuple(word_struct_table[word_type].unpack(word)[1:])
 
 def format_msg(msg_type, msg_words):
@@ -266,8 +286,183 @@ def parse(msg, io_group=None):
             packets.append(packet)
     return packets
 
+#: Structured dtype of the array returned by ``parse_to_array``
+#: (``larpix.format.hdf5format`` version 2.4 ``packets`` dataset)
+packet_array_dtype = np.dtype(hdf5_dtypes['2.4']['packets'])
+
+_header_dtype = np.dtype(dict(
+    names=['msg_type','timestamp'],
+    formats=['u1','<u4'],
+    offsets=[0,1],
+    itemsize=HEADER_LEN
+    ))
+# overlapping views into each word, only fields relevant to the word type are valid
+_word_dtype = np.dtype(dict(
+    names=['word_type','io_channel','receipt_timestamp','sync_clk_source','timestamp','data'],
+    formats=['u1','u1','<u4','u1','<u4','<u8'],
+    offsets=[0,1,2,2,4,8],
+    itemsize=WORD_LEN
+    ))
+
+def _split_msgs(msgs):
+    '''
+    Splits a ``list`` of messages into their headers and words without
+    looping over the messages in python
 
+    :returns: tuple of the headers (``_header_dtype``), the words (``_word_dtype``), and the index of the message of each word
 
+    '''
+    # headers and words are a multiple of 8 bytes long, so the messages
+    # are split on 8 byte units
+    n_msgs = len(msgs)
+    units = np.frombuffer(b''.join(msgs), dtype='<u8')
+    msg_units = np.fromiter(map(len, msgs), dtype=np.intp, count=n_msgs) // 8
+    header_unit = np.cumsum(msg_units) - msg_units
+    headers = units[header_unit].view(_header_dtype)
+    is_word_unit = np.ones(len(units), dtype=bool)
+    is_word_unit[header_unit] = False
+    words = units[is_word_unit].view(_word_dtype)
+    word_msg_idx = np.repeat(np.arange(n_msgs), (msg_units - HEADER_LEN // 8) // (WORD_LEN // 8))
+    return headers, words, word_msg_idx
+
+def _decode_packet_v2(arr, words, fifo_diagnostics_enabled=False):
+    '''
+    Fills the ``Packet_v2`` fields of the structured array ``arr`` from a
+    ``uint64`` array of packet words
+
+    '''
+    batch = PacketBatch(words)
+    batch.fifo_diagnostics_enabled = fifo_diagnostics_enabled
+    for field in ('packet_type', 'chip_id', 'downstream_marker', 'parity',
+                  'channel_id', 'first_packet', 'dataword', 'trigger_type',
+                  'local_fifo', 'shared_fifo', 'register_address', 'register_data',
+                  'timestamp'):
+        arr[field] = getattr(batch, field)
+    if fifo_diagnostics_enabled:
+        arr['fifo_diagnostics_enabled'] = 1
+        arr['local_fifo_events'] = batch.local_fifo_events
+        arr['shared_fifo_events'] = batch.shared_fifo_events
+    arr['valid_parity'] = batch.has_valid_parity()
+
+def parse_to_array(msgs, io_group=None):
+    '''
+    Converts one or more PACMAN messages into a numpy structured array of type
+    ``packet_array_dtype``
 
+    Rows are generated with the same semantics as ``parse``: each message
+    header generates a timestamp row (``packet_type == 4``), data words
+    generate rows according to the ``Packet_v2`` content, and trigger and
+    sync words generate rows with ``packet_type`` of 7 and 6, respectively.
 
+    :param msgs: a single message bytestring or a ``list`` of message bytestrings
 
+    :param io_group: the ``io_group`` to assign to each row, either a single value or a ``list`` of values (one per message)
+
+    :returns: a ``numpy`` structured array
+
+    '''
+    if isinstance(msgs, bytes):
+        msgs = [msgs]
+    n_msgs = len(msgs)
+    if not n_msgs:
+        return np.zeros((0,), dtype=packet_array_dtype)
+    if io_group is None:
+        io_group = 0
+    io_groups = np.broadcast_to(np.asarray(io_group, dtype='u1'), (n_msgs,))
+
+    headers, words, word_msg_idx = _split_msgs(msgs)
+    is_data_msg = headers['msg_type'] == ord(MSG_TYPE_DATA)
+
+    # only keep words that generate a packet in ``parse``
+    word_types = words['word_type']
+    is_data = word_types == ord(WORD_TYPE_DATA)
+    is_trig = is_data_msg[word_msg_idx] & (word_types == ord(WORD_TYPE_TRIG))
+    is_sync = is_data_msg[word_msg_idx] & (word_types == ord(WORD_TYPE_SYNC))
+    keep = is_data | is_trig | is_sync
+    if not np.all(keep):
+        words, word_msg_idx = words[keep], word_msg_idx[keep]
+        is_data, is_trig, is_sync = is_data[keep], is_trig[keep], is_sync[keep]
+
+    # each message is a timestamp row followed by one row per kept word
+    n_kept = np.bincount(word_msg_idx, minlength=n_msgs)
+    header_row = np.arange(n_msgs) + np.cumsum(n_kept) - n_kept
+    is_word_row = np.ones((n_msgs + len(words),), dtype=bool)
+    is_word_row[header_row] = False
+    word_row = np.flatnonzero(is_word_row)
+
+    # rows that are not data packets have the fields of an all-zero word,
+    # which are all zero apart from the fifo diagnostics flag
+    fifo_diagnostics_enabled = Packet_v2.fifo_diagnostics_enabled
+    arr = np.zeros((n_msgs + len(words),), dtype=packet_array_dtype)
+    if fifo_diagnostics_enabled:
+        arr['fifo_diagnostics_enabled'] = 1
+    arr['io_group'] = np.repeat(io_groups, n_kept + 1)
+    arr['packet_type'][header_row] = TimestampPacket(0).packet_type
+    arr['timestamp'][header_row] = headers['timestamp']
+
+    # usually all words are data words, then no selection is needed
+    if np.all(is_data):
+        data_words, data_row, data_msg_idx = words, word_row, word_msg_idx
+    else:
+        data_words, data_row, data_msg_idx = words[is_data], word_row[is_data], word_msg_idx[is_data]
+    data_arr = np.zeros((len(data_words),), dtype=packet_array_dtype)
+    _decode_packet_v2(data_arr, data_words['data'],
+        fifo_diagnostics_enabled=fifo_diagnostics_enabled)
+    data_arr['io_group'] = io_groups[data_msg_idx]
+    data_arr['io_channel'] = data_words['io_channel']
+    if np.all(is_data_msg):
+        data_arr['receipt_timestamp'] = data_words['receipt_timestamp']
+    else:
+        data_arr['receipt_timestamp'] = np.where(is_data_msg[data_msg_idx],
+            data_words['receipt_timestamp'], 0)
+    # copy whole rows as raw bytes, a structured copy is done field by field
+    row_bytes = ('V', packet_array_dtype.itemsize)
+    arr.view(row_bytes)[data_row] = data_arr.view(row_bytes)
+
+    for is_type, packet_type in ((is_trig, TriggerPacket.packet_type),
+                                 (is_sync, SyncPacket.packet_type)):
+        if np.any(is_type):
+            rows = word_row[is_type]
+            arr['packet_type'][rows] = packet_type
+            arr['timestamp'][rows] = words['timestamp'][is_type]
+            arr['trigger_type'][rows] = words['io_channel'][is_type]
+    if np.any(is_sync):
+        arr['dataword'][word_row[is_sync]] = words['sync_clk_source'][is_sync] & 0x01
+
+    return arr
+
+def parse_to_batch(msgs, io_group=None):
+    '''
+    Converts the data words of one or more PACMAN messages into a
+    ``PacketBatch``
+
+    The batch contains the same packets as the ``Packet_v2`` objects
+    generated by ``parse`` (in the same order), with the ``io_group``,
+    ``io_channel``, and ``receipt_timestamp`` columns filled. Message
+    headers, trigger words, and sync words are not included.
+
+    :param msgs: a single message bytestring or a ``list`` of message bytestrings
+
+    :param io_group: the ``io_group`` to assign to each packet, either a single value or a ``list`` of values (one per message)
+
+    :returns: ``PacketBatch``
+
+    '''
+    if isinstance(msgs, bytes):
+        msgs = [msgs]
+    n_msgs = len(msgs)
+    if not n_msgs:
+        return PacketBatch()
+    if io_group is None:
+        io_group = 0
+    io_groups = np.broadcast_to(np.asarray(io_group, dtype='u1'), (n_msgs,))
+
+    headers, words, word_msg_idx = _split_msgs(msgs)
+    is_data = words['word_type'] == ord(WORD_TYPE_DATA)
+    words, word_msg_idx = words[is_data], word_msg_idx[is_data]
+    is_data_msg = headers['msg_type'][word_msg_idx] == ord(MSG_TYPE_DATA)
+
+    return PacketBatch(words['data'],
+        io_group=io_groups[word_msg_idx],
+        io_channel=words['io_channel'].copy(),
+        receipt_timestamp=np.where(is_data_msg, words['receipt_timestamp'], 0).astype('u4'))
@@ -0,0 +1,129 @@
+import asyncio
+from collections import defaultdict
+
+import zmq
+import zmq.asyncio
+
+from larpix.io.pacman_io import PACMAN_IO
+
+class AsyncPACMAN_IO(PACMAN_IO):
+    '''
+    An asyncio-compatible version of ``PACMAN_IO``, built on ``zmq.asyncio``.
+
+    In addition to the (blocking) ``PACMAN_IO`` methods, which can still be
+    used, this class provides coroutines that can be awaited from an asyncio
+    event loop:
+
+        - ``async_send`` sends packets to all io groups concurrently, waiting
+          for the reply to each message without blocking the event loop
+        - ``async_empty_queue`` returns the received packets, as in
+          ``empty_queue``
+        - ``async_wait_for_data`` waits until data has been received (or
+          a timeout)
+
+    The ``Controller`` ``async_*`` methods (e.g.
+    ``Controller.async_read_configuration``) use these coroutines when the
+    controller's io object provides them. E.g.::
+
+        controller.io = AsyncPACMAN_IO(config_filepath)
+        asyncio.run(controller.async_verify_configuration())
+
+    The asyncio sockets are shadows of the ``PACMAN_IO`` sockets, so the
+    blocking methods should not be called while a coroutine is waiting for
+    a reply.
+
+    '''
+    _valid_config_classes = ['PACMAN_IO', 'AsyncPACMAN_IO']
+
+    def __init__(self, *args, **kwargs):
+        super(AsyncPACMAN_IO, self).__init__(*args, **kwargs)
+        self._async_senders = dict([
+            (address, zmq.asyncio.Socket.shadow(sender.underlying))
+            for address, sender in self.senders.items()])
+        self._async_poller = zmq.asyncio.Poller()
+        self._async_receivers = dict()
+        for address, receiver in self.receivers.items():
+            # keep a reference, the shadow socket does not own the socket
+            async_receiver = zmq.asyncio.Socket.shadow(receiver.underlying)
+            self._async_receivers[async_receiver] = self._io_group_table.inv[address]
+            self._async_poller.register(async_receiver, zmq.POLLIN)
+
+    async def async_send(self, packets):
+        '''
+        Sends a request message to PACMAN boards to send designated
+        packets.
+
+        Messages to different io groups are sent concurrently, messages to
+        the same io group are sent in order, each after the reply to the
+        previous one is received.
+
+        '''
+        msgs = defaultdict(list)
+        for address, msg in self._format_send_msgs(packets):
+            msgs[address].append(msg)
+        await asyncio.gather(*[self._async_send_msgs(address, address_msgs)
+            for address, address_msgs in msgs.items()])
+
+    async def _async_send_msgs(self, address, msgs):
+        sender = self._async_senders[address]
+        for msg in msgs:
+            await sender.send(msg)
+            self._sender_replies[address].append(await sender.recv())
+
+    async def async_empty_queue(self):
+        '''
+        Fetch and parse waiting packets on pacman data socket, see
+        ``empty_queue``
+
+        The data sockets are polled and drained through their asyncio shadow
+        sockets, so the event loop is never blocked waiting on a socket.
+
+        '''
+        messages, io_groups = self._buffered_messages()
+        n_recv = 0
+        for socket, _ in (await self._async_poller.poll(0) if self._receiver is None else []):
+            io_group = self._async_receivers[socket]
+            while n_recv < self.hwm:
+                try:
+                    frame = await socket.recv(zmq.NOBLOCK, copy=False)
+                except zmq.Again:
+                    break
+                messages.append(frame.buffer)
+                io_groups.append(io_group)
+                n_recv += 1
+        return self._process_messages(messages, io_groups)
+
+    async def async_wait_for_data(self, timeout):
+        '''
+        Wait until a message is available to ``async_empty_queue``
+
+        :param timeout: maximum time to wait in seconds
+
+        :returns: ``True`` if a message is available
+
+        '''
+        if self._receiver is not None:
+            # messages are received by the background receiver thread
+            stop_time = asyncio.get_event_loop().time() + timeout
+            while not len(self._receiver_buffer):
+                remaining = stop_time - asyncio.get_event_loop().time()
+                if remaining <= 0:
+                    return False
+                await asyncio.sleep(min(remaining, self._receiver_wait_interval))
+            return True
+        if len(self._receiver_buffer):
+            return True
+        return bool(await self._async_poller.poll(max(int(timeout * 1000), 0)))
+
+    def cleanup(self):
+        '''
+        Close the ZMQ objects to prevent a memory leak.
+
+        This method is only required if you plan on instantiating a new
+        ``PACMAN_IO`` object.
+
+        '''
+        self._async_senders = dict()
+        self._async_receivers = dict()
+        self._async_poller = None
+        super(AsyncPACMAN_IO, self).cleanup()
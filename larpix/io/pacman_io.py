@@ -2,7 +2,8 @@ import itertools
 import zmq
 import bidict
 import time
-from collections import defaultdict
+from collections import defaultdict, deque
+import threading
 import multiprocessing
 import sys
 if sys.version_info[0] >= 3:
@@ -26,7 +27,7 @@ class PACMAN_IO(IO):
     formatted messages to/from the PACMAN boards. If you want more
     info on how messages are formatted, see ``larpix.format.pacman_msg_format``.
 
-    The PACMAN_IO object has five flags for optimizing communications
+    The PACMAN_IO object has eight flags for optimizing communications
     which you may or may not want to enable:
 
         - ``group_packets_by_io_group``
@@ -34,6 +35,9 @@ class PACMAN_IO(IO):
         - ``double_send_packets``
         - ``enable_raw_file_writing``
         - ``disable_packet_parsing``
+        - ``disable_bytestream``
+        - ``enable_background_receiver``
+        - ``enable_packet_batch``
 
     To enable each option set the flag to ``True``; to disable, set to
     ``False``.
@@ -48,6 +52,12 @@ class PACMAN_IO(IO):
 
         - The ``disable_packet_parsing`` option will skip converting PACMAN messages into ``larpix.packet`` types. Thus if ``disable_packet_parsing=True``, every call to ``empty_queue`` will return ``[], b''``. Typically used in conjunction with ``enable_raw_file_writing``, this allows the PACMAN_IO class to read data much faster.
 
+        - The ``disable_bytestream`` option will skip concatenating the received PACMAN messages into a single bytestring. Thus if ``disable_bytestream=True``, every call to ``empty_queue`` will return ``<packets>, b''``. Use this if the bytestream returned by ``empty_queue`` (and stored by ``Controller.run``) is not needed.
+
+        - The ``enable_background_receiver`` option is disabled by default and starts a thread in ``start_listening`` that continuously receives messages from the data sockets into a ring buffer of up to ``background_buffer_length`` messages, until ``stop_listening`` is called. ``empty_queue`` then returns the messages in the ring buffer, rather than reading the sockets. This prevents messages from being dropped by the ZMQ sockets (after ``hwm`` messages) if ``empty_queue`` is not called often, e.g. while configuring chips. If the ring buffer is full, the oldest message is discarded and counted in ``dropped_messages``. The flag must be set before calling ``start_listening``.
+
+        - The ``enable_packet_batch`` option is disabled by default and decodes the received PACMAN messages directly into a ``PacketBatch`` (see ``larpix.format.pacman_msg_format.parse_to_batch``), rather than creating a packet object for each word. ``empty_queue`` then returns ``<PacketBatch>, <bytestream>``, and ``Controller.read`` and ``Controller.run`` store the ``PacketBatch``, which uses much less memory during long runs. Only the data packets are included: the message timestamps and the trigger and sync words are not returned (use ``enable_raw_file_writing`` to record them).
+
 
     '''
     default_filepath = 'io/pacman.json'
@@ -62,6 +72,12 @@ class PACMAN_IO(IO):
     double_send_packets = False
     enable_raw_file_writing = False
     disable_packet_parsing = False
+    disable_bytestream = False
+    enable_background_receiver = False
+    enable_packet_batch = False
+    background_buffer_length = 2**16
+    background_poll_timeout = 100 # ms
+    _receiver_wait_interval = 0.001 # s
 
     _base_ctrl_reg = 0x10
     _clk_ctrl_reg = 0x1010
@@ -112,6 +128,10 @@ class PACMAN_IO(IO):
         self.poller = zmq.Poller()
         for receiver in self.receivers.values():
             self.poller.register(receiver, zmq.POLLIN)
+        self.dropped_messages = 0
+        self._receiver_buffer = deque()
+        self._receiver = None
+        self._receiver_stop = threading.Event()
 
         self._raw_file_queue = multiprocessing.Queue()
         self.raw_filename = os.path.join(
@@ -126,6 +146,42 @@ class PACMAN_IO(IO):
         Sends a request message to PACMAN boards to send designated
         packets.
 
+        The first message to each PACMAN board is sent immediately and the
+        next message to a board is sent as soon as that board replies, so
+        the boards are configured in parallel. Messages to the same board
+        are sent in order.
+
+        '''
+        msgs = defaultdict(deque)
+        for address, msg in self._format_send_msgs(packets):
+            msgs[address].append(msg)
+        poller = zmq.Poller()
+        timeout = None
+        for address in msgs:
+            sender = self.senders[address]
+            if sender.getsockopt(zmq.RCVTIMEO) >= 0:
+                timeout = sender.getsockopt(zmq.RCVTIMEO)
+            sender.send(msgs[address].popleft())
+            poller.register(sender, zmq.POLLIN)
+        n_waiting = len(msgs)
+        while n_waiting:
+            ready = poller.poll(timeout)
+            if not ready:
+                raise zmq.Again('Timed out waiting for PACMAN reply')
+            for sender, _ in ready:
+                address = self.senders.inv[sender]
+                self._sender_replies[address].append(sender.recv())
+                if msgs[address]:
+                    sender.send(msgs[address].popleft())
+                else:
+                    poller.unregister(sender)
+                    n_waiting -= 1
+
+    def _format_send_msgs(self, packets):
+        '''
+        Generates the ``(address, message)`` pairs to send for ``packets``,
+        in the order they should be sent
+
         '''
         msg_packets = list()
         # group packets into messages destined for a single io group (otherwise 1pkt = 1msg)
@@ -153,7 +209,6 @@ class PACMAN_IO(IO):
             msg_packets = doubled_msg_packets
 
         # convert packets to messages
-        resp_addresses = list()
         for packets in msg_packets:
             io_group = packets[0].io_group
             for i in range(0, len(packets), self.max_msg_length):
@@ -161,8 +216,7 @@ class PACMAN_IO(IO):
                 msg_len = min(len(packets)-i, self.max_msg_length)
                 msg = pacman_msg_format.format(packets[i:i+msg_len], msg_type='REQ')
                 address = self._io_group_table[io_group]
-                self.senders[address].send(msg)
-                self._sender_replies[address].append(self.senders[address].recv())
+                yield address, msg
 
     def start_listening(self):
         '''
@@ -174,6 +228,8 @@ class PACMAN_IO(IO):
         super(PACMAN_IO, self).start_listening()
         for receiver in self.receivers.values():
             receiver.setsockopt(zmq.SUBSCRIBE, b'')
+        if self.enable_background_receiver:
+            self._start_receiver()
 
     def stop_listening(self):
         '''
@@ -183,9 +239,42 @@ class PACMAN_IO(IO):
         if not self.is_listening:
             raise RuntimeError('Already not listening')
         super(PACMAN_IO, self).stop_listening()
+        self._stop_receiver()
         for receiver in self.receivers.values():
             receiver.setsockopt(zmq.UNSUBSCRIBE, b'')
 
+    def _start_receiver(self):
+        self._receiver_buffer = deque(self._receiver_buffer,
+            maxlen=self.background_buffer_length)
+        self._receiver_stop.clear()
+        self._receiver = threading.Thread(target=self._receive_loop)
+        self._receiver.daemon = True
+        self._receiver.start()
+
+    def _stop_receiver(self):
+        if self._receiver is not None:
+            self._receiver_stop.set()
+            self._receiver.join()
+            self._receiver = None
+
+    def _receive_loop(self):
+        '''
+        Receive messages into the ring buffer until ``_receiver_stop`` is set
+
+        '''
+        buffer = self._receiver_buffer
+        while not self._receiver_stop.is_set():
+            for socket, _ in self.poller.poll(self.background_poll_timeout):
+                io_group = self._io_group_table.inv[self.receivers.inv[socket]]
+                for _ in range(self.hwm):
+                    try:
+                        frame = socket.recv(zmq.NOBLOCK, copy=False)
+                    except zmq.Again:
+                        break
+                    if len(buffer) == buffer.maxlen:
+                        self.dropped_messages += 1
+                    buffer.append((frame.buffer, io_group))
+
     @staticmethod
     def _group_by_attr(packets, attr):
         '''
@@ -222,33 +311,94 @@ class PACMAN_IO(IO):
         '''
         Fetch and parse waiting packets on pacman data socket
 
-        returns tuple of list of packets, full bytestream of all messages
+        Each data socket with waiting messages is drained without blocking
+        until it is empty (or ``hwm`` messages have been received in total).
+        Messages are received as zero-copy ``zmq.Frame`` buffers. If
+        ``enable_background_receiver`` is set, the messages held in the
+        background receiver ring buffer are returned instead.
+
+        returns tuple of list of packets (or a ``PacketBatch``, if
+        ``enable_packet_batch`` is set), full bytestream of all messages
+
+        '''
+        messages, io_groups = self._buffered_messages()
+        n_recv = 0
+        for socket, _ in (self.poller.poll(0) if self._receiver is None else []):
+            io_group = self._io_group_table.inv[self.receivers.inv[socket]]
+            while n_recv < self.hwm:
+                try:
+                    frame = socket.recv(zmq.NOBLOCK, copy=False)
+                except zmq.Again:
+                    break
+                messages.append(frame.buffer)
+                io_groups.append(io_group)
+                n_recv += 1
+        return self._process_messages(messages, io_groups)
+
+    def _buffered_messages(self):
+        '''
+        Take the messages held in the background receiver ring buffer
+
+        :returns: tuple of list of messages, list of their io groups
+
+        '''
+        messages = []
+        io_groups = []
+        # messages left from the background receiver are always read, it
+        # only appends to the buffer so its length is a lower bound
+        for _ in range(len(self._receiver_buffer)):
+            message, io_group = self._receiver_buffer.popleft()
+            messages.append(message)
+            io_groups.append(io_group)
+        return messages, io_groups
+
+    def _process_messages(self, messages, io_groups):
+        '''
+        Parse the received messages and queue them for the raw file, see
+        ``empty_queue``
+
+        :returns: tuple of list of packets (or a ``PacketBatch``), bytestream
 
         '''
         packets = []
-        address_list = list()
-        bytestream_list = list()
         bytestream = b''
-        n_recv = 0
-        while self.poller.poll(0) and n_recv < self.hwm:
-            events = dict(self.poller.poll(0))
-            for socket, n_events in events.items():
-                for _ in range(n_events):
-                    message = socket.recv()
-                    n_recv += 1
-                    bytestream_list += [message]
-                    address_list += [self.receivers.inv[socket]]
         if not self.disable_packet_parsing:
-            for message, address in zip(bytestream_list, address_list):
-                packets += pacman_msg_format.parse(message, io_group=self._io_group_table.inv[address])
-            bytestream = b''.join(bytestream_list)
+            if self.enable_packet_batch:
+                packets = pacman_msg_format.parse_to_batch(messages, io_group=io_groups)
+            else:
+                for message, io_group in zip(messages, io_groups):
+                    packets.extend(pacman_msg_format.parse(message, io_group=io_group))
+            if not self.disable_bytestream:
+                bytestream = b''.join(messages)
         if self.enable_raw_file_writing:
-            self._raw_file_queue.put((bytestream_list, [self._io_group_table.inv[address] for address in address_list]))
+            self._raw_file_queue.put(([bytes(message) for message in messages], io_groups))
             if not self._raw_file_worker.is_alive():
                 self._launch_raw_file_worker()
 
         return packets,bytestream
 
+    def wait_for_data(self, timeout):
+        '''
+        Wait until a message is available to ``empty_queue``
+
+        :param timeout: maximum time to wait in seconds
+
+        :returns: ``True`` if a message is available
+
+        '''
+        if self._receiver is not None:
+            # messages are received by the background receiver thread
+            stop_time = time.time() + timeout
+            while not len(self._receiver_buffer):
+                remaining = stop_time - time.time()
+                if remaining <= 0:
+                    return False
+                time.sleep(min(remaining, self._receiver_wait_interval))
+            return True
+        if len(self._receiver_buffer):
+            return True
+        return bool(self.poller.poll(max(int(timeout * 1000), 0)))
+
     def cleanup(self):
         '''
         Close the ZMQ objects to prevent a memory leak.
@@ -257,6 +407,7 @@ class PACMAN_IO(IO):
         ``PACMAN_IO`` object.
 
         '''
+        self._stop_receiver()
         for address in self.senders.keys():
             self.senders[address].close(linger=0)
             self.receivers[address].close(linger=0)
@@ -1,6 +1,10 @@
 import time
 import os
 import threading
+import multiprocessing
+import traceback
+import itertools
+import pickle
 import sys
 if sys.version_info[0] >= 3:
     from queue import Queue, Empty
@@ -11,8 +15,142 @@ import numpy as np
 import h5py
 
 from larpix.logger import Logger
-from larpix import Packet, TimestampPacket, Packet_v1, Packet_v2, SyncPacket, TriggerPacket
-from larpix.format.hdf5format import to_file, latest_version
+from larpix import Packet, TimestampPacket, Packet_v1, Packet_v2, SyncPacket, TriggerPacket, PacketBatch
+from larpix.format.hdf5format import to_file, latest_version, dtypes
+
+# placeholder in the worker queue for a buffer that was written to the spill file
+_spilled = object()
+
+class _PacketRing(object):
+    '''
+    A fixed-size ring buffer of ``PacketBatch`` packet words and metadata
+    columns in shared memory, written by one process and read by another.
+
+    The writer copies a batch into the ring with ``write`` and sends the
+    returned message to the reader, which recreates the batch with
+    ``read(*message[1:])``. The writer waits for the reader if the ring is
+    full.
+
+    '''
+    columns = (('words', '<u8'),) + tuple(PacketBatch.metadata_dtypes.items())
+
+    def __init__(self, capacity, context=multiprocessing):
+        self.capacity = capacity
+        self._buffers = [context.RawArray('B', capacity * np.dtype(dtype).itemsize)
+            for _, dtype in self.columns]
+        self._consumed = context.RawValue('Q', 0)
+        self._init_arrays()
+
+    def __getstate__(self):
+        return dict(capacity=self.capacity, _buffers=self._buffers,
+            _consumed=self._consumed)
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._init_arrays()
+
+    def _init_arrays(self):
+        self._position = 0
+        self._arrays = [np.frombuffer(buffer, dtype=dtype)
+            for buffer, (_, dtype) in zip(self._buffers, self.columns)]
+
+    def _span(self, n):
+        start = self._position % self.capacity
+        return start, min(n, self.capacity - start)
+
+    def write(self, batch, is_alive=None):
+        '''
+        Copy a ``PacketBatch`` of at most ``capacity`` packets into the ring
+
+        :param is_alive: function returning ``False`` if the reader has died
+
+        :returns: message to send to the reader
+
+        '''
+        n = len(batch)
+        while self._position + n - self._consumed.value > self.capacity:
+            if is_alive is not None and not is_alive():
+                raise RuntimeError('packet ring reader has stopped')
+            time.sleep(1e-3)
+        start, first = self._span(n)
+        present = []
+        for (name, _), array in zip(self.columns, self._arrays):
+            column = batch.words if name == 'words' else getattr(batch, name)
+            if name != 'words':
+                present.append(column is not None)
+            if column is None:
+                continue
+            array[start:start+first] = column[:first]
+            array[:n-first] = column[first:]
+        self._position += n
+        return ('ring', n, tuple(present), batch.fifo_diagnostics_enabled)
+
+    def read(self, n, present, fifo_diagnostics_enabled):
+        '''
+        Copy the next ``n`` packets out of the ring
+
+        :returns: ``PacketBatch``
+
+        '''
+        start, first = self._span(n)
+        columns = [np.concatenate([array[start:start+first], array[:n-first]])
+            for array in self._arrays]
+        self._position += n
+        self._consumed.value = self._position
+        batch = PacketBatch(columns[0], **dict([
+            (name, column if is_present else None)
+            for (name, _), column, is_present in zip(self.columns[1:], columns[1:], present)]))
+        batch.fifo_diagnostics_enabled = fifo_diagnostics_enabled
+        return batch
+
+def _process_writer(logger_kwargs, ring, queue, ack_queue):
+    '''
+    Main loop of the ``HDF5Logger`` writer process. Buffers are assembled
+    from ``'ring'`` and ``'objects'`` messages and written on a ``'write'``
+    message, ``'close'`` closes the file and exits. Writes are not
+    acknowledged, ``'sync'`` and ``'close'`` are acknowledged on
+    ``ack_queue`` with ``None`` or the first exception (formatted) raised
+    since the previous acknowledgement. Buffers are not written after an
+    exception until it has been acknowledged.
+
+    '''
+    logger = HDF5Logger(**logger_kwargs)
+    packets = []
+    error = None
+    while True:
+        msg = queue.get()
+        try:
+            if msg[0] == 'ring':
+                packets.append(ring.read(*msg[1:]))
+            elif msg[0] == 'objects':
+                packets.extend(msg[1])
+            elif error is None and msg[0] == 'write':
+                logger._write(packets, chips=msg[1])
+            elif error is None and msg[0] == 'close':
+                logger._close_output(msg[1])
+        except Exception:
+            if error is None:
+                error = traceback.format_exc()
+        if msg[0] == 'write':
+            packets = []
+        elif msg[0] in ('sync', 'close'):
+            ack_queue.put(error)
+            error = None
+            if msg[0] == 'close':
+                return
+
+def _ring_key(obj):
+    '''
+    Group the objects passed to the writer process: ``PacketBatch`` objects
+    and runs of ``Packet_v2`` objects (with the same FIFO diagnostics mode)
+    are copied through the shared-memory ring, other objects are pickled
+
+    '''
+    if type(obj) is PacketBatch:
+        return ('batch',)
+    if type(obj) is Packet_v2:
+        return ('packets', obj.fifo_diagnostics_enabled)
+    return ('objects',)
 
 class HDF5Logger(Logger):
     '''
@@ -27,6 +165,10 @@ class HDF5Logger(Logger):
         in. As of LArPix+HDF5 version 1.0 and larpix-control version
         2.3.0 there is only one buffer called ``'packets'`` which stores
         all of the data to send to LArPix+HDF5.
+    :var dropped_packets: number of packets discarded with
+        ``overflow='drop'``
+    :var spilled_packets: number of packets written to the spill file with
+        ``overflow='spill'``
 
     :param filename: filename to store data (appended to ``directory``)
         (optional, default: ``None``)
@@ -36,31 +178,165 @@ class HDF5Logger(Logger):
         default: '')
     :param version: the format version of LArPix+HDF5 to use (optional,
         default: ``larpix.format.hdf5format.latest_version``)
+    :param chunk_size: number of rows per HDF5 chunk of the packets dataset
+        (optional, default: ``None``, chosen by h5py)
+    :param compression: HDF5 compression filter for the packets dataset, e.g.
+        ``'gzip'`` or ``'lzf'`` (optional, default: ``None``)
+    :param compression_opts: compression filter options, e.g. the gzip level
+        (optional, default: ``None``)
+    :param shuffle: apply the HDF5 shuffle filter to the packets dataset
+        (optional, default: ``False``)
+    :param preallocate: grow the packets dataset geometrically rather than on
+        every flush, the dataset is trimmed to the valid rows when the logger
+        is disabled (optional, default: ``False``)
+
+    :param keep_open: keep the file open while the logger is enabled, rather
+        than reopening it on each flush. The packets dataset is grown
+        geometrically (as with ``preallocate``) and the file is trimmed and
+        closed when the logger is disabled (optional, default: ``False``)
+    :param swmr: open the file in HDF5 single-writer/multiple-reader mode
+        so that it can be read (e.g. by an online monitor opening it with
+        ``h5py.File(filename, 'r', libver='latest', swmr=True)``) while it is
+        being written. Implies ``keep_open``. (optional, default: ``False``)
+
+    :param max_pending: maximum number of packets in flushed buffers that
+        are waiting to be written to the file, ``None`` for no limit. A
+        single buffer is always accepted if nothing is pending. (optional,
+        default: ``None``)
+    :param overflow: what to do with a flushed buffer if it would exceed
+        ``max_pending``: ``'block'`` waits for the pending packets to be
+        written, ``'drop'`` discards the buffer (counted in
+        ``dropped_packets``), and ``'spill'`` writes the buffer to a scratch
+        file on disk, to be written to the log file in order once the
+        writer catches up (counted in ``spilled_packets``) (optional,
+        default: ``'block'``)
+    :param spill_filename: scratch file used by ``overflow='spill'``, removed
+        when the logger is disabled (optional, default: ``filename + '.spill'``)
+    :param writer: ``'thread'`` to encode and write packets in a thread of
+        this process, or ``'process'`` to encode and write them in a separate
+        process, so that the work does not compete with data acquisition for
+        the GIL. ``PacketBatch`` objects and ``Packet_v2`` objects
+        (converted to a ``PacketBatch``) are passed to the writer process
+        through a shared-memory ring buffer, other objects are pickled.
+        Buffers are written asynchronously, an error in the writer process
+        is raised by the next ``flush(block=True)``, ``record_configs``, or
+        ``disable``. The file written is the same in both modes. (optional,
+        default: ``'thread'``)
+    :param ring_size: number of packets in the shared-memory ring buffer used
+        with ``writer='process'`` (optional, default: ``2**20``)
+
+    The layout options only apply when the packets dataset is created, see
+    ``larpix.format.hdf5format.to_file``.
+
+    The progress of the writer can be monitored with ``queue_depth``,
+    ``packets_pending``, ``bytes_pending``, and ``write_latency``.
+
+    .. note:: With ``keep_open``, the file cannot be opened for reading by
+        the same process until the logger is disabled, unless ``swmr`` is
+        used.
+
+    .. note:: With ``writer='process'``, the writer process is stopped by
+        ``disable()``. Packets still buffered when the program exits without
+        disabling the logger are lost.
 
     '''
+    overflow_policies = ('block', 'drop', 'spill')
+    writers = ('thread', 'process')
+
     data_desc_map = {
         Packet_v1: 'packets',
         Packet_v2: 'packets',
         TimestampPacket: 'packets',
         SyncPacket: 'packets',
-        TriggerPacket: 'packets'
+        TriggerPacket: 'packets',
+        PacketBatch: 'packets'
     }
 
     def __init__(self, filename=None, buffer_length=10000,
-            directory='', version=latest_version, enabled=False):
+            directory='', version=latest_version, enabled=False,
+            chunk_size=None, compression=None, compression_opts=None,
+            shuffle=False, preallocate=False, keep_open=False, swmr=False,
+            max_pending=None, overflow='block', spill_filename=None,
+            writer='thread', ring_size=2**20):
         super(HDF5Logger, self).__init__(enabled=enabled)
+        if overflow not in self.overflow_policies:
+            raise ValueError('overflow must be one of {}'.format(self.overflow_policies))
+        if writer not in self.writers:
+            raise ValueError('writer must be one of {}'.format(self.writers))
         self.version = version
+        self.chunk_size = chunk_size
+        self.compression = compression
+        self.compression_opts = compression_opts
+        self.shuffle = shuffle
+        self.preallocate = preallocate
+        self.swmr = swmr
+        self.keep_open = keep_open or swmr
         self.filename = filename
         self.directory = directory
         self.datafile = None
         self.buffer_length = buffer_length
+        self.max_pending = max_pending
+        self.overflow = overflow
+        self.dropped_packets = 0
+        self.spilled_packets = 0
+        self.writer = writer
+        self.ring_size = ring_size
 
         self._buffer = {'packets': []}
+        self._buffer_size = {'packets': 0}
         self._worker_queue = Queue()
         self._worker = None
+        self._pending_cond = threading.Condition()
+        self._packets_pending = 0
+        self._write_latency = None
+        self._spill_lock = threading.Lock()
+        self._spill_file = None
+        self._spill_read_offset = 0
+        self._process = None
+        self._process_lock = threading.Lock()
+        self._row_nbytes = np.dtype(dtypes[version][
+            'raw_packet' if version == '0.0' else 'packets']).itemsize
         if not self.filename:
             self.filename = self._default_filename()
         self.filename = os.path.join(self.directory, self.filename)
+        self.spill_filename = spill_filename
+        if not self.spill_filename:
+            self.spill_filename = self.filename + '.spill'
+
+    @property
+    def queue_depth(self):
+        '''
+        Number of flushed buffers waiting to be written
+
+        '''
+        return self._worker_queue.qsize()
+
+    @property
+    def packets_pending(self):
+        '''
+        Number of packets held in memory in flushed buffers that have not been
+        written (not including the current buffer or spilled packets)
+
+        '''
+        return self._packets_pending
+
+    @property
+    def bytes_pending(self):
+        '''
+        Size of the pending packets once written to the file, in bytes
+
+        '''
+        return self._packets_pending * self._row_nbytes
+
+    @property
+    def write_latency(self):
+        '''
+        Time taken to write the most recent buffer to the file (or to pass
+        it to the writer process, with ``writer='process'``), in seconds
+        (``None`` if nothing has been written)
+
+        '''
+        return self._write_latency
 
     def _default_filename(self, timestamp=None):
         '''
@@ -87,7 +363,7 @@ class HDF5Logger(Logger):
 
         '''
         self.flush(block=True)
-        to_file(self.filename, chip_list=chips, version=self.version)
+        self._write(chips=chips)
 
     def record(self, data, direction=Logger.WRITE):
         '''
@@ -96,7 +372,7 @@ class HDF5Logger(Logger):
         .. note:: buffer is flushed after all ``data`` is placed in buffer, this
             means that the buffer size will exceed the set value temporarily
 
-        :param data: list of data to be written to log
+        :param data: list of data or a ``PacketBatch`` to be written to log
         :param direction: ``Logger.WRITE`` if packets were sent to
             ASICs, ``Logger.READ`` if packets
             were received from ASICs. (default: ``Logger.WRITE``)
@@ -104,6 +380,8 @@ class HDF5Logger(Logger):
         '''
         if not self.is_enabled():
             return
+        if isinstance(data, PacketBatch):
+            data = [data]
         if not isinstance(data, list):
             raise ValueError('data must be a list')
 
@@ -111,8 +389,9 @@ class HDF5Logger(Logger):
             data_obj.direction = direction
             dataset = self.data_desc_map[type(data_obj)]
             self._buffer[dataset].append(data_obj)
+            self._buffer_size[dataset] += len(data_obj) if isinstance(data_obj, PacketBatch) else 1
 
-        if any([len(buff) > self.buffer_length for dataset, buff in self._buffer.items()]):
+        if any([size > self.buffer_length for dataset, size in self._buffer_size.items()]):
             self.flush(block=False)
 
     def enable(self):
@@ -126,15 +405,226 @@ class HDF5Logger(Logger):
 
         '''
         super(HDF5Logger, self).enable()
+        if self.writer == 'process':
+            with self._process_lock:
+                if self._process is None:
+                    self._start_process()
+        elif self.keep_open:
+            self._output_file()
         self.flush(block=False)
 
+    def disable(self):
+        '''
+        Disable the logger, flushing any data in the buffer to the log file
+
+        If the packets dataset was preallocated, it is trimmed to the number
+        of packets written. If the file was kept open, it is closed.
+
+        '''
+        was_enabled = self.is_enabled()
+        super(HDF5Logger, self).disable()
+        self._close_spill_file()
+        if self._process is not None:
+            self._stop_process(was_enabled)
+        else:
+            self._close_output(was_enabled)
+
+    def _close_output(self, was_enabled):
+        if self.datafile is not None:
+            self._close_datafile()
+        elif was_enabled and self.preallocate and os.path.exists(self.filename):
+            to_file(self.filename, version=self.version)
+
+    def _layout_kwargs(self):
+        return dict(
+            chunk_size=self.chunk_size,
+            compression=self.compression,
+            compression_opts=self.compression_opts,
+            shuffle=self.shuffle,
+            preallocate=self.preallocate or self.keep_open
+            )
+
+    def _output_file(self):
+        '''
+        Returns the open ``h5py.File`` (opening it if necessary) if the
+        logger keeps the file open, otherwise the filename
+
+        '''
+        if not self.keep_open:
+            return self.filename
+        if self.datafile is None:
+            self._open_datafile()
+        return self.datafile
+
+    def _open_datafile(self):
+        if self.swmr:
+            datafile = h5py.File(self.filename, 'a', libver='latest')
+            # all datasets must exist before entering SWMR mode
+            to_file(datafile, version=self.version, **self._layout_kwargs())
+            datafile.swmr_mode = True
+        else:
+            datafile = h5py.File(self.filename, 'a')
+        self.datafile = datafile
+
+    def _close_datafile(self):
+        datafile, self.datafile = self.datafile, None
+        try:
+            # trim preallocated rows
+            to_file(datafile, version=self.version)
+        finally:
+            datafile.close()
+
     def flush(self, block=True):
-        self._worker_queue.put(self._buffer['packets'])
-        if self._worker is None:
-            self._launch_worker()
+        packets = self._buffer['packets']
+        n_packets = self._buffer_size['packets']
+        self._buffer['packets'] = []
+        self._buffer_size['packets'] = 0
+        self._enqueue(packets, n_packets)
         if block:
             self._worker_queue.join()
-        self._buffer['packets'] = []
+            if self.writer == 'process':
+                self._sync_process()
+
+    def _is_full(self, n_packets):
+        return (self.max_pending is not None and self._packets_pending > 0
+            and self._packets_pending + n_packets > self.max_pending)
+
+    def _enqueue(self, packets, n_packets):
+        with self._pending_cond:
+            if self._worker is None:
+                self._launch_worker()
+            if self._is_full(n_packets):
+                if self.overflow == 'drop':
+                    self.dropped_packets += n_packets
+                    return
+                if self.overflow == 'spill':
+                    self._spill(packets)
+                    self.spilled_packets += n_packets
+                    self._worker_queue.put((_spilled, n_packets))
+                    return
+                while self._is_full(n_packets):
+                    if self._worker is None:
+                        self._launch_worker()
+                    self._pending_cond.wait(timeout=1)
+            self._packets_pending += n_packets
+            self._worker_queue.put((packets, n_packets))
+
+    def _spill(self, packets):
+        with self._spill_lock:
+            if self._spill_file is None:
+                self._spill_file = open(self.spill_filename, 'w+b')
+                self._spill_read_offset = 0
+            self._spill_file.seek(0, os.SEEK_END)
+            pickle.dump(packets, self._spill_file, protocol=pickle.HIGHEST_PROTOCOL)
+            self._spill_file.flush()
+
+    def _unspill(self):
+        with self._spill_lock:
+            self._spill_file.seek(self._spill_read_offset)
+            packets = pickle.load(self._spill_file)
+            self._spill_read_offset = self._spill_file.tell()
+            if self._spill_read_offset == self._spill_file.seek(0, os.SEEK_END):
+                # all spilled buffers have been read
+                self._spill_file.truncate(0)
+                self._spill_read_offset = 0
+            return packets
+
+    def _close_spill_file(self):
+        with self._spill_lock:
+            if self._spill_file is not None:
+                self._spill_file.close()
+                os.remove(self.spill_filename)
+                self._spill_file = None
+
+    def _write(self, packets=None, chips=None):
+        '''
+        Write packets and chip configurations to the file (in the writer
+        process, if enabled)
+
+        '''
+        if self.writer == 'process':
+            self._process_write(packets, chips)
+        else:
+            to_file(self._output_file(), packets, chip_list=chips,
+                version=self.version, **self._layout_kwargs())
+
+    def _process_kwargs(self):
+        return dict(
+            filename=self.filename,
+            version=self.version,
+            chunk_size=self.chunk_size,
+            compression=self.compression,
+            compression_opts=self.compression_opts,
+            shuffle=self.shuffle,
+            preallocate=self.preallocate,
+            keep_open=self.keep_open,
+            swmr=self.swmr
+            )
+
+    def _start_process(self):
+        # spawn, so that the writer does not inherit h5py state (or locks
+        # held by other threads) from this process
+        context = multiprocessing.get_context('spawn')
+        self._ring = _PacketRing(self.ring_size, context)
+        self._process_queue = context.Queue()
+        self._ack_queue = context.Queue()
+        self._process = context.Process(target=_process_writer,
+            args=(self._process_kwargs(), self._ring, self._process_queue,
+            self._ack_queue))
+        self._process.daemon = True
+        self._process.start()
+
+    def _stop_process(self, was_enabled):
+        with self._process_lock:
+            try:
+                self._process_queue.put(('close', was_enabled))
+                self._wait_for_process()
+            finally:
+                self._process.join()
+                self._process = None
+
+    def _wait_for_process(self):
+        while True:
+            try:
+                error = self._ack_queue.get(timeout=1)
+                break
+            except Empty:
+                if not self._process.is_alive():
+                    raise RuntimeError('HDF5Logger writer process has stopped')
+        if error is not None:
+            raise RuntimeError('HDF5Logger writer process error:\n' + error)
+
+    def _sync_process(self):
+        '''
+        Wait for the writer process to write all buffers sent to it, and
+        raise any error that it encountered
+
+        '''
+        with self._process_lock:
+            if self._process is None:
+                return
+            self._process_queue.put(('sync',))
+            self._wait_for_process()
+
+    def _process_write(self, packets, chips):
+        with self._process_lock:
+            if self._process is None:
+                self._start_process()
+            for key, objects in itertools.groupby(packets or [], key=_ring_key):
+                objects = list(objects)
+                if key[0] == 'objects':
+                    self._process_queue.put(('objects', objects))
+                    continue
+                if key[0] == 'packets':
+                    batch = PacketBatch.from_packets(objects)
+                    batch.fifo_diagnostics_enabled = key[1]
+                    objects = [batch]
+                for batch in objects:
+                    for start in range(0, len(batch), self._ring.capacity):
+                        self._process_queue.put(self._ring.write(
+                            batch[start:start+self._ring.capacity],
+                            is_alive=self._process.is_alive))
+            self._process_queue.put(('write', chips))
 
     def _launch_worker(self):
         self._worker = threading.Thread(target=self._writer)
@@ -143,14 +633,29 @@ class HDF5Logger(Logger):
     def _writer(self):
         try:
             while True:
-                packets = self._worker_queue.get(timeout=1)
-                to_file(self.filename, packets, version=self.version)
-                self._worker_queue.task_done()
-        except Empty:
-            pass
+                try:
+                    packets, n_packets = self._worker_queue.get(timeout=1)
+                except Empty:
+                    with self._pending_cond:
+                        if self._worker_queue.empty():
+                            self._worker = None
+                            return
+                    continue
+                spilled = packets is _spilled
+                try:
+                    if spilled:
+                        packets = self._unspill()
+                    start = time.time()
+                    self._write(packets)
+                    self._write_latency = time.time() - start
+                finally:
+                    if not spilled:
+                        with self._pending_cond:
+                            self._packets_pending -= n_packets
+                            self._pending_cond.notify_all()
+                    self._worker_queue.task_done()
         except:
             print('HDF5Logger IO thread error!')
+            with self._pending_cond:
+                self._worker = None
             raise
-        finally:
-            self._worker = None
-
@@ -2,6 +2,7 @@ from __future__ import print_function
 import time
 
 from larpix.logger import Logger
+from larpix import PacketBatch
 
 class StdoutLogger(Logger):
     '''
@@ -28,6 +29,8 @@ class StdoutLogger(Logger):
         '''
         if not self.is_enabled():
             return
+        if isinstance(data, PacketBatch):
+            data = data.to_packets()
         if not isinstance(data,list):
             raise ValueError('data must be a list')
 
@@ -5,5 +5,6 @@ from .message_packet import *
 from .trigger_packet import *
 from .sync_packet import *
 Packet = Packet_v2
+from .packet_batch import *
 
 from .packet_collection import *
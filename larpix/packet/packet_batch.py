@@ -0,0 +1,277 @@
+import numpy as np
+
+from .packet_v2 import Packet_v2
+
+class PacketBatch(object):
+    '''
+    Array-backed representation of a sequence of LArPix v2 (or LightPix v1)
+    UART data packets.
+
+    A ``PacketBatch`` stores N packets as a single ``uint64`` numpy array of
+    packet words (bit ``i`` of the word is bit ``i`` of ``Packet_v2.bits``),
+    along with parallel metadata columns for the ``io_group``, ``io_channel``,
+    ``receipt_timestamp``, and ``direction`` of each packet. This uses a small
+    fraction of the memory of a ``list`` of ``Packet_v2`` objects. E.g.::
+
+        batch = PacketBatch.from_packets(packets) # from a list of Packet_v2
+        batch = PacketBatch(words, io_group=1, io_channel=[1,2,...]) # from raw words
+
+    The packet fields are available as vectorized properties that return
+    (or accept) numpy arrays::
+
+        batch.chip_id # array of chip ids
+        batch.dataword[batch.packet_type == Packet_v2.DATA_PACKET]
+        batch.has_valid_parity() # array of bools
+
+    Indexing with an integer returns a newly created ``Packet_v2`` view of the
+    packet, and indexing with a slice, index array, or mask returns a new
+    ``PacketBatch``. Iterating over a ``PacketBatch`` lazily yields
+    ``Packet_v2`` objects, so it can be used in place of a list of packets::
+
+        batch[0] # Packet_v2(...)
+        batch[batch.chip_id == 12] # PacketBatch of packets from chip id 12
+        for packet in batch:
+            print(packet)
+
+    .. note:: ``Packet_v2`` objects created from a ``PacketBatch`` are copies,
+        modifying them will not modify the ``PacketBatch``.
+
+    A metadata column that is not specified is ``None`` and the corresponding
+    attribute will not be set on the generated ``Packet_v2`` objects.
+
+    FIFO diagnostics mode is handled in the same way as for ``Packet_v2``, by
+    setting ``PacketBatch.fifo_diagnostics_enabled`` or
+    ``batch.fifo_diagnostics_enabled``.
+
+    '''
+    packet_class = Packet_v2
+    fifo_diagnostics_enabled = False
+
+    #: Metadata columns and their numpy dtypes
+    metadata_dtypes = dict(
+        io_group='u1',
+        io_channel='u1',
+        receipt_timestamp='u4',
+        direction='u1'
+        )
+
+    def __init__(self, words=None, io_group=None, io_channel=None,
+            receipt_timestamp=None, direction=None):
+        if words is None:
+            words = []
+        self.words = np.array(words, dtype='<u8', ndmin=1)
+        self.io_group = io_group
+        self.io_channel = io_channel
+        self.receipt_timestamp = receipt_timestamp
+        self.direction = direction
+
+    def __len__(self):
+        return len(self.words)
+
+    def __eq__(self, other):
+        if isinstance(other, PacketBatch):
+            if not np.array_equal(self.words, other.words):
+                return False
+            for name in self.metadata_dtypes:
+                self_value, other_value = getattr(self, name), getattr(other, name)
+                if (self_value is None) != (other_value is None):
+                    return False
+                if self_value is not None and not np.array_equal(self_value, other_value):
+                    return False
+            return True
+        try:
+            return len(self) == len(other) and all(
+                [packet == other_packet for packet, other_packet in zip(self, other)])
+        except TypeError:
+            return False
+
+    def __ne__(self, other):
+        return not (self == other)
+
+    def __str__(self):
+        return '\n'.join([str(packet) for packet in self])
+
+    def __repr__(self):
+        return '<{} with {} packets>'.format(self.__class__.__name__, len(self))
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self._packet(i)
+
+    def __getitem__(self, key):
+        if isinstance(key, (int, np.integer)):
+            if key < 0:
+                key += len(self)
+            if key < 0 or key >= len(self):
+                raise IndexError('PacketBatch index out of range')
+            return self._packet(key)
+        batch = self.__class__(self.words[key], **dict([
+            (name, None if getattr(self, name) is None else getattr(self, name)[key])
+            for name in self.metadata_dtypes]))
+        if self.fifo_diagnostics_enabled != self.__class__.fifo_diagnostics_enabled:
+            batch.fifo_diagnostics_enabled = self.fifo_diagnostics_enabled
+        return batch
+
+    def _packet(self, index):
+        packet = self.packet_class(self.words[index:index+1].tobytes())
+        if self.fifo_diagnostics_enabled != packet.fifo_diagnostics_enabled:
+            packet.fifo_diagnostics_enabled = self.fifo_diagnostics_enabled
+        for name in self.metadata_dtypes:
+            column = getattr(self, name)
+            if column is not None:
+                setattr(packet, name, int(column[index]))
+        return packet
+
+    @classmethod
+    def from_packets(cls, packets):
+        '''
+        Create a ``PacketBatch`` from an iterable of ``Packet_v2`` objects
+
+        '''
+        packets = list(packets)
+        words = np.fromiter((packet.as_int() for packet in packets), dtype='<u8',
+            count=len(packets))
+        metadata = dict()
+        for name in cls.metadata_dtypes:
+            values = [getattr(packet, name, None) for packet in packets]
+            if all([value is None for value in values]):
+                metadata[name] = None
+            else:
+                metadata[name] = [0 if value is None else value for value in values]
+        return cls(words, **metadata)
+
+    @classmethod
+    def concatenate(cls, batches):
+        '''
+        Join an iterable of ``PacketBatch`` objects into a single ``PacketBatch``
+
+        '''
+        batches = list(batches)
+        words = np.concatenate([batch.words for batch in batches]) if batches else None
+        metadata = dict()
+        for name in cls.metadata_dtypes:
+            columns = [getattr(batch, name) for batch in batches]
+            if all([column is None for column in columns]):
+                metadata[name] = None
+            else:
+                metadata[name] = np.concatenate([
+                    np.zeros(len(batch), dtype=cls.metadata_dtypes[name]) if column is None else column
+                    for batch, column in zip(batches, columns)])
+        return cls(words, **metadata)
+
+    def to_packets(self):
+        '''
+        Convert to a ``list`` of ``Packet_v2`` objects
+
+        '''
+        return list(self)
+
+    def bytes(self):
+        '''
+        Create bytes that represent the packets (8 bytes per packet, in order)
+
+        '''
+        return self.words.tobytes()
+
+    def export(self):
+        '''
+        Return a ``list`` of the dict representation of each packet
+
+        '''
+        return [packet.export() for packet in self]
+
+    def compute_parity(self):
+        '''
+        Return an array of the expected (odd) parity bit of each packet
+
+        '''
+        bit_slice = self.packet_class.parity_calc_bits
+        bits = self.words & np.uint64((1 << (bit_slice.stop - bit_slice.start)) - 1)
+        for shift in (32, 16, 8, 4, 2, 1):
+            bits = bits ^ (bits >> np.uint64(shift))
+        return np.uint64(1) - (bits & np.uint64(1))
+
+    def assign_parity(self):
+        self.parity = self.compute_parity()
+
+    def has_valid_parity(self):
+        return self.parity == self.compute_parity()
+
+    @property
+    def timestamp(self):
+        if self.fifo_diagnostics_enabled:
+            return self._get_bits(self.packet_class.fifo_diagnostics_timestamp_bits)
+        return self._get_bits(self.packet_class.timestamp_bits)
+
+    @timestamp.setter
+    def timestamp(self, value):
+        if self.fifo_diagnostics_enabled:
+            self._set_bits(self.packet_class.fifo_diagnostics_timestamp_bits, value)
+        else:
+            self._set_bits(self.packet_class.timestamp_bits, value)
+
+    @property
+    def local_fifo_events(self):
+        if self.fifo_diagnostics_enabled:
+            return self._get_bits(self.packet_class.local_fifo_events_bits)
+        return None
+
+    @local_fifo_events.setter
+    def local_fifo_events(self, value):
+        if self.fifo_diagnostics_enabled:
+            self._set_bits(self.packet_class.local_fifo_events_bits, value)
+
+    @property
+    def shared_fifo_events(self):
+        if self.fifo_diagnostics_enabled:
+            return self._get_bits(self.packet_class.shared_fifo_events_bits)
+        return None
+
+    @shared_fifo_events.setter
+    def shared_fifo_events(self, value):
+        if self.fifo_diagnostics_enabled:
+            self._set_bits(self.packet_class.shared_fifo_events_bits, value)
+
+    def _get_bits(self, bit_slice):
+        mask = (1 << (bit_slice.stop - bit_slice.start)) - 1
+        return (self.words >> np.uint64(bit_slice.start)) & np.uint64(mask)
+
+    def _set_bits(self, bit_slice, value):
+        mask = (1 << (bit_slice.stop - bit_slice.start)) - 1
+        value = np.asarray(value).astype('<u8') & np.uint64(mask)
+        self.words = (self.words & ~np.uint64(mask << bit_slice.start)) \
+            | (value << np.uint64(bit_slice.start))
+
+    @classmethod
+    def _basic_getter(cls, name):
+        def basic_getter_func(self):
+            return self._get_bits(getattr(self.packet_class, name + '_bits'))
+        return basic_getter_func
+
+    @classmethod
+    def _basic_setter(cls, name):
+        def basic_setter_func(self, value):
+            self._set_bits(getattr(self.packet_class, name + '_bits'), value)
+        return basic_setter_func
+
+    @classmethod
+    def _metadata_getter(cls, name):
+        def metadata_getter_func(self):
+            return getattr(self, '_' + name)
+        return metadata_getter_func
+
+    @classmethod
+    def _metadata_setter(cls, name):
+        def metadata_setter_func(self, value):
+            if value is not None:
+                value = np.broadcast_to(np.asarray(value, dtype=self.metadata_dtypes[name]),
+                    self.words.shape).copy()
+            setattr(self, '_' + name, value)
+        return metadata_setter_func
+
+for _name in ('packet_type', 'chip_id', 'downstream_marker', 'parity', 'channel_id',
+        'dataword', 'first_packet', 'trigger_type', 'register_address',
+        'register_data', 'local_fifo', 'shared_fifo'):
+    setattr(PacketBatch, _name, property(PacketBatch._basic_getter(_name), PacketBatch._basic_setter(_name)))
+for _name in PacketBatch.metadata_dtypes:
+    setattr(PacketBatch, _name, property(PacketBatch._metadata_getter(_name), PacketBatch._metadata_setter(_name)))
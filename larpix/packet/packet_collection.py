@@ -1,9 +1,11 @@
 from bitarray import bitarray
 import struct
+import numpy as np
 
 from .. import bitarrayhelper as bah
 from ..key import Key
 from . import Packet
+from .packet_batch import PacketBatch
 
 class PacketCollection(object):
     '''
@@ -22,6 +24,10 @@ class PacketCollection(object):
         >>> first_ten.message
         'my packets | subset slice(None, 10, None)'
 
+    The packets can be a ``list`` of packet objects or a ``PacketBatch``.
+    Slicing a ``PacketCollection`` of a ``PacketBatch`` keeps the array-backed
+    representation.
+
     To view the bits representation, add 'bits' to the index:
 
         >>> collection[0, 'bits']
@@ -89,7 +95,10 @@ class PacketCollection(object):
 
         '''
         if isinstance(key, slice):
-            items = PacketCollection([p for p in self.packets[key]])
+            if isinstance(self.packets, PacketBatch):
+                items = PacketCollection(self.packets[key])
+            else:
+                items = PacketCollection([p for p in self.packets[key]])
             items.message = '%s | subset %s' % (self.message, key)
             items.parent = self
             items.read_id = self.read_id
@@ -168,6 +177,8 @@ class PacketCollection(object):
         .. note:: selecting on ``timestamp`` will also select
             TimestampPacket values.
         '''
+        if isinstance(self.packets, PacketBatch):
+            return self._extract_batch(*attrs, **selection)
         values = []
         for p in self.packets:
             try:
@@ -180,6 +191,28 @@ class PacketCollection(object):
                 continue
         return values
 
+    def _extract_batch(self, *attrs, **selection):
+        '''
+        Vectorized version of ``extract`` for a ``PacketBatch``, falls back
+        to the per-packet implementation for attributes that are not
+        columns of the ``PacketBatch``
+
+        '''
+        batch = self.packets
+        try:
+            mask = np.ones(len(batch), dtype=bool)
+            for key, value in selection.items():
+                column = getattr(batch, key)
+                mask &= (value is None) if column is None else (column == value)
+            columns = [getattr(batch, attr) for attr in attrs]
+        except AttributeError:
+            return PacketCollection(list(batch)).extract(*attrs, **selection)
+        columns = [[None] * int(mask.sum()) if column is None else column[mask].tolist()
+            for column in columns]
+        if len(attrs) > 1:
+            return [list(value) for value in zip(*columns)]
+        return columns[0]
+
     def origin(self):
         '''
         Return the original PacketCollection that this PacketCollection
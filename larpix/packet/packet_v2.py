@@ -3,16 +3,11 @@ from bitarray import bitarray
 from .. import bitarrayhelper as bah
 from ..key import Key
 
-def _clears_cached_int(func):
-    '''
-    Modify a class function so that it deletes the cached `_int` attribute, if it
-    exists
-
-    '''
-    def new_func(self, *args, **kwargs):
-        self._int = None
-        return func(self, *args, **kwargs)
-    return new_func
+if hasattr(int, 'bit_count'):
+    _popcount = int.bit_count
+else:
+    def _popcount(value):
+        return bin(value).count('1')
 
 def _clears_cached_chip_key(func):
     '''
@@ -30,15 +25,20 @@ class Packet_v2(object):
     '''
     Representation of a 64 bit LArPix v2 (or LightPix v1) UART data packet.
 
-    Packet_v2 objects are internally represented as bitarrays, but a variety of
-    helper properties allow one to access and set the data stored in the bitarrays in
-    a natural fashion. E.g.::
+    Packet_v2 objects are internally represented as a single 64-bit integer, but a
+    variety of helper properties allow one to access and set the data stored in the
+    packet in a natural fashion. E.g.::
 
         p = Packet_v2() # initialize a packet of zeros
         p.packet_type # fetch packet type bits and convert to uint
         p.packet_type = 2 # set the packet type to a config write packet
         print(p.bits) # the bits have been updated!
 
+    The ``bits`` attribute is a ``bitarray`` view of the packet that is generated
+    on access. Modifications to ``p.bits`` are picked up the next time a packet
+    field is accessed, but a reference to the ``bitarray`` should not be held onto
+    after modifying the packet by other means.
+
     Packet_v2 objects don't enforce any value validation, so set these fields with caution!
 
     In FIFO diagnostics mode, the bits are to be interpreted in a different way.
@@ -61,6 +61,7 @@ class Packet_v2(object):
     downstream_marker_bits = slice(62,63)
     parity_bits = slice(63,64)
     parity_calc_bits = slice(0,63)
+    _parity_calc_mask = (1 << 63) - 1
 
     # only data packets
     channel_id_bits = slice(10,16)
@@ -93,20 +94,23 @@ class Packet_v2(object):
 
     endian = 'little'
 
+    __slots__ = ('_int', '_bits', '_chip_key', '_io_group', '_io_channel',
+        'direction', 'receipt_timestamp', '__dict__')
+
     def __init__(self, bytestream=None):
-        self._int = None
+        self._bits = None
         if bytestream is None:
-            self.bits = bitarray(self.size,endian=self.endian)
-            self.bits.setall(False)
+            self._int = 0
             return
         elif len(bytestream) == self.num_bytes:
-            self.bits = bitarray(endian=self.endian)
-            self.bits.frombytes(bytestream)
+            self._int = int.from_bytes(bytestream, self.endian)
         else:
             raise ValueError('Invalid number of bytes: %s' %
                     len(bytestream))
 
     def __eq__(self, other):
+        if isinstance(other, Packet_v2):
+            return self.as_int() == other.as_int()
         return self.bits == other.bits
 
     def __ne__(self, other):
@@ -175,7 +179,7 @@ class Packet_v2(object):
         Byte 0 is still the first byte to send out and contains bits [0:7]
 
         '''
-        return self.bits.tobytes() #[::-1]
+        return self.as_int().to_bytes(self.num_bytes, self.endian)
 
     def export(self):
         '''
@@ -246,10 +250,40 @@ class Packet_v2(object):
                 setattr(self, key, value)
 
     def as_int(self):
-        if self._int is None:
-            self._int = bah.touint(self.bits, endian=self.endian)
+        if self._bits is not None:
+            # pick up any modifications made to the bits view
+            self._int = self._bits_to_int(self._bits)
+            self._bits = None
         return self._int
 
+    @property
+    def bits(self):
+        if self._bits is None:
+            self._bits = bitarray(endian=self.endian)
+            self._bits.frombytes(self._int.to_bytes(self.num_bytes, self.endian))
+        return self._bits
+
+    @bits.setter
+    @_clears_cached_chip_key
+    def bits(self, value):
+        self._int = self._bits_to_int(value)
+        self._bits = None
+
+    @classmethod
+    def _bits_to_int(cls, bits):
+        return bah.touint(bits, endian=cls.endian)
+
+    def _get_bits(self, bit_slice):
+        value = self._int if self._bits is None else self.as_int()
+        return (value >> bit_slice.start) & ((1 << (bit_slice.stop - bit_slice.start)) - 1)
+
+    def _set_bits(self, bit_slice, value):
+        if isinstance(value, bitarray):
+            value = bah.touint(value, endian=self.endian)
+        mask = (1 << (bit_slice.stop - bit_slice.start)) - 1
+        self._int = (self.as_int() & ~(mask << bit_slice.start)) \
+            | ((int(value) & mask) << bit_slice.start)
+
     @property
     def chip_key(self):
         ''''''
@@ -261,7 +295,6 @@ class Packet_v2(object):
         return self._chip_key
 
     @chip_key.setter
-    @_clears_cached_int
     @_clears_cached_chip_key
     def chip_key(self, value):
         if value is None:
@@ -312,23 +345,21 @@ class Packet_v2(object):
     @property
     def timestamp(self):
         if self.fifo_diagnostics_enabled:
-            return bah.touint(self.bits[self.fifo_diagnostics_timestamp_bits], endian=self.endian)
-        return bah.touint(self.bits[self.timestamp_bits], endian=self.endian)
+            return self._get_bits(self.fifo_diagnostics_timestamp_bits)
+        return self._get_bits(self.timestamp_bits)
 
     @timestamp.setter
-    @_clears_cached_int
     def timestamp(self, value):
         if self.fifo_diagnostics_enabled:
-            self.bits[self.fifo_diagnostics_timestamp_bits] = bah.fromuint(value, self.fifo_diagnostics_timestamp_bits, endian=self.endian)
+            self._set_bits(self.fifo_diagnostics_timestamp_bits, value)
         else:
-            self.bits[self.timestamp_bits] = bah.fromuint(value, self.timestamp_bits, endian=self.endian)
+            self._set_bits(self.timestamp_bits, value)
 
     @property
     def local_fifo_half(self):
         return self.local_fifo%2
 
     @local_fifo_half.setter
-    @_clears_cached_int
     def local_fifo_half(self, value):
         self.local_fifo = self.local_fifo_full*2 + value
 
@@ -337,7 +368,6 @@ class Packet_v2(object):
         return self.local_fifo//2
 
     @local_fifo_full.setter
-    @_clears_cached_int
     def local_fifo_full(self, value):
         self.local_fifo = value*2 + self.local_fifo_half
 
@@ -346,7 +376,6 @@ class Packet_v2(object):
         return self.shared_fifo%2
 
     @shared_fifo_half.setter
-    @_clears_cached_int
     def shared_fifo_half(self, value):
         self.shared_fifo = self.shared_fifo_full*2 + value
 
@@ -355,14 +384,13 @@ class Packet_v2(object):
         return self.shared_fifo//2
 
     @shared_fifo_full.setter
-    @_clears_cached_int
     def shared_fifo_full(self, value):
         self.shared_fifo = value*2 + self.shared_fifo_half
 
     def compute_parity(self):
-        return 1 - (self.bits[self.parity_calc_bits].count(True) % 2)
+        value = self._int if self._bits is None else self.as_int()
+        return 1 - (_popcount(value & self._parity_calc_mask) & 1)
 
-    @_clears_cached_int
     def assign_parity(self):
         self.parity = self.compute_parity()
 
@@ -372,59 +400,49 @@ class Packet_v2(object):
     @property
     def local_fifo_events(self):
         if self.fifo_diagnostics_enabled:
-            bit_slice = self.local_fifo_events_bits
-            return bah.touint(self.bits[bit_slice], endian=self.endian)
+            return self._get_bits(self.local_fifo_events_bits)
         return None
 
     @local_fifo_events.setter
-    @_clears_cached_int
     def local_fifo_events(self, value):
         if self.fifo_diagnostics_enabled:
-            bit_slice = self.local_fifo_events_bits
-            self.bits[bit_slice] = bah.fromuint(value, bit_slice, endian=self.endian)
+            self._set_bits(self.local_fifo_events_bits, value)
 
     @property
     def shared_fifo_events(self):
         if self.fifo_diagnostics_enabled:
-            bit_slice = self.shared_fifo_events_bits
-            return bah.touint(self.bits[bit_slice], endian=self.endian)
+            return self._get_bits(self.shared_fifo_events_bits)
         return None
 
     @shared_fifo_events.setter
-    @_clears_cached_int
     def shared_fifo_events(self, value):
         if self.fifo_diagnostics_enabled:
-            bit_slice = self.shared_fifo_events_bits
-            self.bits[bit_slice] = bah.fromuint(value, bit_slice, endian=self.endian)
-
-    @property
-    def chip_id(self):
-        bit_slice = self.chip_id_bits
-        return bah.touint(self.bits[bit_slice], endian=self.endian)
-
-    @chip_id.setter
-    @_clears_cached_int
-    @_clears_cached_chip_key
-    def chip_id(self, value):
-        bit_slice = self.chip_id_bits
-        self.bits[bit_slice] = bah.fromuint(value, bit_slice, endian=self.endian)
+            self._set_bits(self.shared_fifo_events_bits, value)
 
     @classmethod
     def _basic_getter(cls, name):
         bit_slice = getattr(cls, name + '_bits')
-        mask = (~(((2**cls.size)-1 << (bit_slice.stop-bit_slice.start))) & (2**cls.size)-1)
+        start = bit_slice.start
+        mask = (1 << (bit_slice.stop - bit_slice.start)) - 1
         def basic_getter_func(self):
-            return (self.as_int() >> bit_slice.start) & mask
+            value = self._int if self._bits is None else self.as_int()
+            return (value >> start) & mask
         return basic_getter_func
 
     @classmethod
     def _basic_setter(cls, name):
         bit_slice = getattr(cls, name + '_bits')
-        @_clears_cached_int
+        start = bit_slice.start
+        mask = (1 << (bit_slice.stop - bit_slice.start)) - 1
+        clear_mask = ~(mask << start)
         def basic_setter_func(self, value):
-            self.bits[bit_slice] = bah.fromuint(value, bit_slice, endian=self.endian)
+            if isinstance(value, bitarray):
+                value = bah.touint(value, endian=self.endian)
+            value = (int(value) & mask) << start
+            self._int = ((self._int if self._bits is None else self.as_int()) & clear_mask) | value
         return basic_setter_func
 
+Packet_v2.chip_id = property(Packet_v2._basic_getter('chip_id'),_clears_cached_chip_key(Packet_v2._basic_setter('chip_id')))
 Packet_v2.packet_type = property(Packet_v2._basic_getter('packet_type'),Packet_v2._basic_setter('packet_type'))
 Packet_v2.downstream_marker = property(Packet_v2._basic_getter('downstream_marker'),Packet_v2._basic_setter('downstream_marker'))
 Packet_v2.parity = property(Packet_v2._basic_getter('parity'),Packet_v2._basic_setter('parity'))
@@ -6,7 +6,7 @@ import larpix.format.rawhdf5format
 import larpix.format.pacman_msg_format
 import larpix.format.hdf5format
 from larpix.format.rawhdf5format import from_rawfile, len_rawfile
-from larpix.format.pacman_msg_format import parse
+from larpix.format.pacman_msg_format import parse_to_array
 from larpix.format.hdf5format import to_file
 
 def main(input_filename, output_filename, block_size):
@@ -22,10 +22,7 @@ def main(input_filename, output_filename, block_size):
             print('reading block {} of {}...\r'.format(i_block+1,total_blocks),end='')
             last = time.time()
         rd = from_rawfile(input_filename, start=start, end=end)
-        pkts = list()
-        for i_msg,data in enumerate(zip(rd['msg_headers']['io_groups'], rd['msgs'])):
-            io_group,msg = data
-            pkts.extend(parse(msg, io_group=io_group))
+        pkts = parse_to_array(list(rd['msgs']), io_group=rd['msg_headers']['io_groups'])
         to_file(output_filename, packet_list=pkts)
     print()
 
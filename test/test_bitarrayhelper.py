@@ -0,0 +1,26 @@
+import pytest
+from bitarray import bitarray
+
+from larpix import bitarrayhelper as bah
+
+@pytest.mark.parametrize('nbits', list(range(1, 20)) + [31, 63, 64, 65])
+@pytest.mark.parametrize('endian', ['big', 'little'])
+def test_fromuint_touint(nbits, endian):
+    values = set([0, 1, (1 << nbits) - 1, (1 << nbits) // 3, (1 << nbits) + 3])
+    for val in values:
+        expected = bah._fromuint_reference(val, nbits, endian)
+        bits = bah.fromuint(val, nbits, endian=endian)
+        assert bits == expected
+        assert len(bits) == len(expected)
+        assert bah._bitarray_endian(bits) == bah._bitarray_endian(expected)
+        assert bah.fromuint(val, slice(3, 3+nbits), endian=endian) == expected
+        for bits_endian in ('big', 'little'):
+            bits = bitarray(expected.to01(), endian=bits_endian)
+            assert bah.touint(bits, endian=endian) == bah._touint_reference(bits, endian)
+            assert bah.touint(bits, endian=endian) == val
+
+def test_fromuint_passthrough():
+    bits = bitarray('101')
+    assert bah.fromuint(bits, 3) is bits
+    assert bah.fromuint(None, 3) is None
+    assert bah.fromuint(True, 1) == bitarray('1')
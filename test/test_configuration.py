@@ -1,8 +1,10 @@
-from larpix import Configuration_v2
+from larpix import Configuration_v2, ConfigurationMatrix, Chip
 from bitarray import bitarray
 import larpix.bitarrayhelper as bah
 from larpix import configs
 import json
+import numpy as np
+import pytest
 
 def test_v2_conf_all_registers():
     default_filename = 'chip/default_v2.json'
@@ -229,3 +231,216 @@ def test_get_nondefault_registers():
             'csa_enable': [({'index': 35, 'value': 0}, {'index': 35,
                 'value': 1})],
             }
+
+def test_get_nondefault_registers_cached_default():
+    c = Configuration_v2()
+    default = c._default_configuration()
+    assert default is Configuration_v2._default_configuration()
+    assert Configuration_v2.default_register_image() == Configuration_v2().register_image()
+    c.pixel_trim_dac = [0] * 64
+    c.csa_bypass_enable = 1
+    nondefault = c.get_nondefault_registers()
+    assert nondefault == {
+        'pixel_trim_dac': ([0] * 64, [16] * 64),
+        'csa_bypass_enable': (1, 0),
+        }
+    # the returned values are copies
+    nondefault['pixel_trim_dac'][1][0] = 0
+    assert default.pixel_trim_dac[0] == 16
+    assert default == Configuration_v2()
+
+def test_dirty_registers():
+    c = Configuration_v2()
+    assert c.dirty_registers() == list(range(c.num_registers))
+    c.mark_clean()
+    assert c.dirty_registers() == []
+    c.pixel_trim_dac[10] = 25
+    c.threshold_global = 121
+    c.csa_enable[35] = 0
+    assert c.dirty_registers() == [10, 64, 70]
+    c.mark_clean(64)
+    assert c.dirty_registers() == [10, 70]
+    c.pixel_trim_dac[10] = 16
+    assert c.dirty_registers() == [70]
+    c.mark_dirty([1, 2])
+    assert c.dirty_registers() == [1, 2, 70]
+
+def test_register_image():
+    c = Configuration_v2()
+    image = c.register_image()
+    assert len(image) == c.num_registers
+    assert list(image) == [bah.touint(bits, endian='little') for bits in c.all_data()]
+    c.pixel_trim_dac[10] = 25
+    c.threshold_global = 121
+    c.csa_enable[35] = 0
+    image = c.register_image()
+    assert image[10] == 25
+    assert image[64] == 121
+    assert [bits.to01() for bits in c.all_data()] \
+        == [bah.fromuint(value, 8, endian='little').to01() for value in image]
+
+    c2 = Configuration_v2()
+    c2.from_dict_registers(dict(enumerate(image)))
+    assert c2 == c
+    assert c2.register_image() == image
+
+def test_list_register_arrays():
+    c = Configuration_v2()
+    c.mark_clean()
+    c.pixel_trim_dac[:] = 31
+    c.pixel_trim_dac[np.arange(64) % 4 == 0] = np.arange(16)
+    c.channel_mask = np.arange(64) % 3 == 0
+    assert c.pixel_trim_dac[:6] == [0, 31, 31, 31, 1, 31]
+    assert c.to_dict()['pixel_trim_dac'] == [i//4 if i % 4 == 0 else 31 for i in range(64)]
+    assert type(c.to_dict()['channel_mask']) == list
+    assert json.loads(json.dumps(c.to_dict()))['channel_mask'] == c.channel_mask
+
+    # register data is packed in the same way as each individual value
+    assert [bits.to01() for _, bits in c.pixel_trim_dac_data] \
+        == [bah.fromuint(value, 8, endian='little').to01() for value in c.pixel_trim_dac]
+    channel_mask_bits = bitarray()
+    for value in c.channel_mask:
+        channel_mask_bits += bah.fromuint(value, 1, endian='little')
+    assert [bits.to01() for _, bits in c.channel_mask_data] \
+        == [channel_mask_bits[i:i+8].to01() for i in range(0, 64, 8)]
+    assert list(c.register_image()[131:139]) \
+        == [bah.touint(bits, endian='little') for _, bits in c.channel_mask_data]
+    assert c.dirty_registers() == list(range(64)) + list(range(131,139))
+
+    with pytest.raises(ValueError):
+        c.pixel_trim_dac = np.arange(64)
+        pytest.fail('Should fail: out of bounds')
+    with pytest.raises(TypeError):
+        c.pixel_trim_dac = np.ones(64) * 0.5
+        pytest.fail('Should fail: wrong type')
+    with pytest.raises(ValueError):
+        c.pixel_trim_dac[np.arange(64) > 60] = 32
+        pytest.fail('Should fail: out of bounds')
+
+def test_configuration_matrix(tmpdir):
+    chips = dict([('1-1-{}'.format(chip_id), Chip('1-1-{}'.format(chip_id)))
+        for chip_id in range(11, 15)])
+    for chip in chips.values():
+        chip.config.chip_id = chip.chip_id
+    matrix = ConfigurationMatrix(chips)
+    assert matrix.registers.shape == (4, Configuration_v2.num_registers)
+    assert matrix.compare() == dict([(chip_key, [Configuration_v2.register_map['chip_id'][0]])
+        for chip_key in chips])
+
+    # changes to the chip configurations are included in the matrix
+    chips['1-1-12'].config.pixel_trim_dac[3] = 5
+    chips['1-1-12'].config.csa_gain = 1
+    assert matrix.get('pixel_trim_dac')[:,3].tolist() == [16, 5, 16, 16]
+    assert matrix.get('csa_gain').tolist() == [0, 1, 0, 0]
+    assert matrix.get('chip_id', ['1-1-13']).tolist() == [13]
+    assert bytes(matrix.registers[1]) == chips['1-1-12'].config.register_image()
+
+    # changes to the matrix are applied to the chip configurations
+    matrix.set('threshold_global', 40, ['1-1-12', '1-1-14'])
+    matrix.set('csa_bypass_enable', 1)
+    assert [chip.config.threshold_global for chip in chips.values()] == [255, 40, 255, 40]
+    assert [chip.config.csa_bypass_enable for chip in chips.values()] == [1] * 4
+    assert [chip.config.csa_gain for chip in chips.values()] == [0, 1, 0, 0]
+    with pytest.raises(ValueError):
+        matrix.set('threshold_global', 256)
+    assert matrix.diff(chips['1-1-12'].config).sum(axis=1).tolist() == [4, 0, 4, 3]
+
+    # replaced configurations are attached to the matrix
+    chips['1-1-11'].config = Configuration_v2()
+    assert matrix.get('chip_id').tolist() == [1, 12, 13, 14]
+
+    filename = str(tmpdir.join('matrix.json'))
+    matrix.write(filename)
+    chips_copy = dict([(chip_key, Chip(chip_key)) for chip_key in chips])
+    matrix_copy = ConfigurationMatrix(chips_copy)
+    matrix_copy.load(filename)
+    assert matrix_copy.to_dict() == matrix.to_dict()
+    assert [chip.config for chip in chips_copy.values()] == [chip.config for chip in chips.values()]
+    assert matrix.compare(matrix_copy) == {}
+
+def test_configuration_copied_from_default():
+    c = Configuration_v2()
+    other = Configuration_v2()
+    default = Configuration_v2._default_configuration()
+    assert c == other == default
+    assert c.register_image() == default.register_image()
+    assert c.dirty_registers() == list(range(c.num_registers))
+
+    # configurations do not share values
+    c.pixel_trim_dac[0] = 0
+    c.threshold_global = 0
+    assert other.pixel_trim_dac[0] == 16
+    assert default.pixel_trim_dac[0] == 16
+    assert other.threshold_global == 255
+    assert c.register_image()[0] == 0
+    assert other.register_image()[0] == 16
+
+    # in-place changes are tracked by the new configuration
+    assert c.pixel_trim_dac.owner is c
+    c.mark_clean()
+    c.csa_enable[3] = 0
+    assert c.dirty_registers() == [66]
+
+    with pytest.raises(AttributeError):
+        c.not_a_register = 1
+
+def test_default_configuration_reloaded(tmpdir, monkeypatch):
+    import os
+    import time
+    filename = str(tmpdir.join('default.json'))
+    def write_default(threshold_global, age):
+        with open(filename, 'w') as f:
+            json.dump({
+                '_config_type': 'chip',
+                '_include': [configs._find('chip/default_v2.json')],
+                'class': 'Configuration_v2',
+                'register_values': {'threshold_global': threshold_global}
+                }, f)
+        os.utime(filename, (time.time() - age,) * 2)
+    write_default(100, 10)
+    monkeypatch.setattr(Configuration_v2, 'default_configuration_file', filename)
+    assert Configuration_v2().threshold_global == 100
+    default = Configuration_v2._default_configuration()
+    assert Configuration_v2._default_configuration() is default
+    assert Configuration_v2().pixel_trim_dac == [16] * 64
+
+    # the default configuration is reloaded when the file is modified
+    write_default(50, 5)
+    assert Configuration_v2().threshold_global == 50
+    assert Configuration_v2._default_configuration() is not default
+    assert Configuration_v2._default_configuration().threshold_global == 50
+    c = Configuration_v2()
+    c.threshold_global = 100
+    assert c.get_nondefault_registers() == {'threshold_global': (100, 50)}
+
+def test_from_dict_registers_error():
+    c = Configuration_v2()
+    image = c.register_image()
+    with pytest.raises(ValueError):
+        c.from_dict_registers({0: 255})
+    assert c.pixel_trim_dac[0] == 16
+    assert c.register_image() == image
+    assert c.all_data()[0] == bah.fromuint(16, 8, endian='little')
+    # registers decoded before the error keep their new values
+    threshold_global = c.register_map['threshold_global'][0]
+    with pytest.raises(ValueError):
+        c.from_dict_registers({threshold_global: 3, 0: 255})
+    assert c.threshold_global == 3
+    assert c.pixel_trim_dac[0] == 16
+    assert c.register_image()[threshold_global] == 3
+    assert c.register_image()[0] == 16
+
+def test_shallow_copy():
+    import copy
+    c = Configuration_v2()
+    c.mark_clean([0])
+    d = copy.copy(c)
+    d.threshold_global = 7
+    d.pixel_trim_dac[0] = 0
+    assert c.threshold_global == 255
+    assert c.pixel_trim_dac[0] == 16
+    assert c.register_image() == Configuration_v2().register_image()
+    assert d.register_image()[0] == 0
+    assert d.register_image()[c.register_map['threshold_global'][0]] == 7
+    assert 0 not in c.dirty_registers()
+    assert 0 in d.dirty_registers()
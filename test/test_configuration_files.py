@@ -1,5 +1,7 @@
 import pytest
 import json
+import os
+import time
 from larpix import configs
 
 @pytest.fixture
@@ -113,3 +115,71 @@ def test_config_inheritance_error(tmpfile, other_tmpfile):
 
     with pytest.raises(AssertionError):
         config = configs.load(tmpfile)
+
+def test_config_cache(tmpfile, other_tmpfile):
+    write_json(tmpfile,
+        _config_type='test',
+        _include=[other_tmpfile],
+        test=[1, 2]
+        )
+    write_json(other_tmpfile,
+        _config_type='test',
+        inherited={'values': [3, 4]}
+        )
+    # files modified recently are not cached
+    for filename in (tmpfile, other_tmpfile):
+        os.utime(filename, (time.time() - 10,) * 2)
+
+    configs.clear_cache()
+    config = configs.load(tmpfile, 'test')
+    assert config == {'_config_type': 'test', '_include': [other_tmpfile],
+        'test': [1, 2], 'inherited': {'values': [3, 4]}}
+    assert os.path.abspath(tmpfile) in configs._cache
+
+    # returns copies
+    config['test'].append(3)
+    config['inherited']['values'][0] = 5
+    assert configs.load(tmpfile, 'test') == {'_config_type': 'test',
+        '_include': [other_tmpfile], 'test': [1, 2], 'inherited': {'values': [3, 4]}}
+    with pytest.raises(AssertionError):
+        configs.load(tmpfile, 'not_test')
+
+    # reloads modified inherited files
+    write_json(other_tmpfile,
+        _config_type='test',
+        inherited={'values': [5, 6]}
+        )
+    os.utime(other_tmpfile, (time.time() - 5,) * 2)
+    assert configs.load(tmpfile)['inherited'] == {'values': [5, 6]}
+
+def test_config_cache_threads(tmpfile, other_tmpfile):
+    import threading
+    write_json(tmpfile,
+        _config_type='test',
+        _include=[other_tmpfile],
+        test=[1, 2]
+        )
+    write_json(other_tmpfile,
+        _config_type='test',
+        inherited={'values': [3, 4]}
+        )
+    for filename in (tmpfile, other_tmpfile):
+        os.utime(filename, (time.time() - 10,) * 2)
+    expected = {'_config_type': 'test', '_include': [other_tmpfile],
+        'test': [1, 2], 'inherited': {'values': [3, 4]}}
+
+    errors = []
+    def load():
+        try:
+            for i in range(200):
+                assert configs.load(tmpfile, 'test') == expected
+                if i % 20 == 0:
+                    configs.clear_cache()
+        except Exception as err:
+            errors.append(err)
+    threads = [threading.Thread(target=load) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert errors == []
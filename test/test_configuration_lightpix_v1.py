@@ -98,3 +98,11 @@ def test_get_nondefault_registers():
             'hit_threshold': (8,16),
             'timeout': (34, 30)
             }
+
+def test_lightpix_v1_all_data():
+    c = Configuration_Lightpix_v1()
+    data = c.all_data()
+    assert len(data) == c.num_registers
+    c.timeout = 10
+    assert data[238] != c.all_data()[238]
+    assert c.dirty_registers() == list(range(c.num_registers))
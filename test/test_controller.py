@@ -273,3 +273,124 @@ def test_controller_network_traversal(network_controller_old, network_controller
         assert set(keys[1:3]) == set(['1-1-3','1-1-12'])
         assert keys[3] == '1-1-2'
 
+
+class ReplyIO(FakeIO):
+    '''
+    Replies to config read packets with the controller configuration, the
+    first read of each ``(chip_key, register)`` in ``bad`` is corrupted
+
+    '''
+    def __init__(self, controller, bad=tuple()):
+        super(ReplyIO, self).__init__()
+        self.controller = controller
+        self.bad = set(bad)
+
+    def send(self, packets):
+        self.sent.append(packets)
+        replies = []
+        for packet in packets:
+            if packet.packet_type != packet.CONFIG_READ_PACKET:
+                continue
+            reply = self.controller[packet.chip_key].get_configuration_read_packets(
+                [packet.register_address])[0]
+            reply.register_data = self.controller[packet.chip_key].get_configuration_write_packets(
+                [packet.register_address])[0].register_data
+            if (packet.chip_key, packet.register_address) in self.bad:
+                self.bad.remove((packet.chip_key, packet.register_address))
+                reply.register_data = (reply.register_data + 1) % 256
+            replies.append(reply)
+        self.queue.append((replies, b''))
+
+def test_controller_init_networks_and_verify(inheriting_network_config):
+    c = Controller()
+    c.load(inheriting_network_config)
+    enable_mosi = Configuration_v2.register_map['enable_mosi'][0]
+    c.io = ReplyIO(c, bad=[('1-2-123', enable_mosi)])
+    ok, diff = c.init_networks_and_verify(timeout=1, early_return=True)
+    assert ok
+    assert diff == dict()
+    for chip_key in c.chips:
+        assert c[chip_key].config.chip_id == chip_key.chip_id
+
+    # first level initializes the root chip of both networks with one send
+    writes, reads = c.io.sent[0], c.io.sent[1]
+    assert set([p.io_channel for p in writes]) == set([1, 2])
+    assert all([p.packet_type == p.CONFIG_WRITE_PACKET for p in writes])
+    assert set([p.chip_key for p in reads]) == set(['1-1-2', '1-2-123'])
+    # only the mismatched register is rewritten and re-verified
+    assert [(p.chip_key, p.register_address) for p in c.io.sent[2]] == [('1-2-123', enable_mosi)]
+    assert [(p.chip_key, p.register_address) for p in c.io.sent[3]] == [('1-2-123', enable_mosi)]
+    # then the remaining chips of the larger network, one send per level
+    assert len(c.io.sent) == 4 + 2 * 2
+    assert set([p.io_channel for sent in c.io.sent[4:] for p in sent]) == set([1])
+    assert set([p.chip_key for p in c.io.sent[4] if p.packet_type == p.CONFIG_WRITE_PACKET]) \
+        >= set(['1-1-3', '1-1-12'])
+
+def test_controller_init_network_and_verify_timeout(inheriting_network_config):
+    c = Controller()
+    c.load(inheriting_network_config)
+    c.io = FakeIO()
+    timeouts = []
+    def record_timeout(chip_key_register_pairs, timeout=1, **kwargs):
+        timeouts.append(timeout)
+        return True, dict()
+    c.verify_registers = record_timeout
+    ok, diff = c.init_network_and_verify(1, 1)
+    assert ok
+    # 1 s verification window by default
+    assert timeouts and all([timeout == 1 for timeout in timeouts])
+    del timeouts[:]
+    ok, diff = c.init_network_and_verify(1, 1, timeout=0.5)
+    assert timeouts and all([timeout == 0.5 for timeout in timeouts])
+    del timeouts[:]
+    ok, diff = c.init_networks_and_verify()
+    assert timeouts and all([timeout == 1 for timeout in timeouts])
+
+def test_controller_init_networks(inheriting_network_config):
+    c = Controller()
+    c.load(inheriting_network_config)
+    c.io = FakeIO()
+    c_seq = Controller()
+    c_seq.load(inheriting_network_config)
+    c_seq.io = FakeIO()
+
+    ok, diff = c.init_networks()
+    assert ok
+    c_seq.init_network(1, 1)
+    c_seq.init_network(1, 2)
+    for chip_key in c.chips:
+        assert c[chip_key].config == c_seq[chip_key].config
+    # one send per network depth, in the same order within each io channel
+    assert len(c.io.sent) == 3
+    assert set([p.io_channel for p in c.io.sent[0]]) == set([1, 2])
+    for io_channel in (1, 2):
+        assert [p for sent in c.io.sent for p in sent if p.io_channel == io_channel] \
+            == [p for sent in c_seq.io.sent for p in sent if p.io_channel == io_channel]
+
+    c = Controller()
+    c.load(inheriting_network_config)
+    c.io = ReplyIO(c)
+    ok, diff = c.init_networks(verify=True, early_return=True)
+    assert ok
+    assert len([sent for sent in c.io.sent
+        if sent[0].packet_type == sent[0].CONFIG_READ_PACKET]) == 3
+
+def test_controller_build_config_matrix():
+    c = Controller()
+    for chip_id in range(11, 21):
+        c.add_chip('1-1-{}'.format(chip_id))
+    matrix = c.build_config_matrix()
+    assert c.config_matrix is matrix
+    assert matrix.chip_keys == list(c.chips.keys())
+    matrix.set('threshold_global', 40)
+    assert all([chip.config.threshold_global == 40 for chip in c.chips.values()])
+    c['1-1-12'].config.threshold_global = 50
+    assert matrix.get('threshold_global', ['1-1-12']).tolist() == [50]
+
+    matrix = c.build_config_matrix(['1-1-12', '1-1-11'])
+    assert matrix.chip_keys == [Key('1-1-12'), Key('1-1-11')]
+    assert matrix.get('threshold_global').tolist() == [50, 40]
+
+    c.add_chip('1-1-21', version=1)
+    with pytest.raises(ValueError):
+        c.build_config_matrix()
@@ -45,3 +45,87 @@ def test_packets():
     
     assert packets == new_packets[1:]
     assert isinstance(new_packets[0], TimestampPacket)
+
+def test_parse_to_array():
+    import numpy as np
+    from larpix.format.hdf5format import _encode_packet
+
+    packets = []
+    for i in range(100):
+        packets.append(Packet_v2())
+        packets[-1].io_channel = i % 4 + 1
+        packets[-1].packet_type = i % 4
+        packets[-1].chip_id = i
+        packets[-1].channel_id = i % 64
+        packets[-1].timestamp = i * 1000
+        packets[-1].dataword = 255 - i
+        packets[-1].first_packet = i % 2
+        packets[-1].downstream_marker = i % 3 == 0
+        packets[-1].receipt_timestamp = 2**32 - 1 - i
+        if i % 5:
+            packets[-1].assign_parity()
+    packets.append(SyncPacket(timestamp=123456, sync_type=b'H', clk_source=1))
+    packets.append(TriggerPacket(timestamp=123456, trigger_type=b'\x01'))
+    msgs = [
+        format(packets[:50], msg_type='DATA'),
+        format(packets[50:], msg_type='DATA'),
+        format(packets[:10], msg_type='REQ'),
+        format_msg('REP', [('PONG',)])
+        ]
+    io_groups = [1, 2, 3, 4]
+
+    arr = parse_to_array(msgs, io_group=io_groups)
+    expected_packets = []
+    for msg, io_group in zip(msgs, io_groups):
+        expected_packets += parse(msg, io_group=io_group)
+    for packet in expected_packets:
+        if isinstance(packet, Packet_v2) and isinstance(packet.receipt_timestamp, bytes):
+            packet.receipt_timestamp = 0 # TX words have no receipt timestamp
+    expected = np.array([_encode_packet(packet, '2.4', 'packets') for packet in expected_packets],
+        dtype=packet_array_dtype)
+
+    assert arr.dtype == packet_array_dtype
+    assert len(arr) == len(expected)
+    for field in packet_array_dtype.names:
+        assert np.all(arr[field] == expected[field])
+
+    assert np.all(parse_to_array(msgs[0], io_group=1) == arr[:51])
+    assert len(parse_to_array([])) == 0
+
+def test_parse_to_batch():
+    import numpy as np
+
+    packets = []
+    for i in range(100):
+        packets.append(Packet_v2())
+        packets[-1].io_channel = i % 4 + 1
+        packets[-1].chip_id = i
+        packets[-1].channel_id = i % 64
+        packets[-1].timestamp = i * 1000
+        packets[-1].receipt_timestamp = 2**32 - 1 - i
+        packets[-1].assign_parity()
+    packets.insert(50, SyncPacket(timestamp=123456, sync_type=b'H', clk_source=1))
+    packets.append(TriggerPacket(timestamp=123456, trigger_type=b'\x01'))
+    msgs = [
+        format(packets[:50], msg_type='DATA'),
+        format(packets[50:], msg_type='DATA'),
+        format(packets[:10], msg_type='REQ'),
+        format_msg('REP', [('PONG',)])
+        ]
+    io_groups = [1, 2, 3, 4]
+
+    batch = parse_to_batch(msgs, io_group=io_groups)
+    expected = []
+    for msg, io_group in zip(msgs, io_groups):
+        expected += [packet for packet in parse(msg, io_group=io_group)
+            if isinstance(packet, Packet_v2)]
+    assert len(batch) == len(expected) == 110
+    assert batch == expected
+    assert np.all(batch.io_group == [packet.io_group for packet in expected])
+    assert np.all(batch.io_channel == [packet.io_channel for packet in expected])
+    assert np.all(batch.receipt_timestamp[:100]
+        == [packet.receipt_timestamp for packet in expected[:100]])
+    assert np.all(batch.receipt_timestamp[100:] == 0) # TX words have no receipt timestamp
+
+    assert parse_to_batch(msgs[0], io_group=1) == batch[:50]
+    assert len(parse_to_batch([])) == 0
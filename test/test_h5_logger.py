@@ -46,6 +46,206 @@ def test_record(tmpdir):
     logger.record([TimestampPacket(timestamp=123)])
     assert len(logger._buffer['packets']) == 2
 
+def test_preallocate(tmpdir):
+    import h5py
+    logger = HDF5Logger(directory=str(tmpdir), buffer_length=5, enabled=True,
+            chunk_size=8, compression='lzf', preallocate=True)
+    for _ in range(3):
+        logger.record([Packet_v2()]*6)
+    logger.flush()
+    with h5py.File(logger.filename, 'r') as f:
+        assert f['packets'].compression == 'lzf'
+        assert f['packets'].shape[0] > 18
+        assert f['packets'].attrs['n_rows'] == 18
+    logger.disable()
+    with h5py.File(logger.filename, 'r') as f:
+        assert f['packets'].shape[0] == 18
+
+def test_keep_open(tmpdir):
+    import h5py
+    from larpix.format.hdf5format import from_file
+    logger = HDF5Logger(directory=str(tmpdir), buffer_length=5,
+            keep_open=True)
+    logger.enable()
+    datafile = logger.datafile
+    assert datafile is not None
+    for _ in range(3):
+        logger.record([Packet_v2()]*6)
+    logger.record_configs([Chip('1-1-2', version=2)])
+    assert logger.datafile is datafile
+    logger.disable()
+    assert logger.datafile is None
+    assert not datafile
+    with h5py.File(logger.filename, 'r') as f:
+        assert f['packets'].shape[0] == 18
+        assert len(f['configs']) == 1
+    assert len(from_file(logger.filename)['packets']) == 18
+
+    logger.enable()
+    logger.record([Packet_v2()]*2)
+    logger.disable()
+    assert len(from_file(logger.filename)['packets']) == 20
+
+def test_swmr(tmpdir):
+    import h5py
+    logger = HDF5Logger(directory=str(tmpdir), buffer_length=5,
+            swmr=True)
+    logger.enable()
+    assert logger.keep_open
+    logger.record([Packet_v2()]*6)
+    logger.flush()
+    with h5py.File(logger.filename, 'r', libver='latest', swmr=True) as f:
+        packets = f['packets']
+        assert packets.attrs['n_rows'] == 6
+        logger.record([Packet_v2()]*6)
+        logger.flush()
+        packets.refresh()
+        assert packets.shape[0] >= 12
+    logger.disable()
+    with h5py.File(logger.filename, 'r') as f:
+        assert f['packets'].shape[0] == 12
+
+@pytest.fixture
+def blocked_writer(monkeypatch):
+    import threading
+    import larpix.logger.h5_logger
+    release = threading.Event()
+    def blocked_to_file(*args, **kwargs):
+        release.wait()
+        return to_file(*args, **kwargs)
+    to_file = larpix.logger.h5_logger.to_file
+    monkeypatch.setattr(larpix.logger.h5_logger, 'to_file', blocked_to_file)
+    yield release
+    release.set()
+
+def test_overflow_drop(tmpdir, blocked_writer):
+    from larpix.format.hdf5format import from_file
+    logger = HDF5Logger(directory=str(tmpdir), buffer_length=5, enabled=True,
+            max_pending=10, overflow='drop')
+    logger.record([Packet_v2()]*6)
+    assert logger.packets_pending == 6
+    assert logger.bytes_pending == 6 * logger._row_nbytes
+    logger.record([Packet_v2()]*6)
+    assert logger.dropped_packets == 6
+    assert logger.packets_pending == 6
+    assert logger.queue_depth <= 1
+    blocked_writer.set()
+    logger.disable()
+    assert logger.packets_pending == 0
+    assert logger.write_latency is not None
+    assert len(from_file(logger.filename)['packets']) == 6
+
+def test_overflow_spill(tmpdir, blocked_writer):
+    from larpix.format.hdf5format import from_file
+    logger = HDF5Logger(directory=str(tmpdir), buffer_length=5, enabled=True,
+            max_pending=10, overflow='spill')
+    for chip_id in range(4):
+        packet = Packet_v2()
+        packet.chip_id = chip_id
+        logger.record([packet]*6)
+    assert logger.packets_pending == 6
+    assert logger.spilled_packets == 18
+    assert os.path.exists(logger.spill_filename)
+    blocked_writer.set()
+    logger.disable()
+    assert not os.path.exists(logger.spill_filename)
+    packets = from_file(logger.filename)['packets']
+    assert [packet.chip_id for packet in packets] == [0]*6 + [1]*6 + [2]*6 + [3]*6
+
+def test_overflow_block(tmpdir, blocked_writer):
+    import threading
+    from larpix.format.hdf5format import from_file
+    logger = HDF5Logger(directory=str(tmpdir), buffer_length=5, enabled=True,
+            max_pending=10, overflow='block')
+    logger.record([Packet_v2()]*6)
+    producer = threading.Thread(target=logger.record, args=([Packet_v2()]*6,))
+    producer.start()
+    producer.join(timeout=0.2)
+    assert producer.is_alive()
+    blocked_writer.set()
+    producer.join(timeout=5)
+    assert not producer.is_alive()
+    logger.disable()
+    assert len(from_file(logger.filename)['packets']) == 12
+    with pytest.raises(ValueError):
+        HDF5Logger(directory=str(tmpdir), overflow='unknown')
+
+def test_process_writer(tmpdir):
+    import h5py
+    from larpix.larpix import PacketBatch, SyncPacket
+    batch = PacketBatch(np.arange(1000, dtype='u8') << np.uint64(10),
+        io_group=1, io_channel=np.arange(1000) % 32,
+        receipt_timestamp=np.arange(1000))
+    fifo_batch = batch[:100]
+    fifo_batch.fifo_diagnostics_enabled = True
+    packet = Packet_v2()
+    packet.chip_id = 12
+    data = [
+        [batch],
+        [packet, TimestampPacket(timestamp=123), PacketBatch(batch.words[:10])],
+        [SyncPacket(timestamp=456, sync_type=b'S'), fifo_batch, packet],
+        ]
+    filenames = []
+    for writer in ('thread', 'process'):
+        logger = HDF5Logger(directory=str(tmpdir), filename=writer + '.h5',
+                buffer_length=100, writer=writer, ring_size=256, preallocate=True)
+        logger.enable()
+        for records in data:
+            logger.record(records, direction=HDF5Logger.READ)
+        logger.record_configs([Chip('1-1-2', version=2)])
+        logger.record([batch[:50]])
+        logger.disable()
+        filenames.append(logger.filename)
+    with h5py.File(filenames[0], 'r') as f_thread, h5py.File(filenames[1], 'r') as f_process:
+        for dset in ('packets', 'messages'):
+            assert f_thread[dset].shape == f_process[dset].shape
+            assert np.all(f_thread[dset][:] == f_process[dset][:])
+        assert len(f_process['packets']) == 1000 + 13 + 100 + 1 + 50
+        assert np.all(f_thread['configs']['registers'] == f_process['configs']['registers'])
+    with pytest.raises(ValueError):
+        HDF5Logger(directory=str(tmpdir), writer='unknown')
+
+def test_process_writer_packets(tmpdir):
+    import h5py
+    from larpix.larpix import TimestampPacket
+    packets = []
+    for i in range(500):
+        packet = Packet_v2()
+        packet.chip_id = i % 256
+        packet.timestamp = i
+        packet.io_group = 1
+        packet.io_channel = i % 32
+        packet.receipt_timestamp = 2*i
+        if i % 7 == 0:
+            packet.fifo_diagnostics_enabled = True
+        packets.append(packet)
+    packets.insert(250, TimestampPacket(timestamp=123))
+    filenames = []
+    for writer in ('thread', 'process'):
+        logger = HDF5Logger(directory=str(tmpdir), filename=writer + '.h5',
+                buffer_length=100, writer=writer, ring_size=64)
+        logger.enable()
+        sent = []
+        if writer == 'process':
+            process_queue = logger._process_queue
+            class RecordingQueue(object):
+                def put(self, msg):
+                    sent.append(msg)
+                    process_queue.put(msg)
+            logger._process_queue = RecordingQueue()
+        logger.record(packets, direction=HDF5Logger.READ)
+        logger.flush()
+        logger.disable()
+        filenames.append(logger.filename)
+    objects = [obj for msg in sent if msg[0] == 'objects' for obj in msg[1]]
+    assert [type(obj) for obj in objects] == [TimestampPacket]
+    assert sum([msg[1] for msg in sent if msg[0] == 'ring']) == 500
+    with h5py.File(filenames[0], 'r') as f_thread, h5py.File(filenames[1], 'r') as f_process:
+        for dset in ('packets', 'messages'):
+            assert f_thread[dset].shape == f_process[dset].shape
+            assert np.all(f_thread[dset][:] == f_process[dset][:])
+        assert len(f_process['packets']) == 501
+
 @pytest.mark.filterwarnings("ignore:no IO object")
 def test_controller_write_capture(tmpdir, chip):
     controller = Controller()
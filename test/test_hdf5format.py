@@ -5,7 +5,7 @@ import h5py
 import copy
 
 from larpix.larpix import (Packet_v1, Packet_v2, PacketCollection, TimestampPacket,
-                           MessagePacket, Key, SyncPacket, TriggerPacket, Chip)
+                           MessagePacket, Key, SyncPacket, TriggerPacket, Chip, ConfigurationMatrix)
 from larpix.format.hdf5format import (to_file, from_file,
         dtype_property_index_lookup)
 
@@ -434,6 +434,108 @@ def test_from_file_v2_3_many_packets(tmpfile, data_packet_v2,
     assert new_packets[4] == sync_packet
     assert new_packets[5] == trigger_packet
 
+def test_to_file_v2_4_columnar(tmpfile, data_packet_v2, config_read_packet_v2,
+                               fifo_diagnostics_packet_v2, timestamp_packet,
+                               message_packet, sync_packet, trigger_packet):
+    import numpy as np
+    from larpix.larpix import PacketBatch
+    from larpix.format.hdf5format import (_encode_packet, dtypes,
+        _format_packets_packet_batch_v2_3)
+    fifo_diagnostics_packet_v2.fifo_diagnostics_enabled = True
+    no_metadata_packet = Packet_v2(data_packet_v2.bytes())
+    packets = [data_packet_v2, config_read_packet_v2, timestamp_packet,
+               message_packet, fifo_diagnostics_packet_v2, sync_packet,
+               trigger_packet, no_metadata_packet, Packet_v1()]
+    to_file(tmpfile, packets, version='2.4')
+    expected = np.array([_encode_packet(packet, '2.4', 'packets') for packet in packets[:-1]],
+        dtype=dtypes['2.4']['packets'])
+    with h5py.File(tmpfile, 'r') as f:
+        assert len(f['packets']) == len(expected)
+        assert np.all(f['packets'][:] == expected)
+        assert len(f['messages']) == 1
+
+    words = np.array([packet.as_int() for packet in packets if isinstance(packet, Packet_v2)], dtype='u8')
+    to_file(tmpfile, words)
+    with h5py.File(tmpfile, 'r') as f:
+        assert np.all(f['packets'][-len(words):] == _format_packets_packet_batch_v2_3(
+            PacketBatch(words), version='2.4'))
+        assert np.all(f['packets'][-len(words):]['chip_id'] == [packet.chip_id for packet in
+            packets if isinstance(packet, Packet_v2)])
+
+    to_file(tmpfile, expected)
+    with h5py.File(tmpfile, 'r') as f:
+        assert np.all(f['packets'][-len(expected):] == expected)
+    with pytest.raises(ValueError):
+        to_file(tmpfile, expected[['chip_id', 'packet_type']])
+
+def test_from_file_v2_4_array(tmpfile, data_packet_v2, config_read_packet_v2,
+                              timestamp_packet, message_packet, sync_packet,
+                              trigger_packet):
+    import numpy as np
+    from larpix.format.hdf5format import iter_file, from_array
+    packets = [data_packet_v2, config_read_packet_v2, timestamp_packet,
+               message_packet, sync_packet, trigger_packet] * 10
+    to_file(tmpfile, packets)
+    with h5py.File(tmpfile, 'r') as f:
+        expected = f['packets'][:]
+
+    arr = from_file(tmpfile, as_array=True)['packets']
+    assert np.all(arr == expected)
+    assert from_array(arr, message_array=h5py.File(tmpfile, 'r')['messages'][:]) == packets
+    assert from_file(tmpfile, chunk_size=7)['packets'] == packets
+    assert from_file(tmpfile, start=5, end=-5, chunk_size=4)['packets'] == packets[5:-5]
+
+    arr = from_file(tmpfile, as_array=True, chunk_size=4, packet_type=[0, 3])['packets']
+    assert np.all(arr == expected[np.isin(expected['packet_type'], [0, 3])])
+    arr = from_file(tmpfile, as_array=True, start=3, end=20, chunk_size=4, packet_type=0)['packets']
+    assert np.all(arr == expected[3:20][expected[3:20]['packet_type'] == 0])
+    assert from_file(tmpfile, packet_type=5)['packets'] == [message_packet] * 10
+    assert from_file(tmpfile, io_group=1, chip_id=123, packet_type=0)['packets'] == [data_packet_v2] * 10
+    assert len(from_file(tmpfile, as_array=True, io_group=100)['packets']) == 0
+    with pytest.raises(ValueError):
+        from_file(tmpfile, not_a_field=1)
+
+    chunks = list(iter_file(tmpfile, chunk_size=6, packet_type=0))
+    assert len(chunks) == 10
+    assert np.all(np.concatenate(chunks) == expected[expected['packet_type'] == 0])
+    chunks = list(iter_file(tmpfile, chunk_size=12, as_array=False))
+    assert len(chunks) == 5
+    assert sum(chunks, []) == packets
+
+def test_to_file_v2_4_layout(tmpfile, data_packet_v2, timestamp_packet):
+    import numpy as np
+    from larpix.format.hdf5format import iter_file
+    packets = [data_packet_v2, timestamp_packet] * 10
+    to_file(tmpfile, packets, chunk_size=16, compression='gzip',
+        compression_opts=4, shuffle=True, preallocate=True)
+    with h5py.File(tmpfile, 'r') as f:
+        assert f['packets'].chunks == (16,)
+        assert f['packets'].compression == 'gzip'
+        assert f['packets'].shuffle
+        assert f['packets'].shape[0] >= 20
+        assert f['packets'].attrs['n_rows'] == 20
+        assert f['_header'].attrs['chunk_size'] == 16
+        assert f['_header'].attrs['compression'] == 'gzip'
+        assert f['_header'].attrs['compression_opts'] == '4'
+        assert f['_header'].attrs['shuffle']
+
+    to_file(tmpfile, packets, chunk_size=4, compression='lzf', preallocate=True)
+    with h5py.File(tmpfile, 'r') as f:
+        # layout is fixed when the dataset is created
+        assert f['packets'].chunks == (16,)
+        assert f['packets'].shape[0] == 2 * 20
+        assert f['packets'].attrs['n_rows'] == 40
+        assert f['_header'].attrs['compression'] == 'gzip'
+    assert from_file(tmpfile)['packets'] == packets * 2
+    assert len(from_file(tmpfile, as_array=True)['packets']) == 40
+    assert sum([len(chunk) for chunk in iter_file(tmpfile, chunk_size=7)]) == 40
+
+    to_file(tmpfile)
+    with h5py.File(tmpfile, 'r') as f:
+        assert f['packets'].shape[0] == 40
+        assert f['packets'].attrs['n_rows'] == 40
+    assert from_file(tmpfile)['packets'] == packets * 2
+
 def test_to_file_v2_4_chips(tmpfile, chip):
     chips = [copy.deepcopy(chip) for i in range(10)]
     for i,chip in enumerate(chips):
@@ -451,6 +553,25 @@ def test_to_file_v2_4_chips(tmpfile, chip):
     assert len(new_chips) == 3
     assert new_chips[0].chip_key == chips[1].chip_key
 
+def test_to_file_v2_4_config_matrix(tmpfile, chip):
+    chips = [copy.deepcopy(chip) for i in range(10)]
+    for i,chip in enumerate(chips):
+        chip.chip_id = i
+    matrix = ConfigurationMatrix(dict([(chip.chip_key, chip) for chip in chips]))
+    matrix.set('threshold_global', 40)
+    chips[0].config.pixel_trim_dac[12] = 0
+    to_file(tmpfile, chip_list=matrix, version='2.4')
+    new_chips = from_file(tmpfile, load_configs=True)['configs']
+    assert [chip.chip_key for chip in chips] == [chip.chip_key for chip in new_chips]
+    assert [chip.config for chip in chips] == [chip.config for chip in new_chips]
+    assert new_chips[0].config.pixel_trim_dac[12] == 0
+    assert new_chips[1].config.threshold_global == 40
+
+    rows = from_file(tmpfile, load_configs=True, as_array=True)['configs']
+    chips[1].config.threshold_global = 1
+    matrix.from_array(rows)
+    assert chips[1].config.threshold_global == 40
+
 def test_from_file_incompatible(tmpfile):
     to_file(tmpfile, [], version='0.0')
     with pytest.raises(RuntimeError):
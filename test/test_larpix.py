@@ -5,13 +5,14 @@ Use the pytest framework to write tests for the larpix module.
 from __future__ import print_function
 import pytest
 from larpix import (Chip, Packet_v1, Packet_v2, Packet, Key, Configuration, Configuration_v1, Controller,
-        PacketCollection, _Smart_List, TimestampPacket, MessagePacket)
+        PacketCollection, _Smart_List, _Smart_Array, TimestampPacket, MessagePacket)
 from larpix.io import FakeIO
 #from bitstring import BitArray
 from bitarray import bitarray
 import larpix.bitarrayhelper as bah
 import json
 import os
+import time
 
 @pytest.fixture
 def timestamp_packet():
@@ -47,6 +48,29 @@ def test_chip_get_configuration_packets(chip):
     assert packet.register_address == 40
     assert packet.register_data == 16
 
+def test_chip_get_configuration_packets_registers(chip):
+    chip.config.threshold_global = 100
+    packets = chip.get_configuration_write_packets([64, 3, 3, 1000])
+    assert [packet.register_address for packet in packets] == [3, 64]
+    assert [packet.register_data for packet in packets] == [16, 100]
+    assert all([packet.has_valid_parity() for packet in packets])
+    assert all([packet.chip_key == chip.chip_key for packet in packets])
+    packets = chip.get_configuration_read_packets(range(10))
+    assert [packet.register_data for packet in packets] == [0] * 10
+
+def test_chip_get_configuration_batch(chip):
+    chip.config.pixel_trim_dac[7] = 3
+    for packet_type in (Packet.CONFIG_WRITE_PACKET, Packet.CONFIG_READ_PACKET):
+        batch = chip.get_configuration_batch(packet_type)
+        assert len(batch) == chip.config.num_registers
+        assert batch == chip.get_configuration_packets(packet_type)
+        assert all(batch.has_valid_parity())
+        assert all(batch.io_channel == chip.io_channel)
+        batch = chip.get_configuration_batch(packet_type, [7, 64])
+        assert batch == chip.get_configuration_packets(packet_type, [7, 64])
+    with pytest.raises(ValueError):
+        chip.get_configuration_batch(Packet.DATA_PACKET)
+
 def test_chip_sync_configuration(chip):
     packet_type = Packet.CONFIG_READ_PACKET
     packets = chip.get_configuration_read_packets()
@@ -1695,6 +1719,57 @@ def test_controller_multi_write_configuration_specify_registers(capfd, chip):
     assert result == expected
 
 
+def test_controller_write_configuration_only_dirty(capfd, chip):
+    controller = Controller()
+    controller.io = FakeIO()
+    controller.chips[chip.chip_key] = chip
+    controller.write_configuration(chip.chip_key, only_dirty=True)
+    conf_data = chip.get_configuration_packets(Packet.CONFIG_WRITE_PACKET)
+    result, err = capfd.readouterr()
+    assert result == list_of_packets_str(conf_data)
+
+    controller.write_configuration(chip.chip_key, only_dirty=True)
+    assert len(controller.io.sent) == 1
+    chip.config.pixel_trim_dac[3] = 5
+    chip.config.threshold_global = 10
+    controller.write_configuration(chip.chip_key, only_dirty=True)
+    result, err = capfd.readouterr()
+    assert result == list_of_packets_str(chip.get_configuration_write_packets([3, 64]))
+    assert chip.config.dirty_registers() == []
+
+def test_controller_multi_write_configuration_only_dirty(capfd, chip):
+    controller = Controller()
+    controller.io = FakeIO()
+    key = chip.chip_key
+    key2_dict = chip.chip_key.to_dict()
+    key2_dict['chip_id'] += 1
+    key2 = Key.from_dict(key2_dict)
+    chip2 = Chip(key2)
+    controller.chips = {key:chip, key2:chip2}
+    controller.multi_write_configuration((key, key2))
+    capfd.readouterr()
+    chip.config.channel_mask[0] = 0
+    chip2.config.threshold_global = 10
+    controller.multi_write_configuration([(key, range(0, 100)), key2], only_dirty=True)
+    result, err = capfd.readouterr()
+    assert result == list_of_packets_str(chip2.get_configuration_write_packets([64]))
+    assert chip.config.dirty_registers() == [131]
+    controller.multi_write_configuration((key, key2), only_dirty=True)
+    result, err = capfd.readouterr()
+    assert result == list_of_packets_str(chip.get_configuration_write_packets([131]))
+
+def test_controller_verify_marks_clean(chip):
+    controller = Controller()
+    controller.io = FakeIO()
+    controller.chips[chip.chip_key] = chip
+    conf_data = chip.get_configuration_packets(Packet.CONFIG_WRITE_PACKET)
+    for packet in conf_data: packet.packet_type = Packet.CONFIG_READ_PACKET
+    conf_data[5].register_data = 17
+    controller.io.queue.append((conf_data[:4] + conf_data[5:],b'hi'))
+    ok, diff = controller.verify_configuration(timeout=0.01)
+    assert not ok
+    assert chip.config.dirty_registers() == [4, 5]
+
 def test_controller_multi_read_configuration(capfd, chip):
     controller = Controller()
     controller.io = FakeIO()
@@ -1782,6 +1857,123 @@ def test_controller_verify_configuration_bad_value(capfd, chip):
     assert ok == False
     assert diff == {chip.chip_key: {5: (16, 17)}}
 
+def test_controller_read_configuration_early_return(capfd, chip):
+    controller = Controller()
+    controller.io = FakeIO()
+    controller.chips[chip.chip_key] = chip
+    conf_data = chip.get_configuration_packets(Packet.CONFIG_READ_PACKET)
+    sent_expected = list_of_packets_str(conf_data)
+    controller.io.queue.append((conf_data[:5],b'hi'))
+    controller.io.queue.append((conf_data[5:],b'there'))
+    received_expected = PacketCollection(conf_data, b'hithere', read_id=0,
+            message='configuration read')
+    start = time.time()
+    controller.read_configuration(chip.chip_key, timeout=10,
+        connection_delay=0, early_return=True)
+    assert time.time() - start < 5
+    sent_result, err = capfd.readouterr()
+    assert sent_result == sent_expected
+    assert controller.reads[-1] == received_expected
+
+    # missing register, read until timeout
+    controller.io.queue.append((conf_data[:4] + conf_data[5:],b'hi'))
+    start = time.time()
+    controller.multi_read_configuration([chip.chip_key], timeout=0.1,
+        connection_delay=0, early_return=True)
+    assert time.time() - start >= 0.1
+    assert len(controller.reads[-1]) == len(conf_data) - 1
+
+def test_controller_verify_configuration_early_return(chip):
+    controller = Controller()
+    controller.io = FakeIO()
+    controller.chips[chip.chip_key] = chip
+    conf_data = chip.get_configuration_packets(Packet.CONFIG_WRITE_PACKET)
+    for packet in conf_data: packet.packet_type = Packet.CONFIG_READ_PACKET
+    controller.io.queue.append((conf_data,b'hi'))
+    start = time.time()
+    ok, diff = controller.verify_configuration(timeout=10, early_return=True)
+    assert time.time() - start < 5
+    assert ok
+    assert diff == {}
+
+def test_controller_async_read_configuration(capfd, chip):
+    import asyncio
+    controller = Controller()
+    controller.io = FakeIO()
+    controller.chips[chip.chip_key] = chip
+    conf_data = chip.get_configuration_packets(Packet.CONFIG_READ_PACKET)
+    sent_expected = list_of_packets_str(conf_data)
+    controller.io.queue.append((conf_data[:5],b'hi'))
+    controller.io.queue.append((conf_data[5:],b'there'))
+    received_expected = PacketCollection(conf_data, b'hithere', read_id=0,
+            message='configuration read')
+    start = time.time()
+    asyncio.run(controller.async_read_configuration(chip.chip_key, timeout=10,
+        connection_delay=0))
+    assert time.time() - start < 5
+    received_result = controller.reads[-1]
+    sent_result, err = capfd.readouterr()
+    assert sent_result == sent_expected
+    assert received_result == received_expected
+    assert not controller.io.is_listening
+
+def test_controller_async_read_configuration_listening(chip):
+    import asyncio
+    controller = Controller()
+    controller.io = FakeIO()
+    controller.chips[chip.chip_key] = chip
+    conf_data = chip.get_configuration_packets(Packet.CONFIG_READ_PACKET)
+    # the sync and async reads leave the listening state the same way
+    for read_configuration in (controller.read_configuration,
+            lambda *args, **kwargs: asyncio.run(
+                controller.async_read_configuration(*args, **kwargs))):
+        controller.start_listening()
+        controller.io.queue.append((conf_data,b'hi'))
+        read_configuration(chip.chip_key, registers='pixel_trim_dac', timeout=0.05,
+            connection_delay=0)
+        assert not controller.io.is_listening
+        assert controller.reads[-1].message == 'configuration read'
+
+def test_controller_async_write_configuration_write_read(capfd, chip):
+    import asyncio
+    controller = Controller()
+    controller.io = FakeIO()
+    controller.chips[chip.chip_key] = chip
+    to_read = ([Packet(b'1'*Packet.num_bytes)], b'hi')
+    controller.io.queue.append(to_read)
+    expected_read = PacketCollection(*to_read, read_id=0,
+            message='configuration write')
+    asyncio.run(controller.async_write_configuration(chip.chip_key, registers=5,
+        write_read=0.05, connection_delay=0))
+    assert controller.reads[0] == expected_read
+    conf_data = chip.get_configuration_packets(Packet.CONFIG_WRITE_PACKET)[5:6]
+    result_sent, err = capfd.readouterr()
+    assert result_sent == list_of_packets_str(conf_data)
+
+def test_controller_async_verify_configuration(capfd, chip):
+    import asyncio
+    controller = Controller()
+    controller.io = FakeIO()
+    controller.chips[chip.chip_key] = chip
+    conf_data = chip.get_configuration_packets(Packet.CONFIG_WRITE_PACKET)
+    for packet in conf_data: packet.packet_type = Packet.CONFIG_READ_PACKET
+    controller.io.queue.append((conf_data,b'hi'))
+    ok, diff = asyncio.run(controller.async_verify_configuration(chip_keys=chip.chip_key))
+    assert diff == {}
+    assert ok
+
+    conf_data[5].register_data = 17
+    controller.io.queue.append((conf_data[:4] + conf_data[5:],b'hi'))
+    ok, diff = asyncio.run(controller.async_verify_configuration(timeout=0.05))
+    assert not ok
+    assert diff == {chip.chip_key: {4: (16, None), 5: (16, 17)}}
+
+    controller.io.queue.append((conf_data[:4] + conf_data[5:],b'hi'))
+    controller.io.queue.append((conf_data[4:5],b'hi'))
+    ok, diff = asyncio.run(controller.async_verify_configuration(timeout=0.05, n=2))
+    assert not ok
+    assert diff == {chip.chip_key: {5: (16, 17)}}
+
 def test_packetcollection_getitem_int():
     expected = Packet()
     collection = PacketCollection([expected])
@@ -1914,6 +2106,90 @@ def test_Smart_List_config_error():
         c.from_dict_registers(register_dict)
         pytest.fail('Should fail: out of bounds')
 
+def test_Smart_Array_init_error():
+    with pytest.raises(TypeError):
+        _Smart_Array([1.5], 0, 40)
+        pytest.fail('Should fail: wrong type')
+    with pytest.raises(ValueError):
+        _Smart_Array([-1], 0, 40)
+        pytest.fail('Should fail: out of bounds')
+
+def test_Smart_Array_assignment():
+    result = _Smart_Array([1,2,3,4],0,40)
+    assert result == [1,2,3,4]
+    assert result != [1,2,3]
+    assert result[1] == 2
+    assert isinstance(result[1], int)
+    assert result[1:3] == [2,3]
+    assert list(result) == [1,2,3,4]
+    result[0] = 20
+    assert result == [20,2,3,4]
+    result[1:3] = [5,6]
+    assert result == [20,5,6,4]
+    result[:] = 7
+    assert result.tolist() == [7,7,7,7]
+    result[[True, False, True, False]] = [1, 3]
+    assert result == [1,7,3,7]
+    with pytest.raises(ValueError):
+        result[2:] = [40, 41]
+        pytest.fail('Should fail: out of bounds')
+    assert result == [1,7,3,7]
+
+def test_Smart_Array_list_compatibility():
+    import copy
+    import pickle
+    from larpix import Configuration_v2
+    c = Configuration_v2()
+    result = c.pixel_trim_dac
+    assert isinstance(result, list)
+    assert result + [1] == [16] * 64 + [1]
+    assert type(result + [1]) == list
+    assert result.count(16) == 64
+    result[3] = 5
+    assert result.index(5) == 3
+    assert result.copy() == result
+    assert type(result.copy()) == list
+    assert list(reversed(result))[-4] == 5
+    c.mark_clean()
+    result[:] = 7
+    assert result == [7] * 64
+    assert result.values.tolist() == [7] * 64
+    assert c.dirty_registers() == list(range(64))
+    for other in (copy.deepcopy(c), pickle.loads(pickle.dumps(c))):
+        assert other == c
+        assert isinstance(other.pixel_trim_dac, _Smart_Array)
+        assert other.pixel_trim_dac.owner is other
+        other.pixel_trim_dac[0] = 1
+        assert other.register_image()[0] == 1
+        assert c.pixel_trim_dac[0] == 7
+
+    assert pickle.loads(pickle.dumps(c.pixel_trim_dac)).owner is None
+    result[[1, 3]] = [2, 4]
+    result[[value < 5 for value in result]] = 3
+    result[10:20:2] = [0, 1, 2, 3, 4]
+    assert result[:5] == [7, 3, 7, 3, 7]
+    assert result[10:20] == [0, 7, 1, 7, 2, 7, 3, 7, 4, 7]
+    assert result.values.tolist() == list(result)
+    with pytest.raises(ValueError):
+        result[0:3] = [1, 2]
+        pytest.fail('Should fail: wrong length')
+
+    result = _Smart_Array([1,2,3], 0, 40)
+    result.append(4)
+    result += [5]
+    result.insert(0, 0)
+    assert result == [0,1,2,3,4,5]
+    assert result.values.tolist() == [0,1,2,3,4,5]
+    assert result.pop() == 5
+    result.remove(0)
+    del result[0]
+    assert result == [2,3,4]
+    assert result.values.tolist() == [2,3,4]
+    with pytest.raises(ValueError):
+        result.append(41)
+        pytest.fail('Should fail: out of bounds')
+    assert result == [2,3,4]
+
 def test_ts_packet_to_dict(timestamp_packet):
     packet_dict = {
             'bits': timestamp_packet.bits.to01(),
@@ -2005,3 +2281,11 @@ def test_key():
     d = {}
     d[k] = 'test'
     assert d[k] == 'test'
+
+@pytest.mark.filterwarnings("ignore:no IO object")
+def test_controller_write_configuration_no_io_stays_dirty(chip):
+    controller = Controller()
+    controller.chips[chip.chip_key] = chip
+    controller.write_configuration(chip.chip_key)
+    controller.multi_write_configuration([chip.chip_key])
+    assert chip.config.dirty_registers() == list(range(chip.config.num_registers))
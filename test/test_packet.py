@@ -155,3 +155,37 @@ def test_parity():
     p.assign_parity()
     assert p.has_valid_parity()
     assert p.parity == 0
+
+def test_bits_view():
+    p = Packet_v2()
+    p.chip_id = 12
+    bits = p.bits
+    assert bah.touint(bits[p.chip_id_bits], endian=p.endian) == 12
+    bits[p.packet_type_bits] = bitarray('01')
+    assert p.packet_type == 2
+    assert p.chip_id == 12
+    p.chip_id = 3
+    assert p.bits[p.chip_id_bits] == bah.fromuint(3, p.chip_id_bits, endian=p.endian)
+
+    p.bits = bitarray('1' + '0'*63)
+    assert p.as_int() == 1
+    assert p.bytes() == b'\x01' + b'\x00'*7
+
+    p.chip_id = bah.fromuint(5, p.chip_id_bits, endian=p.endian)
+    assert p.chip_id == 5
+    p.chip_id = 256 + 7
+    assert p.chip_id == 7
+    assert p.packet_type == 1
+
+def test_copy_and_pickle():
+    import pickle
+    p = Packet_v2(b'\x01\x02\x03\x04\x05\x06\x07\x08')
+    p.io_group = 1
+    p.io_channel = 2
+    p.receipt_timestamp = 3
+    p.direction = 1
+    for p2 in (copy.copy(p), copy.deepcopy(p), pickle.loads(pickle.dumps(p))):
+        assert p2 == p
+        assert p2.export() == p.export()
+    assert not hasattr(Packet_v2(), 'direction')
+    assert not hasattr(Packet_v2(), 'receipt_timestamp')
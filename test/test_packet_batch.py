@@ -0,0 +1,129 @@
+from __future__ import print_function
+
+import pytest
+import numpy as np
+import h5py
+
+from larpix.larpix import Packet_v2, PacketBatch, PacketCollection, TimestampPacket
+from larpix.format.hdf5format import to_file, from_file
+from larpix.logger.h5_logger import HDF5Logger
+
+@pytest.fixture
+def packets():
+    packets = []
+    for i in range(20):
+        p = Packet_v2()
+        p.packet_type = i % 4
+        p.chip_id = i + 10
+        p.channel_id = i % 64
+        p.timestamp = i * 12345
+        p.dataword = i * 7
+        p.first_packet = i % 2
+        p.trigger_type = i % 4
+        p.downstream_marker = i % 3 == 0
+        if i % 5:
+            p.assign_parity()
+        p.io_group = i % 2 + 1
+        p.io_channel = i % 4 + 1
+        p.receipt_timestamp = i
+        p.direction = 1
+        packets.append(p)
+    return packets
+
+def test_from_packets(packets):
+    batch = PacketBatch.from_packets(packets)
+    assert len(batch) == len(packets)
+    assert batch == packets
+    assert list(batch) == packets
+    assert batch.to_packets() == packets
+    assert batch[3] == packets[3]
+    assert batch[-1] == packets[-1]
+    assert batch[-1].io_group == packets[-1].io_group
+    assert batch[-1].receipt_timestamp == packets[-1].receipt_timestamp
+    assert batch.bytes() == b''.join([p.bytes() for p in packets])
+    with pytest.raises(IndexError):
+        batch[len(packets)]
+
+def test_fields(packets):
+    batch = PacketBatch.from_packets(packets)
+    for field in ('packet_type', 'chip_id', 'channel_id', 'timestamp', 'dataword',
+            'first_packet', 'trigger_type', 'downstream_marker', 'parity',
+            'register_address', 'register_data', 'local_fifo', 'shared_fifo',
+            'io_group', 'io_channel', 'receipt_timestamp'):
+        assert batch.__getattribute__(field).tolist() == [getattr(p, field) for p in packets]
+    assert batch.has_valid_parity().tolist() == [p.has_valid_parity() for p in packets]
+    assert batch.compute_parity().tolist() == [p.compute_parity() for p in packets]
+    assert batch.local_fifo_events is None
+
+    batch.fifo_diagnostics_enabled = True
+    for p in packets:
+        p.fifo_diagnostics_enabled = True
+    for field in ('timestamp', 'local_fifo_events', 'shared_fifo_events'):
+        assert getattr(batch, field).tolist() == [getattr(p, field) for p in packets]
+    assert batch[0].fifo_diagnostics_enabled
+
+def test_setters(packets):
+    batch = PacketBatch.from_packets(packets)
+    batch.chip_id = 5
+    batch.dataword = np.arange(len(batch))
+    batch.assign_parity()
+    batch.io_channel = 3
+    for i, p in enumerate(batch):
+        assert p.chip_id == 5
+        assert p.dataword == i
+        assert p.has_valid_parity()
+        assert p.io_channel == 3
+
+def test_slice_and_concatenate(packets):
+    batch = PacketBatch.from_packets(packets)
+    assert batch[2:5] == packets[2:5]
+    mask = batch.chip_id > 20
+    assert batch[mask] == [p for p in packets if p.chip_id > 20]
+    assert PacketBatch.concatenate([batch[:10], batch[10:]]) == batch
+    assert len(PacketBatch.concatenate([])) == 0
+    no_metadata = PacketBatch(batch.words)
+    assert no_metadata.io_group is None
+    assert not hasattr(no_metadata[0], 'io_group') or no_metadata[0].io_group is None
+    joined = PacketBatch.concatenate([no_metadata, batch])
+    assert joined.io_group.tolist() == [0] * len(batch) + batch.io_group.tolist()
+
+def test_packet_collection(packets):
+    batch = PacketBatch.from_packets(packets)
+    collection = PacketCollection(batch)
+    expected = PacketCollection(packets)
+    assert len(collection) == len(packets)
+    assert isinstance(collection[:5].packets, PacketBatch)
+    assert collection[3] == packets[3]
+    assert collection[3, 'bits'] == expected[3, 'bits']
+    assert collection.extract('dataword', packet_type=0) == expected.extract('dataword', packet_type=0)
+    assert collection.extract('chip_id', 'timestamp', io_group=1) \
+        == expected.extract('chip_id', 'timestamp', io_group=1)
+    assert collection.extract('chip_key', chip_id=12) == expected.extract('chip_key', chip_id=12)
+    assert collection.to_dict()['packets'] == expected.to_dict()['packets']
+
+def test_to_file(tmpdir, packets):
+    batch = PacketBatch.from_packets(packets)
+    batch_file = str(tmpdir.join('batch.h5'))
+    packets_file = str(tmpdir.join('packets.h5'))
+    timestamp_packet = TimestampPacket(timestamp=123)
+    to_file(batch_file, [timestamp_packet, batch[:10], batch[10:]])
+    to_file(batch_file, batch)
+    to_file(packets_file, [timestamp_packet] + packets + packets)
+    with h5py.File(batch_file, 'r') as f_batch, h5py.File(packets_file, 'r') as f_packets:
+        assert np.all(f_batch['packets'][:] == f_packets['packets'][:])
+    to_file(str(tmpdir.join('batch_v2_2.h5')), batch, version='2.2')
+    to_file(str(tmpdir.join('packets_v2_2.h5')), packets, version='2.2')
+    with h5py.File(str(tmpdir.join('batch_v2_2.h5')), 'r') as f_batch, \
+            h5py.File(str(tmpdir.join('packets_v2_2.h5')), 'r') as f_packets:
+        assert np.all(f_batch['packets'][:] == f_packets['packets'][:])
+
+def test_logger_record(tmpdir, packets):
+    logger = HDF5Logger(directory=str(tmpdir), buffer_length=30, enabled=True)
+    batch = PacketBatch.from_packets(packets)
+    logger.record(batch, direction=logger.READ)
+    assert np.all(batch.direction == logger.READ)
+    assert len(logger._buffer['packets']) == 1
+    logger.record(batch)
+    assert len(logger._buffer['packets']) == 0
+    logger.flush()
+    assert len(from_file(logger.filename)['packets']) == 2 * len(packets)
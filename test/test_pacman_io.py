@@ -0,0 +1,303 @@
+'''
+Tests for larpix.io.pacman_io module
+
+'''
+from __future__ import print_function
+import pytest
+import time
+import json
+import threading
+import asyncio
+import zmq
+import numpy as np
+from larpix.larpix import Packet_v2, TimestampPacket, PacketBatch, Controller
+from larpix.io.pacman_io import PACMAN_IO
+from larpix.io.async_pacman_io import AsyncPACMAN_IO
+import larpix.format.pacman_msg_format as pacman_msg_format
+
+@pytest.fixture
+def io_config(tmpdir):
+    filename = str(tmpdir.join('test_conf.json'))
+    config_dict = {
+            "_config_type": "io",
+            "io_class": "PACMAN_IO",
+            "io_group": [
+                [1, "127.0.0.1"],
+                [2, "127.0.0.2"]
+            ]
+        }
+    with open(filename,'w') as of:
+        json.dump(config_dict, of)
+    return filename
+
+@pytest.fixture
+def pacman_io_obj(io_config, tmpdir):
+    io = PACMAN_IO(io_config, raw_directory=str(tmpdir))
+    yield io
+    io.cleanup()
+
+@pytest.fixture
+def publishers(pacman_io_obj):
+    context = zmq.Context()
+    sockets = dict()
+    for io_group, address in pacman_io_obj._io_group_table.items():
+        sockets[io_group] = context.socket(zmq.PUB)
+        sockets[io_group].setsockopt(zmq.LINGER, 0)
+        sockets[io_group].bind('tcp://{}:{}'.format(address, PACMAN_IO.dataserver_port))
+    yield sockets
+    for socket in sockets.values():
+        socket.close()
+    context.term()
+
+def _data_msg(n_packets, chip_id):
+    packets = []
+    for i in range(n_packets):
+        packets.append(Packet_v2())
+        packets[-1].chip_id = chip_id
+        packets[-1].channel_id = i % 64
+        packets[-1].io_channel = 1
+    return pacman_msg_format.format(packets, msg_type='DATA')
+
+def _wait_for_subscription(io, publishers):
+    # PUB/SUB subscriptions are asynchronous, publish until every io group is received
+    io.start_listening()
+    received = set()
+    for _ in range(200):
+        for socket in publishers.values():
+            socket.send(_data_msg(1, 0))
+        time.sleep(0.01)
+        received |= set([packet.io_group for packet in io.empty_queue()[0]])
+        if received == set(publishers):
+            break
+    assert received == set(publishers)
+    time.sleep(0.05)
+    io.empty_queue()
+
+def test_empty_queue(pacman_io_obj, publishers):
+    _wait_for_subscription(pacman_io_obj, publishers)
+    msgs = dict([(io_group, [_data_msg(10, io_group * 10 + i) for i in range(5)])
+        for io_group in publishers])
+    for io_group, socket in publishers.items():
+        for msg in msgs[io_group]:
+            socket.send(msg)
+    time.sleep(0.2)
+
+    packets, bytestream = pacman_io_obj.empty_queue()
+    assert len(packets) == 2 * 5 * 11
+    assert len([packet for packet in packets if isinstance(packet, TimestampPacket)]) == 2 * 5
+    for io_group in publishers:
+        expected = []
+        for msg in msgs[io_group]:
+            expected += pacman_msg_format.parse(msg, io_group=io_group)
+        assert [packet for packet in packets if packet.io_group == io_group] == expected
+        assert b''.join(msgs[io_group]) in bytestream
+    assert len(bytestream) == sum([len(msg) for io_group in msgs for msg in msgs[io_group]])
+    assert pacman_io_obj.empty_queue() == ([], b'')
+
+def test_empty_queue_hwm(pacman_io_obj, publishers):
+    _wait_for_subscription(pacman_io_obj, publishers)
+    pacman_io_obj.hwm = 3
+    for _ in range(5):
+        publishers[1].send(_data_msg(1, 12))
+    time.sleep(0.2)
+    assert len(pacman_io_obj.empty_queue()[0]) == 3 * 2
+    assert len(pacman_io_obj.empty_queue()[0]) == 2 * 2
+
+def test_empty_queue_disable_bytestream(pacman_io_obj, publishers):
+    _wait_for_subscription(pacman_io_obj, publishers)
+    pacman_io_obj.disable_bytestream = True
+    publishers[1].send(_data_msg(10, 12))
+    time.sleep(0.2)
+    packets, bytestream = pacman_io_obj.empty_queue()
+    assert len(packets) == 11
+    assert bytestream == b''
+
+def test_empty_queue_packet_batch(pacman_io_obj, publishers):
+    _wait_for_subscription(pacman_io_obj, publishers)
+    pacman_io_obj.enable_packet_batch = True
+    msgs = dict([(io_group, [_data_msg(10, io_group * 10 + i) for i in range(5)])
+        for io_group in publishers])
+    for io_group, socket in publishers.items():
+        for msg in msgs[io_group]:
+            socket.send(msg)
+    time.sleep(0.2)
+
+    packets, bytestream = pacman_io_obj.empty_queue()
+    assert isinstance(packets, PacketBatch)
+    assert len(packets) == 2 * 5 * 10
+    for io_group in publishers:
+        expected = []
+        for msg in msgs[io_group]:
+            expected += pacman_msg_format.parse(msg, io_group=io_group)[1:]
+        assert packets[packets.io_group == io_group] == expected
+    assert len(bytestream) == sum([len(msg) for io_group in msgs for msg in msgs[io_group]])
+    packets, bytestream = pacman_io_obj.empty_queue()
+    assert len(packets) == 0 and bytestream == b''
+
+def test_controller_run_packet_batch(pacman_io_obj, publishers):
+    _wait_for_subscription(pacman_io_obj, publishers)
+    pacman_io_obj.enable_packet_batch = True
+    pacman_io_obj.stop_listening()
+    controller = Controller()
+    controller.io = pacman_io_obj
+    stop = threading.Event()
+    def publish():
+        while not stop.is_set():
+            publishers[1].send(_data_msg(10, 12))
+            time.sleep(0.01)
+    thread = threading.Thread(target=publish)
+    thread.start()
+    try:
+        controller.run(0.3, 'packet batch')
+    finally:
+        stop.set()
+        thread.join()
+    packets = controller.reads[-1].packets
+    assert isinstance(packets, PacketBatch)
+    assert len(packets) > 0 and len(packets) % 10 == 0
+    assert np.all(packets.chip_id == 12)
+    assert np.all(packets.io_group == 1)
+    assert controller.reads[-1].message == 'packet batch'
+
+def test_wait_for_data(pacman_io_obj, publishers):
+    _wait_for_subscription(pacman_io_obj, publishers)
+    start = time.time()
+    assert not pacman_io_obj.wait_for_data(0.05)
+    assert time.time() - start >= 0.04
+    publishers[1].send(_data_msg(1, 12))
+    assert pacman_io_obj.wait_for_data(1)
+    assert len(pacman_io_obj.empty_queue()[0]) == 2
+
+def test_background_receiver(pacman_io_obj, publishers):
+    pacman_io_obj.enable_background_receiver = True
+    _wait_for_subscription(pacman_io_obj, publishers)
+    assert pacman_io_obj._receiver.is_alive()
+    for i in range(100):
+        publishers[1 + i % 2].send(_data_msg(1, i))
+    time.sleep(0.2)
+    packets, bytestream = pacman_io_obj.empty_queue()
+    assert len(packets) == 100 * 2
+    for io_group in publishers:
+        assert [packet.chip_id for packet in packets[1::2] if packet.io_group == io_group] \
+            == list(range(io_group - 1, 100, 2))
+    assert pacman_io_obj.dropped_messages == 0
+
+    pacman_io_obj.background_buffer_length = 20
+    pacman_io_obj.stop_listening()
+    assert pacman_io_obj._receiver is None
+    _wait_for_subscription(pacman_io_obj, publishers)
+    dropped_messages = pacman_io_obj.dropped_messages
+    for i in range(50):
+        publishers[1].send(_data_msg(1, i))
+    time.sleep(0.2)
+    pacman_io_obj.stop_listening()
+    assert pacman_io_obj.dropped_messages - dropped_messages == 30
+    packets, bytestream = pacman_io_obj.empty_queue()
+    assert [packet.chip_id for packet in packets[1::2]] == list(range(30, 50))
+    assert pacman_io_obj.empty_queue() == ([], b'')
+
+@pytest.fixture
+def async_pacman_io_obj(io_config, tmpdir):
+    io = AsyncPACMAN_IO(io_config, raw_directory=str(tmpdir))
+    yield io
+    io.cleanup()
+
+@pytest.fixture
+def cmdservers(pacman_io_obj):
+    # servers that reply to each request with its message length, requests
+    # are recorded as ``(address, msg)`` in the order they are received
+    context = zmq.Context()
+    sockets = dict()
+    for io_group, address in pacman_io_obj._io_group_table.items():
+        sockets[address] = context.socket(zmq.REP)
+        sockets[address].setsockopt(zmq.LINGER, 0)
+        sockets[address].bind('tcp://{}:{}'.format(address, PACMAN_IO.cmdserver_port))
+    requests = []
+    stop = threading.Event()
+    def serve():
+        poller = zmq.Poller()
+        for socket in sockets.values():
+            poller.register(socket, zmq.POLLIN)
+        while not stop.is_set():
+            for socket, _ in poller.poll(10):
+                address = [address for address in sockets if sockets[address] is socket][0]
+                requests.append((address, socket.recv()))
+                socket.send(str(len(requests[-1][1])).encode())
+    thread = threading.Thread(target=serve)
+    thread.start()
+    yield requests
+    stop.set()
+    thread.join()
+    for socket in sockets.values():
+        socket.close()
+    context.term()
+
+def _config_packets(n_packets, io_group):
+    packets = []
+    for i in range(n_packets):
+        packets.append(Packet_v2())
+        packets[-1].packet_type = Packet_v2.CONFIG_READ_PACKET
+        packets[-1].chip_id = i % 256
+        packets[-1].io_group = io_group
+        packets[-1].io_channel = 1
+    return packets
+
+def _check_sent(io, requests, packets):
+    for io_group, address in io._io_group_table.items():
+        received = []
+        for request_address, msg in requests:
+            if request_address == address:
+                received += pacman_msg_format.parse(msg, io_group=io_group)
+        assert [packet for packet in received if not isinstance(packet, TimestampPacket)] \
+            == [packet for packet in packets if packet.io_group == io_group]
+        assert io._sender_replies[address] \
+            == [str(len(msg)).encode() for request_address, msg in requests
+                if request_address == address]
+
+def test_send(pacman_io_obj, cmdservers):
+    packets = _config_packets(10, 1) + _config_packets(5, 2)
+    pacman_io_obj.send(packets)
+    _check_sent(pacman_io_obj, cmdservers, packets)
+
+    # one message per packet, messages to each board are sent in parallel
+    del cmdservers[:]
+    pacman_io_obj._sender_replies.clear()
+    pacman_io_obj.group_packets_by_io_group = False
+    pacman_io_obj.send(packets)
+    assert len(cmdservers) == 15
+    _check_sent(pacman_io_obj, cmdservers, packets)
+    # the second board receives its first message before the first board has
+    # received all of its messages
+    addresses = [address for address, msg in cmdservers]
+    assert addresses.index('127.0.0.2') < len(addresses) - addresses[::-1].index('127.0.0.1') - 1
+
+def test_async_send(async_pacman_io_obj, cmdservers):
+    packets = _config_packets(10, 1) + _config_packets(5, 2)
+    asyncio.run(async_pacman_io_obj.async_send(packets))
+    _check_sent(async_pacman_io_obj, cmdservers, packets)
+
+def test_async_wait_for_data(async_pacman_io_obj, publishers):
+    _wait_for_subscription(async_pacman_io_obj, publishers)
+    assert not asyncio.run(async_pacman_io_obj.async_wait_for_data(0.05))
+    publishers[2].send(_data_msg(10, 12))
+    assert asyncio.run(async_pacman_io_obj.async_wait_for_data(1))
+    packets, bytestream = asyncio.run(async_pacman_io_obj.async_empty_queue())
+    assert len(packets) == 11
+    assert all([packet.io_group == 2 for packet in packets])
+
+def test_async_empty_queue(async_pacman_io_obj, publishers, monkeypatch):
+    _wait_for_subscription(async_pacman_io_obj, publishers)
+    def empty_queue():
+        pytest.fail('Should not call the blocking empty_queue')
+    monkeypatch.setattr(async_pacman_io_obj, 'empty_queue', empty_queue)
+    async_pacman_io_obj.hwm = 3
+    for _ in range(2):
+        publishers[1].send(_data_msg(1, 11))
+        publishers[2].send(_data_msg(1, 12))
+    time.sleep(0.2)
+    first, bytestream = asyncio.run(async_pacman_io_obj.async_empty_queue())
+    assert len(first) == 3 * 2
+    second, bytestream = asyncio.run(async_pacman_io_obj.async_empty_queue())
+    assert len(second) == 2
+    assert sorted([packet.chip_id for packet in first + second
+        if isinstance(packet, Packet_v2)]) == [11, 11, 12, 12]
@@ -196,7 +196,7 @@ def test_tutorial(capsys, tmpdir, temp_logfilename):
     assert '_header' in datafile.keys()
     assert 'packets' in datafile.keys()
     assert 'messages' in datafile.keys()
-    assert list(datafile['_header'].attrs) == ['created', 'modified', 'version']
+    assert list(datafile['_header'].attrs) == ['chunk_size', 'compression', 'compression_opts', 'created', 'modified', 'shuffle', 'version']
 
 
     raw_value = datafile['packets'][0] # e.g. (b'0-246', 3, 246, 1, 1, -1, -1, -1, -1, -1, -1, 0, 0)